@@ -4,9 +4,15 @@ DiamondStreetStyles - main.py
 """
 
 import xpress as xp
+import numpy as np
 import pandas as pd
 import math
 
+from dss import BillOfMaterials, PlanningData
+from dss.ingest import readWorkbook
+from dss.launch import launchCostArray, productBounds, readLaunchCosts, unitContribution
+from dss.presolve import presolveProblem
+
 
 #### Helper Classes ####
 
@@ -45,10 +51,12 @@ DSS = xp.problem("Deinemutter")
 
 # Laden der Excel File und auslesen von Material, Produkt und Fixkosten
 file_path = 'Produktionsplanung.xlsx'  # Replace with your file path
-material_df = pd.read_excel(file_path, sheet_name='Material')
-produkt_df = pd.read_excel(file_path, sheet_name='Produkt')
-fixed_costs_df = pd.read_excel(file_path, sheet_name='Fixkosten')
-variables_df = pd.read_excel(file_path, sheet_name='Variablen')
+# the workbook is parsed once and cached in .dss_cache, unchanged files are read from the cache
+sheets = readWorkbook(file_path)
+material_df = sheets['Material']
+produkt_df = sheets['Produkt']
+fixed_costs_df = sheets['Fixkosten']
+variables_df = sheets['Variablen']
 
 
 ## Create a list with all products
@@ -83,6 +91,22 @@ materialLimits = material_df['Materialbeschränkungen']
 for idx in range(len(materialNames)):
     mat = Material(materialNames[idx], materialCosts[idx], materialLimits[idx])
     materialMap[materialNames[idx]] = mat
+
+## Stückliste - sparse product x material matrix, built once from the Produkt sheet
+bom = BillOfMaterials.fromFrame(produkt_df, materialNames)
+materialLimitArray = np.asarray(materialLimits, dtype=float)
+planningData = PlanningData.fromFrames(material_df, produkt_df, fixed_costs_df, variables_df)
+
+
+## Produkteinführung - Fixkosten per product from the Produkteinführung sheet,
+# without the sheet the scenario: Cargoshorts cost 250000 to launch
+launchCosts = launchCostArray(planningData, readLaunchCosts(file_path))
+launchCandidates = [prod for prod, costs in zip(productList, launchCosts) if not math.isnan(costs)]
+
+# largest quantity every product can reach from material limits, forecast and offcut rules,
+# upper bound of products without Maximalprognose and big-M of the launch decisions
+productBound = dict(zip(planningData.productNames,
+                        np.floor(productBounds(planningData, optional=np.flatnonzero(~np.isnan(launchCosts))) + 1e-9)))
             
 
 ## create a Map / Dict with all Variables
@@ -93,20 +117,24 @@ for prod in productList:
     
     minp, maxp = 0,0
     
-    if math.isnan(prod.minp):
+    # the minimum of a launch candidate only applies if it is launched, see below
+    if math.isnan(prod.minp) or prod in launchCandidates:
       minp = 0
     
     else:
         minp = prod.minp
     
     if math.isnan(prod.maxp):
-        maxp = 30000
+        maxp = productBound[prod.name]
     else:
         maxp = prod.maxp
         
     variableMap[prod.name] = xp.var(name=prod.name, vartype=xp.integer, lb=minp, ub=maxp)
     DSS.addVariable(variableMap[prod.name])
 
+## variables in product order, aligned with the rows of the BOM
+variables = list(variableMap.values())
+
 
     
 ### Constraints
@@ -114,13 +142,9 @@ for prod in productList:
 ## Materialbeschränkungen
 
 for matName in materialMap:   
-    tempList = []
+    prodIdx, amounts = bom.usage(matName)
     
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-         
-    DSS.addConstraint(xp.Sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList))) <= materialMap[matName].limit)
+    DSS.addConstraint(xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts)) <= materialMap[matName].limit)
     
  
 ## Verschnittregelung
@@ -151,13 +175,9 @@ for product in productList:
 remainingMaterial = {}
 
 for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
+    prodIdx, amounts = bom.usage(matName)
     
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList)))
+    remainingMaterial[matName] = materialMap[matName].limit - xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts))
 
 
 #### Kosten #### 
@@ -186,46 +206,55 @@ returnMoney = sum(quantity * materialMap[matName].costs for matName, quantity in
 totalCosts = totalFixedCosts + totalMaterialCosts + returnCosts - returnMoney
 
 
-######## Zielfunktion
-# Binäre Variable für die Produktion von Cargoshorts hinzufügen
-produce_cargoshorts = xp.var(name='produce_cargoshorts', vartype=xp.binary)
-DSS.addVariable(produce_cargoshorts)
+######## Produkteinführung
 
-# Fixkosten für Cargoshorts
-fixed_costs_cargoshorts = 250000  # Gegeben im Szenario
+launchMap = {}
+deckungsbeitrag = dict(zip(planningData.productNames, unitContribution(planningData)))
 
-# Deckungsbeitrag pro Cargoshort
-deckungsbeitrag_per_cargoshort = 11  # Gegeben im Szenario
+for prod, costs in zip(launchCandidates, launchCosts[~np.isnan(launchCosts)]):
+    # Binäre Variable für die Produktion hinzufügen
+    launchMap[prod.name] = xp.var(name='produce_' + prod.name, vartype=xp.binary)
+    DSS.addVariable(launchMap[prod.name])
 
-# Verkaufsprognose für Cargoshorts
-max_sales_cargoshorts = 6000  # Gegeben im Szenario
+    # Constraint für die Deckung der Fixkosten, falls produziert wird
+    DSS.addConstraint(deckungsbeitrag[prod.name] * variableMap[prod.name] >= launchMap[prod.name] * costs)
 
-# Constraint für die Deckung der Fixkosten, falls Cargoshorts produziert werden
-DSS.addConstraint(deckungsbeitrag_per_cargoshort * variableMap['Cargoshorts'] >= produce_cargoshorts * fixed_costs_cargoshorts)
+    # Constraint, um die Produktionsmenge auf 0 zu setzen, falls keine Produktion erfolgt
+    # (M is the largest quantity the product can reach, not a blanket number)
+    DSS.addConstraint(variableMap[prod.name] <= launchMap[prod.name] * productBound[prod.name])
 
-# Constraint, um die Produktionsmenge auf 0 zu setzen, falls keine Produktion erfolgt
-DSS.addConstraint(variableMap['Cargoshorts'] <= produce_cargoshorts * max_sales_cargoshorts)
+    # Mindestproduktionsmenge nur bei Produktion
+    if prod.minp > 0:
+        DSS.addConstraint(variableMap[prod.name] >= launchMap[prod.name] * prod.minp)
 
-# ... (rest of your constraints) ...
+fixedLaunchCosts = dict(zip([prod.name for prod in launchCandidates], launchCosts[~np.isnan(launchCosts)]))
 
 ### Total Costs ###
 totalCosts = totalFixedCosts + totalMaterialCosts + returnCosts - returnMoney
 
 ######## Zielfunktion
-# Zielfunktion unter Berücksichtigung der Entscheidung, Cargoshorts zu produzieren oder nicht
-DSS.setObjective(sum((product.vk - product.mk) * variableMap[product.name] for product in productList if product.name != 'Cargoshorts') + 
-                 (deckungsbeitrag_per_cargoshort * variableMap['Cargoshorts'] - produce_cargoshorts * fixed_costs_cargoshorts), 
+# Zielfunktion unter Berücksichtigung der Entscheidung, die Kandidaten zu produzieren oder nicht
+DSS.setObjective(sum((product.vk - product.mk) * variableMap[product.name] for product in productList if product.name not in launchMap) + 
+                 sum(deckungsbeitrag[name] * variableMap[name] - launchMap[name] * fixedLaunchCosts[name] for name in launchMap), 
                  sense=xp.maximize)
 
+# Presolve in Python: tighter bounds and big-M coefficients, dominated products fixed,
+# redundant material rows removed (dss/presolve.py)
+presolveResult = presolveProblem(DSS)
+print(presolveResult.summary())
+for name, (value, reason) in presolveResult.removedCols().items():
+    print(f"  {name}: {value:g} ({reason})")
+
 # Optimierung erneut durchführen
 DSS.mipoptimize()
 
 # Ergebnisse ausgeben
-if DSS.getSolution(produce_cargoshorts) > 0.5:  # Wenn die binäre Variable auf 1 gerundet wird
-    print(f"Die Produktion von Cargoshorts wird durchgeführt. Produzierte Menge: {DSS.getSolution(variableMap['Cargoshorts'])}")
-    print(f"Der Deckungsbeitrag der Cargoshorts deckt die Fixkosten von {fixed_costs_cargoshorts} Euro.")
-else:
-    print("Die Produktion von Cargoshorts wird nicht durchgeführt, da der Deckungsbeitrag die Fixkosten nicht deckt.")
+for name in launchMap:
+    if DSS.getSolution(launchMap[name]) > 0.5:  # Wenn die binäre Variable auf 1 gerundet wird
+        print(f"Die Produktion von {name} wird durchgeführt. Produzierte Menge: {DSS.getSolution(variableMap[name])}")
+        print(f"Der Deckungsbeitrag der {name} deckt die Fixkosten von {fixedLaunchCosts[name]:g} Euro.")
+    else:
+        print(f"Die Produktion von {name} wird nicht durchgeführt, da der Deckungsbeitrag die Fixkosten nicht deckt.")
 
 # Gesamter Deckungsbeitrag nach der Optimierung
 db_gesamt = DSS.getObjVal()
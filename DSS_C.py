@@ -4,9 +4,14 @@ DiamondStreetStyles - main.py
 """
 
 import xpress as xp
+import numpy as np
 import pandas as pd
 import math
 
+from dss import BillOfMaterials
+from dss.ingest import readWorkbook
+from dss.resultcache import ResultCache
+
 
 #### Helper Classes ####
 
@@ -47,10 +52,12 @@ DSS.setControl('outputlog', 0)
 
 # Laden der Excel File und auslesen von Material, Produkt und Fixkosten
 file_path = 'Produktionsplanung.xlsx'  # Replace with your file path
-material_df = pd.read_excel(file_path, sheet_name='Material')
-produkt_df = pd.read_excel(file_path, sheet_name='Produkt')
-fixed_costs_df = pd.read_excel(file_path, sheet_name='Fixkosten')
-variables_df = pd.read_excel(file_path, sheet_name='Variablen')
+# the workbook is parsed once and cached in .dss_cache, unchanged files are read from the cache
+sheets = readWorkbook(file_path)
+material_df = sheets['Material']
+produkt_df = sheets['Produkt']
+fixed_costs_df = sheets['Fixkosten']
+variables_df = sheets['Variablen']
 
 
 ## Create a list with all products
@@ -85,6 +92,10 @@ materialLimits = material_df['Materialbeschränkungen']
 for idx in range(len(materialNames)):
     mat = Material(materialNames[idx], materialCosts[idx], materialLimits[idx])
     materialMap[materialNames[idx]] = mat
+
+## Stückliste - sparse product x material matrix, built once from the Produkt sheet
+bom = BillOfMaterials.fromFrame(produkt_df, materialNames)
+materialLimitArray = np.asarray(materialLimits, dtype=float)
             
 
 ## create a Map / Dict with all Variables
@@ -95,6 +106,9 @@ for prod in productList:
     variableMap[prod.name] = xp.var(name=prod.name)
     DSS.addVariable(variableMap[prod.name])
 
+## variables in product order, aligned with the rows of the BOM
+variables = list(variableMap.values())
+
 
     
 ### Constraints
@@ -104,12 +118,9 @@ constraintList = []
 ## Materialbeschränkungen
 
 for matName in materialMap:   
-    tempList = []
+    prodIdx, amounts = bom.usage(matName)
     
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    c_mat = xp.Sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList))) <= materialMap[matName].limit
+    c_mat = xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts)) <= materialMap[matName].limit
         
     DSS.addConstraint(c_mat)
     
@@ -155,13 +166,9 @@ for product in productList:
 remainingMaterial = {}
 
 for matName in materialMap:   
-    tempList = []
+    prodIdx, amounts = bom.usage(matName)
     
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList)))
+    remainingMaterial[matName] = materialMap[matName].limit - xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts))
 
 
 #### Kosten #### 
@@ -202,19 +209,23 @@ DSS.setObjective(objective, sense=xp.maximize)
 # LP-OPTIMIERUNG
 # ************************************
 
-DSS.lpoptimize()
+# results of identical models come from .dss_cache/results instead of the solver (DSS_RESULT_CACHE=0 switches it off)
+resultCache = ResultCache.fromEnv()
+# solution, slacks, duals, reduced costs, basis and ranging in one go
+lpResult, _, _ = resultCache.solve(DSS, DSS.lpoptimize, ranging=True)
 print("------------------")
 print("LP-OPTIMIERUNG")
 print("------------------")
 
 
-solution = DSS.getSolution()
-schlupf = DSS.getSlack()
-dualwerte = DSS.getDual()
-redkosten = DSS.getRCost()
-ZFWert = DSS.getObjVal()
+solution = lpResult.primal.tolist()
+schlupf = lpResult.slack.tolist()
+dualwerte = lpResult.dual.tolist()
+redkosten = lpResult.reducedCost.tolist()
+ZFWert = lpResult.objective
 
-optimal_values = {var: DSS.getSolution(var) for var in variableMap.values()}
+optimalQuantities = lpResult.values([var.name for var in variables])
+optimal_values = dict(zip(variables, optimalQuantities.tolist()))
 
 print("Lösung:", solution)
 print("ZFW:", ZFWert)
@@ -229,7 +240,7 @@ print('Produktion pro Variable')
 print()
 
 for name, var in variableMap.items():
-    print(name + ": " + str(DSS.getSolution(name)))
+    print(name + ": " + str(optimal_values[var]))
     
     
 ## Zurücksendungen
@@ -237,14 +248,8 @@ print()
 print('Zurücksendungen')
 print()
  
-for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    print(matName + ': ' +  str(materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))))
+for matName, r in zip(bom.materialNames, bom.remaining(materialLimitArray, optimalQuantities)):
+    print(matName + ': ' +  str(r))
 
     
 ## Deckungsbeitrag
@@ -262,14 +267,8 @@ dbgesamt = sum((product.vk - product.mk) * optimal_values[variableMap[product.na
 print()
 print('DB gesamt: ' + str(dbgesamt))
 
-for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))
+for matName, r in zip(bom.materialNames, bom.remaining(materialLimitArray, optimalQuantities)):
+    remainingMaterial[matName] = r
 
 
 print(remainingMaterial.values())
@@ -291,14 +290,11 @@ print("------------------")
 # Sensitivitätsanalyse für Zielfunktionskoeffizienten
 all_variables = list(variableMap.values())
 
-# Prepare empty lists for the lower and upper bounds.
-lower_obj = []
-upper_obj = []
-
-# Call the objsa function with the correct parameters.
-DSS.objsa(all_variables, lower_obj, upper_obj)
+# Ranging of the objective coefficients, computed with the solve (objsa)
+allCols = lpResult.cols([var.name for var in all_variables])
+lower_obj = lpResult.lowerObj[allCols].tolist()
+upper_obj = lpResult.upperObj[allCols].tolist()
 
-# Now lower_obj and upper_obj lists will be populated with the sensitivity ranges for the objective coefficients.
 print("\nSensitivity for Objective Function Coefficients:")#
 print()
 for var, lo, up in zip(all_variables, lower_obj, upper_obj):
@@ -307,8 +303,8 @@ for var, lo, up in zip(all_variables, lower_obj, upper_obj):
 
 
 # Sensitivitätsanalyse für Rechte Seiten (b-Vektor)
-lower_rhs, upper_rhs = [], []
-DSS.rhssa(constraintList, lower_rhs, upper_rhs)
+# constraintList holds all rows in problem order (rhssa)
+lower_rhs, upper_rhs = lpResult.lowerRhs.tolist(), lpResult.upperRhs.tolist()
 print("\nSensitivität für Rechte Seiten:")
 print("Untere Grenzen:", lower_rhs)
 print("Obere Grenzen:", upper_rhs)
@@ -320,8 +316,7 @@ active_constraints = []
 inactive_constraints = []
 
 # Schlupf für jede Nebenbedingung überprüfen
-for idx, constr in enumerate(constraintList):
-    slack_value = DSS.getSlack(constr)
+for idx, slack_value in enumerate(schlupf):
     if slack_value == 0:
         active_constraints.append(f'NB{idx+1}')  # +1, weil die Zählung der Constraints bei 1 beginnt
     else:
@@ -333,12 +328,8 @@ print("Inaktive Nebenbedingungen:", inactive_constraints)
 
 
 
-# Erstellen Sie zwei leere Listen für rowstat und colstat
-rowstat = [0] * DSS.attributes.rows
-colstat = [0] * DSS.attributes.cols
-
-# Rufen Sie getbasis auf, um die Basisstatus zu erhalten
-DSS.getbasis(rowstat, colstat)
+# Basisstatus der Spalten aus dem Ergebnis (getbasis)
+colstat = lpResult.colBasis.tolist()
 
 # Finden Sie die Basis- und Nicht-Basisvariablen
 basis_vars = []
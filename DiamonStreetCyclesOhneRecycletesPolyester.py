@@ -12,9 +12,13 @@ DiamondStreetStyles - main.py
 """
 
 import xpress as xp
+import numpy as np
 import pandas as pd
 import math
 
+from dss import BillOfMaterials
+from dss.ingest import readWorkbook
+
 
 #### Helper Classes ####
 
@@ -53,10 +57,12 @@ DSS = xp.problem("Deinemutter")
 
 # Laden der Excel File und auslesen von Material, Produkt und Fixkosten
 file_path = 'Produktionsplanung.xlsx'  # Replace with your file path
-material_df = pd.read_excel(file_path, sheet_name='Material')
-produkt_df = pd.read_excel(file_path, sheet_name='Produkt')
-fixed_costs_df = pd.read_excel(file_path, sheet_name='Fixkosten')
-variables_df = pd.read_excel(file_path, sheet_name='Variablen')
+# the workbook is parsed once and cached in .dss_cache, unchanged files are read from the cache
+sheets = readWorkbook(file_path)
+material_df = sheets['Material']
+produkt_df = sheets['Produkt']
+fixed_costs_df = sheets['Fixkosten']
+variables_df = sheets['Variablen']
 
 
 ## Create a list with all products
@@ -91,6 +97,10 @@ materialLimits = material_df['Materialbeschränkungen']
 for idx in range(len(materialNames)):
     mat = Material(materialNames[idx], materialCosts[idx], materialLimits[idx])
     materialMap[materialNames[idx]] = mat
+
+## Stückliste - sparse product x material matrix, built once from the Produkt sheet
+bom = BillOfMaterials.fromFrame(produkt_df, materialNames)
+materialLimitArray = np.asarray(materialLimits, dtype=float)
             
 
 ## create a Map / Dict with all Variables
@@ -115,6 +125,9 @@ for prod in productList:
     variableMap[prod.name] = xp.var(name=prod.name, vartype=xp.integer, lb=minp, ub=maxp)
     DSS.addVariable(variableMap[prod.name])
 
+## variables in product order, aligned with the rows of the BOM
+variables = list(variableMap.values())
+
 
     
 ### Constraints
@@ -122,13 +135,9 @@ for prod in productList:
 ## Materialbeschränkungen
 
 for matName in materialMap:   
-    tempList = []
+    prodIdx, amounts = bom.usage(matName)
     
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-         
-    DSS.addConstraint(xp.Sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList))) <= materialMap[matName].limit)
+    DSS.addConstraint(xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts)) <= materialMap[matName].limit)
     
  
 ## Verschnittregelung
@@ -159,13 +168,9 @@ for product in productList:
 remainingMaterial = {}
 
 for matName in materialMap:   
-    tempList = []
+    prodIdx, amounts = bom.usage(matName)
     
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList)))
+    remainingMaterial[matName] = materialMap[matName].limit - xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts))
 
 
 #### Kosten #### 
@@ -205,6 +210,7 @@ DSS.mipoptimize()
 solution = DSS.getSolution()
 
 optimal_values = {var: DSS.getSolution(var) for var in variableMap.values()}
+optimalQuantities = np.array([optimal_values[var] for var in variables])
 
 
 print("Lösung:", solution)
@@ -224,14 +230,8 @@ print()
 print('Übrig / Zurück')
 print()
 
-for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    print(matName + ': ' +  str(materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))))
+for matName, r in zip(bom.materialNames, bom.remaining(materialLimitArray, optimalQuantities)):
+    print(matName + ': ' +  str(r))
 
     
 ## Deckungsbeitrag
@@ -240,14 +240,8 @@ dbgesamt = sum((product.vk - product.mk) * optimal_values[variableMap[product.na
 print()
 print('DB gesamt: ' + str(dbgesamt))
 
-for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))
+for matName, r in zip(bom.materialNames, bom.remaining(materialLimitArray, optimalQuantities)):
+    remainingMaterial[matName] = r
 
 
 print(remainingMaterial.values())
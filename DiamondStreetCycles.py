@@ -3,12 +3,28 @@
 DiamondStreetStyles - main.py
 """
 
+import sys
+
 import xpress as xp
+import numpy as np
 import pandas as pd
-import xlsxwriter
+
+from dss import PlanningData
+from dss.analytics import PlanMetrics
+from dss.ingest import readWorkbook
+from dss.scenarios import ScenarioChain
+from dss.backends import loadXpress
+from dss.builder import OUTLET_DISCOUNT, buildLinearModel
+from dss.report import openReport
+from dss.resultcache import ResultCache
+from dss.telemetry import Telemetry
+
+# opt-in phase timings and solver statistics, see dss/telemetry.py (DSS_TELEMETRY=runs.jsonl)
+telemetry = Telemetry.fromEnv("DiamondStreetCycles")
 
 #excel file which will be created 
-workbook = xlsxwriter.Workbook('Output.xlsx')
+# written from result arrays, a .csv / .parquet path gives one file per table instead (dss/report.py)
+report = openReport('Output.xlsx')
 
 
 
@@ -50,12 +66,19 @@ DSS = xp.problem("DiamondStreetStyles")
 DSS.setControl('outputlog', 0)
 
 # Laden der Excel File und auslesen von Material, Produkt, Fixkosten und Variablen
-file_path = 'Produktionsplanung.xlsx'  # Replace with your file path
-material_df = pd.read_excel(file_path, sheet_name='Material')
-produkt_df = pd.read_excel(file_path, sheet_name='Produkt')
-fixed_costs_df = pd.read_excel(file_path, sheet_name='Fixkosten')
-variables_df = pd.read_excel(file_path, sheet_name='Variablen')
+# optional first argument, e.g. a generated workbook from dss/synthetic.py
+file_path = sys.argv[1] if len(sys.argv) > 1 else 'Produktionsplanung.xlsx'
+telemetry.annotate(workbook=file_path)
+telemetry.mark('ingest')
+# the workbook is parsed once and cached in .dss_cache, unchanged files are read from the cache
+sheets = readWorkbook(file_path)
+material_df = sheets['Material']
+produkt_df = sheets['Produkt']
+fixed_costs_df = sheets['Fixkosten']
+variables_df = sheets['Variablen']
+
 
+telemetry.mark('data')
 
 ## Create a list with all products
 
@@ -93,93 +116,113 @@ for idx in range(len(materialNames)):
     # Add the Material object to the dictionary, using the material name as the key to the object.
     materialMap[materialNames[idx]] = mat
 
-# Create an empty dictionary to store optimization variables, using product names as keys.
-variableMap = {}
-
-# Iterate through a list of product objects.
-for prod in productList:
-    # Create an optimization variable for each product using the product's name.
-    variableMap[prod.name] = xp.var(name=prod.name)
-    # Add the created variable to a collection of variables, presumably for an optimization model.
-    DSS.addVariable(variableMap[prod.name])
+# Planning data as arrays with the sparse product x material matrix, built once.
+# Constraints, remaining material and reporting read from it instead of
+# rescanning the product list for every material.
+planningData = PlanningData.fromFrames(material_df, produkt_df, fixed_costs_df, variables_df)
+bom = planningData.bom
 
+telemetry.mark('build')
 
+## Model build mode
+# False: one xp.var / xp.constraint object per product and material row
+# True:  the whole LP is loaded in one bulk call from NumPy arrays (dss.builder),
+#        with the same variables, rows and row order as below
+MATRIX_BUILD = False
 
+if MATRIX_BUILD:
+    loadXpress(DSS, buildLinearModel(planningData))
+    
+    variables = DSS.getVariable()
+    variableMap = dict(zip(bom.productNames, variables))
     
-### Constraints
+    # material rows, offcut rules, Maximalprognose, Mindestproduktionsmenge - same order as below
+    constraintList = DSS.getConstraint()
+    maxConstraintList = [c for c in constraintList if c.name.startswith('Max_')]
 
-# Initialize an empty list to hold all constraints
-constraintList = []
+else:
+    # Create an empty dictionary to store optimization variables, using product names as keys.
+    variableMap = {}
+
+    # Iterate through a list of product objects.
+    for prod in productList:
+        # Create an optimization variable for each product using the product's name.
+        variableMap[prod.name] = xp.var(name=prod.name)
+        # Add the created variable to a collection of variables, presumably for an optimization model.
+        DSS.addVariable(variableMap[prod.name])
+
+    # Variables in product order, aligned with the rows of the BOM
+    variables = list(variableMap.values())
 
-## Material Constraints
 
-# Loop over each material name in the materialMap dictionary
-for matName in materialMap:   
-    # Initialize a temporary list to hold products that use the current material
-    tempList = []
     
-    # Loop over each product in the productList
-    for prod in productList:
-        # If the current material is used in the product
-        if matName in prod.materials:
-            # Add the product to the temporary list
-            tempList.append(prod)
+    ### Constraints
+
+    # Initialize an empty list to hold all constraints
+    constraintList = []
+
+    ## Material Constraints
+
+    # Loop over each material name in the materialMap dictionary
+    for matName in materialMap:   
+        # Products that use the current material and the amount they need, read from the BOM
+        prodIdx, amounts = bom.usage(matName)
     
-    # Create a constraint ensuring the sum of the materials used by the products
-    # does not exceed the material limit. This is done by summing the product
-    # of the material quantity used in each product and the corresponding variable
-    # from the variableMap, for all products that use the material.
-    c_mat = xp.constraint(
-        xp.Sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList))) <= materialMap[matName].limit,
-        name=matName
-    )
+        # Create a constraint ensuring the sum of the materials used by the products
+        # does not exceed the material limit. This is done by summing the product
+        # of the material quantity used in each product and the corresponding variable,
+        # for all products that use the material.
+        c_mat = xp.constraint(
+            xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts)) <= materialMap[matName].limit,
+            name=matName
+        )
     
-    # Add the constraint to the problem
-    DSS.addConstraint(c_mat)
+        # Add the constraint to the problem
+        DSS.addConstraint(c_mat)
     
-    # Add the created constraint to the constraint list
-    constraintList.append(c_mat)
+        # Add the created constraint to the constraint list
+        constraintList.append(c_mat)
 
     
  
-## Offcut Control
-# TO-DO condition in excel
-
-# Create constraints based on the condition that the quantity of 'Fleece-Top' should be greater than or equal to 'Fleece-Shirt'
-c_ver1 = variableMap['Fleece-Top'] >= variableMap['Fleece-Shirt']
-# Create constraints based on the condition that the quantity of 'Sweatshorts' should be greater than or equal to 'Sweatshirt'
-c_ver2 = variableMap['Sweatshorts'] >= variableMap['Sweatshirt']
-# Add the constraints to the problem
-DSS.addConstraint(c_ver1)
-DSS.addConstraint(c_ver2)
-# Append the constraints to the constraint list for later reference
-constraintList.append(c_ver1)
-constraintList.append(c_ver2)
-
-# Initialize a list for maximum constraints - important, do not delete!!!
-maxConstraintList = []
-
-## Maximum Forecast
-for product in productList:
-    if product.maxp > 0:
-        # Create a constraint for maximum production limit
-        constraint = variableMap[product.name] <= product.maxp
-        # Add the constraint to the optimizer
-        DSS.addConstraint(constraint)
-        # Add the constraint to the list for tracking
-        constraintList.append(constraint)
-        # Add the constraint to the maximum constraint list - do not delete!!!
-        maxConstraintList.append(constraint)
-
-# Minimum Production Quantity
-for product in productList:
-    if product.minp > 0:
-        # Create a constraint for minimum production quantity
-        constraint = variableMap[product.name] >= product.minp
-        # Add the constraint to the optimizer
-        DSS.addConstraint(constraint)
-        # Add the constraint to the constraint list for tracking
-        constraintList.append(constraint)
+    ## Offcut Control
+    # TO-DO condition in excel
+
+    # Create constraints based on the condition that the quantity of 'Fleece-Top' should be greater than or equal to 'Fleece-Shirt'
+    c_ver1 = variableMap['Fleece-Top'] >= variableMap['Fleece-Shirt']
+    # Create constraints based on the condition that the quantity of 'Sweatshorts' should be greater than or equal to 'Sweatshirt'
+    c_ver2 = variableMap['Sweatshorts'] >= variableMap['Sweatshirt']
+    # Add the constraints to the problem
+    DSS.addConstraint(c_ver1)
+    DSS.addConstraint(c_ver2)
+    # Append the constraints to the constraint list for later reference
+    constraintList.append(c_ver1)
+    constraintList.append(c_ver2)
+
+    # Initialize a list for maximum constraints - important, do not delete!!!
+    maxConstraintList = []
+
+    ## Maximum Forecast
+    for product in productList:
+        if product.maxp > 0:
+            # Create a constraint for maximum production limit
+            constraint = variableMap[product.name] <= product.maxp
+            # Add the constraint to the optimizer
+            DSS.addConstraint(constraint)
+            # Add the constraint to the list for tracking
+            constraintList.append(constraint)
+            # Add the constraint to the maximum constraint list - do not delete!!!
+            maxConstraintList.append(constraint)
+
+    # Minimum Production Quantity
+    for product in productList:
+        if product.minp > 0:
+            # Create a constraint for minimum production quantity
+            constraint = variableMap[product.name] >= product.minp
+            # Add the constraint to the optimizer
+            DSS.addConstraint(constraint)
+            # Add the constraint to the constraint list for tracking
+            constraintList.append(constraint)
 
     
 ## Übriges Material
@@ -187,13 +230,9 @@ for product in productList:
 remainingMaterial = {}
 
 for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
+    prodIdx, amounts = bom.usage(matName)
     
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * variableMap[tempList[i].name] for i in range(len(tempList)))
+    remainingMaterial[matName] = materialMap[matName].limit - xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts))
 
 
 #### Kosten #### 
@@ -232,25 +271,37 @@ DSS.setObjective(objective, sense=xp.maximize)
 # LP-OPTIMIERUNG
 # ************************************
 
+# The three variants below (base LP, without polyester return, outlet) are solved
+# as one chain: the optimal basis of each solve is loaded before the next one
+WARM_START = True
+# results of identical models come from .dss_cache/results instead of the solver (DSS_RESULT_CACHE=0 switches it off)
+resultCache = ResultCache.fromEnv()
+chain = ScenarioChain(DSS, warmStart=WARM_START, telemetry=telemetry, cache=resultCache)
+telemetry.mark('solve LP')
+
 # Optimize the linear programming model
-DSS.lpoptimize()
+# Solution, slacks, duals, reduced costs, basis and ranging in one go, all reporting
+# and sensitivity code below reads from this object
+lpResult = chain.solveResult("LP", ranging=True)
+telemetry.mark('report LP')
 print("------------------")
 print("LP OPTIMIZATION")
 print("------------------")
 
 # Retrieve the optimization solution
-solution = DSS.getSolution()
+solution = lpResult.primal.tolist()
 # Get the slack values from the solution
-schlupf = DSS.getSlack()
+schlupf = lpResult.slack.tolist()
 # Get the dual values from the solution
-dualwerte = DSS.getDual()
+dualwerte = lpResult.dual.tolist()
 # Get the reduced costs from the solution
-redkosten = DSS.getRCost()
+redkosten = lpResult.reducedCost.tolist()
 # Get the objective function value from the solution
-ZFWert = DSS.getObjVal()
+ZFWert = lpResult.objective
 
-# Create a dictionary of optimal values for each variable
-optimal_values = {var: DSS.getSolution(var) for var in variableMap.values()}
+# Optimal values in product order, used for the BOM based reporting math
+productNames = list(variableMap)
+optimalQuantities = lpResult.values(productNames)
 
 # Print the solution
 print("Solution:", solution)
@@ -270,37 +321,31 @@ print()
 print('Production per Variable')
 print()
 
-# Initialize the total production counter
-gesamtProd = 0
+worksheet = report.sheet("OPRIMALER PRODUKTIONSPLAM")
+worksheetP = report.sheet("KEIN PLOYESTER")
+worksheetO = report.sheet("PRODUKTIONSPLAN OUTLET")
 
+# production level per product
+planValues = optimalQuantities.tolist()
 
-worksheet = workbook.add_worksheet(name="OPRIMALER PRODUKTIONSPLAM")
-worksheetP = workbook.add_worksheet(name="KEIN PLOYESTER")
-worksheetO = workbook.add_worksheet(name="PRODUKTIONSPLAN OUTLET")
+for name, value in zip(productNames, planValues):
+    print(name + ": " + str(value))
 
-row = 1
+# Sum up the total production level
+gesamtProd = sum(planValues)
 
-# Iterate through each variable and print its production level
-for name, var in variableMap.items():
-    print(name + ": " + str(DSS.getSolution(name)))
-    # Sum up the total production level
-    gesamtProd += DSS.getSolution(name)
-    worksheet.write(row, 0, name)
-    worksheet.write(row, 1, DSS.getSolution(name))
-    
-    row += 1
+row = worksheet.table(1, [productNames, planValues], ['Produkt', 'Menge'])
     
 # Print the total production quantity
 print()
 print("Total Manufacturing Quantity: " + str(gesamtProd))
 row += 1
 
-worksheet.write(row, 0, "Total Manufacturing Quantity: ")
-worksheet.write(row, 1, gesamtProd)
+worksheet.cells(row, ["Total Manufacturing Quantity: ", gesamtProd])
 
 row += 2
 
-worksheet.write(row, 0, "Rücksendungen")
+worksheet.cells(row, ["Rücksendungen"])
 
 row += 1
 
@@ -309,22 +354,15 @@ print()
 print('Returns')
 print()
 
-# For each material, calculate and print the returns
-for matName in materialMap:   
-    tempList = []
-    
-    # Collect products that use the current material
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    # Calculate and print the amount of material returned
-    r = materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))
+# returns, margins, return costs and refunds of the plan, all from sparse products over the BOM
+metrics = PlanMetrics(planningData, optimalQuantities)
+returns = metrics.remaining
+
+# For each material, print the returns
+for matName, r in zip(bom.materialNames, returns):
     print(matName + ': ' +  str(r))
-    worksheet.write(row, 0, matName)
-    worksheet.write(row, 1, r)
-    
-    row += 1
+
+row = worksheet.table(row, [bom.materialNames, returns], ['Material', 'Rücksendung'])
 
 row += 1
 # Contribution Margin
@@ -334,70 +372,57 @@ print()
 print("Contribution Margin per Product")
 print()
 
-worksheet.write(row, 0, "Contribution Margin per Product: ")
+worksheet.cells(row, ["Contribution Margin per Product: "])
 
 row += 1
 # Calculate and print the contribution margin for each product
-for product in productList:
-    db_product = (product.vk - product.mk) * optimal_values[variableMap[product.name]]
-    worksheet.write(row, 0, product.name)
-    worksheet.write(row, 1, db_product)
-    row += 1
+dbProducts = metrics.margin.tolist()
+for product, db_product in zip(productList, dbProducts):
     print(f"Contribution Margin - {product.name}: {db_product}")
 
+row = worksheet.table(row, [[product.name for product in productList], dbProducts], ['Produkt', 'Deckungsbeitrag'])
+
 row+= 1
 
 
 # Total contribution margin
-dbgesamt = sum((product.vk - product.mk) * optimal_values[variableMap[product.name]] for product in productList) - totalMaterialCosts
-worksheet.write(row, 0, "Contribution Margin total: ")
-worksheet.write(row, 1, dbgesamt)
+dbgesamt = metrics.totalMargin
+worksheet.cells(row, ["Contribution Margin total: ", dbgesamt])
 
 
 row += 2
 print()
 print('Total Contribution Margin: ' + str(dbgesamt))
 
-# Calculate the remaining material after production
-for matName in materialMap:   
-    tempList = []
-    
-    # Collect products that use the current material
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    # Calculate the remaining material for each material type
-    remainingMaterial[matName] = materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))
+# Remaining material after production, already computed from the BOM above
+for matName, r in zip(bom.materialNames, returns):
+    remainingMaterial[matName] = r
 
 # Print the remaining material quantities
 print(remainingMaterial.values())
 
 
 # Calculate and print the return costs
-rc = sum(remainingMaterial.values()) * variables_df.loc[0, 'Rücksendekosten']
+rc = metrics.totalReturnCosts
 print('Return Costs: ' + str(rc))
 
 
-worksheet.write(row, 0, "Return Costs: ")
-worksheet.write(row, 1, rc)
+worksheet.cells(row, ["Return Costs: ", rc])
 
 row += 2
   
 # Calculate and print the money obtained from returns
-rm = sum(quantity * materialMap[matName].costs for matName, quantity in remainingMaterial.items())
+rm = metrics.totalRefund
 print('Return Money: ' + str(rm))
 print()
 
 
-worksheet.write(row, 0, "Return Money: ")
-worksheet.write(row, 1, rm)
+worksheet.cells(row, ["Return Money: ", rm])
 
 row += 2
 
 
-worksheet.write(row, 0, "Profit: ")
-worksheet.write(row, 1, ZFWert)
+worksheet.cells(row, ["Profit: ", ZFWert])
 
 # ************************************
 # Sensitivitaetsanalyse
@@ -407,83 +432,71 @@ print("------------------")
 print("SENSITIVITÄTSANALYSE")
 print("------------------")
 
-worksheetS = workbook.add_worksheet(name="INCREASE MACHINE COSTS")
+telemetry.mark('sensitivity')
+
+worksheetS = report.sheet("INCREASE MACHINE COSTS")
 
 # Sensitivitätsanalyse für Zielfunktionskoeffizienten
 all_variables = list(variableMap.values())
 
-# Prepare empty lists for the lower and upper bounds.
-lower_obj = []
-upper_obj = []
+# objsa ranges of the objective coefficients, computed with the LP result
+lower_obj = lpResult.lowerObj[lpResult.cols(productNames)].tolist()
+upper_obj = lpResult.upperObj[lpResult.cols(productNames)].tolist()
 
-# Call the objsa function with the correct parameters.
-DSS.objsa(all_variables, lower_obj, upper_obj)
-
-# Now lower_obj and upper_obj lists will be populated with the sensitivity ranges for the objective coefficients.
+# Now lower_obj and upper_obj lists hold the sensitivity ranges for the objective coefficients.
 print("\nSensitivity for Objective Function Coefficients:")#
 print()
 
 
 # calculate the Zielfunktionskoeffizient
-zfkList = []
-for prod in productList:
-    zfk = 0
-    for mat in materialNames:
-        if mat in prod.materials:
-            x = prod.materials[mat] * 0.1
-            zfk += x
-            y = prod.materials[mat] * materialMap[mat].costs
-            zfk -= y
-    
-    zfk += prod.vk - prod.mk
-    zfkList.append(zfk)
+# per unit: margin + return costs saved - refund lost for the material used, read from the BOM
+materialCostArray = np.asarray(materialCosts, dtype=float)
+zfkList = list(produkt_df['Verkaufspreis'].to_numpy(dtype=float) - produkt_df['Maschinenkosten'].to_numpy(dtype=float)
+               + bom.matrix @ (variables_df.loc[0, 'Rücksendekosten'] - materialCostArray))
     
 
 print('Steigerung der Maschinenkosten bis ein Impact auf den optimalen Produktionsplan')
 
 row = 1
 
-worksheetS.write(row, 0, "Wie viel müssen die Maschinenkosten pro Produkt steigen um den optimalen Plan zu beeinflussen?")
+worksheetS.cells(row, ["Wie viel müssen die Maschinenkosten pro Produkt steigen um den optimalen Plan zu beeinflussen?"])
 
 row += 1
 
-for var, lo, zfk in zip(all_variables, lower_obj, zfkList):
-    print(f"{var.name}: {zfk-lo}")
-    worksheetS.write(row, 0, var.name)
-    worksheetS.write(row, 1, zfk-lo)
-    
-    row += 1
+machineCostIncrease = [zfk - lo for lo, zfk in zip(lower_obj, zfkList)]
+for var, increase in zip(all_variables, machineCostIncrease):
+    print(f"{var.name}: {increase}")
+
+row = worksheetS.table(row, [[var.name for var in all_variables], machineCostIncrease],
+                       ['Produkt', 'Maschinenkosten Steigerung'])
     
 
-worksheetE = workbook.add_worksheet(name="IMPACT OF EXTRA ELASTAN")
+worksheetE = report.sheet("IMPACT OF EXTRA ELASTAN")
 
 row = 1
 
 print()
 print('Impact von 1 Elastan auf Gewinn') 
 print()
-lower_rhs, upper_rhs = [], []
-
-worksheetE.write(row, 0, 'Which Impact has one extra Elastan on the profit?')
+worksheetE.cells(row, ['Which Impact has one extra Elastan on the profit?'])
 
 row += 1
 
-idx = list(materialMap).index("Elastan")
+idx = lpResult.rowIndex["Elastan"]
 
-DSS.rhssa([idx], lower_rhs, upper_rhs)
+# rhssa range of the Elastan row, computed with the LP result
+lower_rhs, upper_rhs = lpResult.lowerRhs[[idx]].tolist(), lpResult.upperRhs[[idx]].tolist()
 
 
-worksheetE.write(row, 0, 'Increase per Elastan: ')
-worksheetE.write(row, 1, DSS.getDual(idx))
+worksheetE.cells(row, ['Increase per Elastan: ', lpResult.dual[idx]])
 
-print(DSS.getDual(idx))
+print(lpResult.dual[idx].item())
 
 print("Die trifft zu bis zu einer Menge von: ", upper_rhs)
 
 row += 2
 
-worksheetE.write(row, 0, 'This is valid until a total Elastan of: ')
-worksheetE.write(row, 1, upper_rhs[0])
+worksheetE.cells(row, ['This is valid until a total Elastan of: ', upper_rhs[0]])
 
 print()
 
@@ -495,8 +508,8 @@ inactive_constraints = []
 
 
 # Schlupf für jede Nebenbedingung überprüfen
-for idx, constr in enumerate(constraintList):
-    slack_value = DSS.getSlack(constr)
+constraintSlacks = lpResult.slack[lpResult.rows([constr.name for constr in constraintList])]
+for idx, slack_value in enumerate(constraintSlacks):
     if slack_value == 0:
         active_constraints.append(f'NB{idx+1}')  # +1, weil die Zählung der Constraints bei 1 beginnt
     else:
@@ -506,12 +519,8 @@ for idx, constr in enumerate(constraintList):
 print("Aktive Nebenbedingungen:", active_constraints)
 print("Inaktive Nebenbedingungen:", inactive_constraints)
 
-# Erstellen Sie zwei leere Listen für rowstat und colstat
-rowstat = [0] * DSS.attributes.rows
-colstat = [0] * DSS.attributes.cols
-
-# Rufen Sie getbasis auf, um die Basisstatus zu erhalten
-DSS.getbasis(rowstat, colstat)
+# Basisstatus aus dem LP-Ergebnis
+colstat = lpResult.colBasis[lpResult.cols(productNames)]
 
 # Finden Sie die Basis- und Nicht-Basisvariablen
 basis_vars = []
@@ -533,6 +542,7 @@ print("Nicht-Basisvariablen:", nonbasis_vars)
 
 print("------------------")
 print("LP-OPTIMIERUNG OHNE RÜCKNAHME PLOYESTER")
+telemetry.mark('LP ohne Rücknahme Polyester')
 print("------------------")
 
 
@@ -544,10 +554,9 @@ objective = sum((product.vk - product.mk) * variableMap[product.name] for produc
 
 DSS.setObjective(objective, sense=xp.maximize)
 
-DSS.lpoptimize()
-
-solution = DSS.getSolution()
-ZFWert = DSS.getObjVal()
+result = chain.solveResult("LP ohne Rücknahme Polyester")
+solution = result.primal.tolist()
+ZFWert = result.objective
 
 
 print("Lösung:", solution)
@@ -558,35 +567,52 @@ print("ZFW:", ZFWert)
 print('Produktion pro Variable')
 print()
 
-row = 1
+planValues = result.values(productNames).tolist()
 
-for name, var in variableMap.items():
-    print(name + ": " + str(DSS.getSolution(name)))
-    worksheetP.write(row, 0, name)
-    worksheetP.write(row, 1, DSS.getSolution(name))
-    
-    row += 1
+for name, value in zip(productNames, planValues):
+    print(name + ": " + str(value))
+
+worksheetP.table(1, [productNames, planValues], ['Produkt', 'Menge'])
     
     
 print("------------------")
 print("LP-OPTIMIERUNG OUTLET")
+telemetry.mark('LP Outlet')
 print("------------------")
 
 #löschen der Constraints die efür in Produktionsmaximum sorgen
 DSS.delConstraint(maxConstraintList)
 
+# Produktion über der Maximalprognose geht ins Outlet. Instead of max(x - maxp, 0) in the
+# objective every capped product gets a regular and an outlet sales variable:
+#   x = regulär + outlet,   regulär <= maxp,   outlet loses OUTLET_DISCOUNT of the Deckungsbeitrag
+# Outlet units earn less, so the LP only sells in the outlet above the forecast and the model
+# stays a pure LP. The new columns start non-basic at 0, the basis of the last solve is the warm start.
+outletProducts = [p for p in productList if p.maxp > 0]
+n = len(outletProducts)
+
+# both columns per product in one call, as plain columns they work with either build mode
+firstCol = DSS.attributes.cols
+DSS.addcols([0.0] * 2 * n, [0] * (2 * n + 1), [], [],
+            [0.0] * 2 * n, [p.maxp for p in outletProducts] + [xp.infinity] * n,
+            ['Regulär_' + p.name for p in outletProducts] + ['Outlet_' + p.name for p in outletProducts])
+newVariables = DSS.getVariable()[firstCol:]
+regularMap = dict(zip([p.name for p in outletProducts], newVariables[:n]))
+outletMap = dict(zip([p.name for p in outletProducts], newVariables[n:]))
+
+for p in outletProducts:
+    DSS.addConstraint(xp.constraint(variableMap[p.name] - regularMap[p.name] - outletMap[p.name] == 0,
+                                    name='Absatz_' + p.name))
+
+#Outlet-Menge multiplizieren mit gewinn und 0.4 und dann abziehen
+# (no discount on a negative Deckungsbeitrag, there the LP would move units into the outlet)
+objective = sum((product.vk - product.mk) * variableMap[product.name] for product in productList) - totalCosts - sum(OUTLET_DISCOUNT * max(p.vk - p.mk, 0) * outletMap[p.name] for p in outletProducts)
 
-#herausfinden für welche Produkte das Produktionsmaximum überschritten wurde
-overstockMap = {p.name: xp.max(0, variableMap[p.name] - p.maxp ) for p in productList}
-
-#amount über maximum multiplizieren mit gewinn und 0.4 und dann abziehen
-objective = sum((product.vk - product.mk) * variableMap[product.name] for product in productList) - totalCosts - sum(0.4 * (p.vk - p.mk) * xp.max(variableMap[p.name] - p.maxp, 0) for p in productList)
-
-
-DSS.lpoptimize()
+DSS.setObjective(objective, sense=xp.maximize)
 
-solution = DSS.getSolution()
-ZFWert = DSS.getObjVal()
+result = chain.solveResult("LP Outlet")
+solution = result.primal.tolist()
+ZFWert = result.objective
 
 
 print("Lösung:", solution)
@@ -599,40 +625,34 @@ row = 1
 print('Produktion pro Variable, Produktion über MaxPrognose')
 print()
 
-worksheetO.write(row, 0, "Name")
-worksheetO.write(row, 1, "Amount")
-worksheetO.write(row, 2, "Amount over MaxProg")
+planValues = result.values(productNames).tolist()
+outletSales = dict(zip(outletMap, result.values(['Outlet_' + name for name in outletMap]).tolist()))
+overMaxValues = [outletSales.get(p.name, 0.0) for p in productList]
 
-row += 2
- 
-for p in productList:
-    
-    overMax = max(0, DSS.getSolution(p.name) - p.maxp)
-    print(p.name + ": " + str(DSS.getSolution(p.name)) + ", " + str(overMax))
-    
-    worksheetO.write(row, 0, p.name)
-    worksheetO.write(row, 1, str(DSS.getSolution(p.name)))
-    worksheetO.write(row, 2, str(overMax))
-    
-    row += 1
+for p, value, overMax in zip(productList, planValues, overMaxValues):
+    print(p.name + ": " + str(value) + ", " + str(overMax))
+
+worksheetO.table(row + 2, [[p.name for p in productList], [str(v) for v in planValues], [str(v) for v in overMaxValues]],
+                 ["Name", "Amount", "Amount over MaxProg"], headerRow=row)
     
     
     
-optimal_values = {var: DSS.getSolution(var) for var in variableMap.values()}
-
 ## Zurücksendungen
 print()
 print('Zurücksendungen')
 print()
 
-for matName in materialMap:   
-    tempList = []
-    
-    for prod in productList:
-        if matName in prod.materials:
-            tempList.append(prod)
-    
-    print(matName + ': ' +  str(materialMap[matName].limit - sum(tempList[i].materials[matName] * optimal_values[variableMap[tempList[i].name]] for i in range(len(tempList)))))
+for matName, r in zip(bom.materialNames, PlanMetrics(planningData, planValues).remaining):
+    print(matName + ': ' +  str(r))
+
+print()
+print("------------------")
+print("SOLVE STATISTICS")
+print("------------------")
+chain.report()
+
+telemetry.mark('write Output.xlsx')
+report.close()
 
-workbook.close()
+telemetry.finish()
 
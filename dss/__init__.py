@@ -0,0 +1,9 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - gemeinsame Bausteine für die Planungsskripte
+"""
+
+from dss.bom import BillOfMaterials
+from dss.data import PlanningData
+from dss.ingest import readWorkbook, readPlanningData
+from dss.scenarios import ScenarioChain
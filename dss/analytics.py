@@ -0,0 +1,114 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Kennzahlen nach dem Solve
+
+All post-solve figures of DiamondStreetCycles.py computed from the plan
+vector with sparse products over the bill of materials, instead of loops
+over products and materials:
+
+    consumption   A^T q                   material used per material
+    remaining     limits - A^T q          Rücksendungen
+    margin        (vk - mk) * q           Deckungsbeitrag per product
+    materialCost  (A c) * q               material cost per product
+    returnCosts   rk * remaining          per material
+    refund        c * remaining           Rückerstattung per material
+
+Materials listed in `noReturn` are not sent back: they have no return
+costs and no refund (the "ohne Rücknahme" variant of the script).
+
+The profit decomposition adds up to the objective of the LP:
+
+    profit = revenue - machine costs - material purchase - fixed costs
+             - return costs + refund
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class PlanMetrics:
+
+    def __init__(self, data, plan, noReturn=()):
+        self.data = data
+        self.plan = np.asarray(plan, dtype=float)
+        bom = data.bom
+
+        ## Material
+        self.consumption = bom.consumption(self.plan)
+        self.remaining = data.limits - self.consumption
+        returned = ~np.isin(data.materialNames, list(noReturn))
+        self.returnCosts = np.where(returned, data.returnCost * self.remaining, 0.0)
+        self.refund = np.where(returned, data.costs * self.remaining, 0.0)
+
+        ## Produkt
+        self.revenue = data.vk * self.plan
+        self.machineCosts = data.mk * self.plan
+        self.margin = data.margin * self.plan
+        self.materialCost = (bom.matrix @ data.costs) * self.plan
+
+    @classmethod
+    def fromProblem(cls, data, problem, variables=None, noReturn=()):
+        """Metrics of the current Xpress solution, the plan is fetched in one call."""
+        cols = variables if variables is not None else list(range(data.numProducts))
+        return cls(data, problem.getSolution(cols), noReturn)
+
+    ## Summen
+
+    @property
+    def totalQuantity(self):
+        return self.plan.sum()
+
+    @property
+    def purchaseCosts(self):
+        """All material is bought up to its limit."""
+        return float(self.data.costs @ self.data.limits)
+
+    @property
+    def totalMargin(self):
+        """Deckungsbeitrag gesamt as in the script: margins minus material purchase."""
+        return self.margin.sum() - self.purchaseCosts
+
+    @property
+    def totalReturnCosts(self):
+        return self.returnCosts.sum()
+
+    @property
+    def totalRefund(self):
+        return self.refund.sum()
+
+    @property
+    def profit(self):
+        return (self.margin.sum() - self.purchaseCosts - self.data.fixedCosts
+                - self.totalReturnCosts + self.totalRefund)
+
+    def decomposition(self):
+        """Profit decomposition as a Series, the last entry is the profit."""
+        return pd.Series({
+            'Umsatz': self.revenue.sum(),
+            'Maschinenkosten': -self.machineCosts.sum(),
+            'Materialeinkauf': -self.purchaseCosts,
+            'Fixkosten': -self.data.fixedCosts,
+            'Rücksendekosten': -self.totalReturnCosts,
+            'Rückerstattung': self.totalRefund,
+            'Gewinn': self.profit,
+        })
+
+    ## Tabellen
+
+    def productFrame(self):
+        return pd.DataFrame({
+            'Menge': self.plan,
+            'Umsatz': self.revenue,
+            'Maschinenkosten': self.machineCosts,
+            'Deckungsbeitrag': self.margin,
+            'Materialkosten': self.materialCost,
+        }, index=pd.Index(self.data.productNames, name='Produkt'))
+
+    def materialFrame(self):
+        return pd.DataFrame({
+            'Limit': self.data.limits,
+            'Verbrauch': self.consumption,
+            'Rücksendung': self.remaining,
+            'Rücksendekosten': self.returnCosts,
+            'Rückerstattung': self.refund,
+        }, index=pd.Index(self.data.materialNames, name='Material'))
@@ -0,0 +1,524 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Solver-Backends
+
+The model-building code produces a LinearModel (dss.builder) and hands it
+to a SolverBackend. Two implementations, plus AutoBackend ('auto') that
+starts with Xpress and moves the model to HiGHS when Xpress cannot start
+or refuses it (license, size limit of the Community license):
+
+    XpressBackend  - FICO Xpress, keeps the problem (and its basis) alive
+                     between modifications and re-solves
+    HighsBackend   - HiGHS through scipy.optimize (linprog / milp), for
+                     workers without an Xpress license token; every solve
+                     starts from scratch
+
+Duals, slacks and reduced costs follow the Xpress conventions for both:
+dual = d objective / d rhs, slack = rhs - row activity, reduced cost =
+d objective / d column.
+
+python -m dss.backends runs both backends on the same instances and
+compares load time, solve time and objective.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from dss.builder import INFINITY, MAXIMIZE, LinearModel
+
+try:
+    import xpress as xp
+except ImportError:
+    xp = None
+
+
+def loadXpress(problem, model, probname="DiamondStreetStyles"):
+    """Load `model` into the (empty) xp.problem in one bulk call."""
+    csc = model.matrix.tocsc()
+    csc.sort_indices()
+    # types of the integer / binary columns only, listed by entind
+    entind = None if model.colTypes is None else np.flatnonzero(model.colTypes != 'C')
+
+    problem.loadproblem(
+        probname,
+        model.rowSense, model.rhs, None, model.objective,
+        csc.indptr, None, csc.indices, csc.data,
+        model.lb, model.ub,
+        coltype=None if entind is None else model.colTypes[entind],
+        entind=entind,
+        colnames=model.colNames, rownames=model.rowNames,
+    )
+
+    problem.chgobjsense(model.sense)
+    # index -1 is the fixed part of the objective on the right hand side
+    problem.chgobj([-1], [-model.objConstant])
+    return problem
+
+
+def _indices(idx, n):
+    return np.arange(n) if idx is None else np.asarray(idx, dtype=int)
+
+
+class SolverBackend:
+
+    name = None
+
+    def __init__(self):
+        self.model = None
+        self.isMip = False
+        self.loadTime = 0.0
+        self.solveTime = 0.0
+        self.iterations = 0
+
+    def load(self, model):
+        raise NotImplementedError
+
+    def solve(self):
+        """Optimize, returns True if an optimal solution was found."""
+        raise NotImplementedError
+
+    def objectiveValue(self):
+        raise NotImplementedError
+
+    def solution(self, cols=None):
+        raise NotImplementedError
+
+    def duals(self, rows=None):
+        raise NotImplementedError
+
+    def slacks(self, rows=None):
+        raise NotImplementedError
+
+    def reducedCosts(self, cols=None):
+        raise NotImplementedError
+
+    def changeObjective(self, cols, values, constant=None):
+        raise NotImplementedError
+
+    def changeRhs(self, rows, values):
+        raise NotImplementedError
+
+    def changeBounds(self, cols, lower=None, upper=None):
+        raise NotImplementedError
+
+    def addRows(self, rowSense, rhs, matrix):
+        raise NotImplementedError
+
+    def addCols(self, objective, lower, upper, matrix, names=None):
+        """Append columns, `matrix` has one row per existing row and one column per new column."""
+        raise NotImplementedError
+
+    def changeCoefficients(self, rows, cols, values):
+        raise NotImplementedError
+
+
+class XpressBackend(SolverBackend):
+
+    name = 'xpress'
+
+    def __init__(self, probname="DiamondStreetStyles"):
+        super().__init__()
+        if xp is None:
+            raise ImportError("xpress is not installed")
+        self.problem = xp.problem(probname)
+        self.problem.setControl('outputlog', 0)
+        self.probname = probname
+
+    def load(self, model):
+        start = time.perf_counter()
+        self.model = model
+        self.isMip = model.colTypes is not None and bool((model.colTypes != 'C').any())
+        loadXpress(self.problem, model, self.probname)
+        self.loadTime = time.perf_counter() - start
+        return self
+
+    def solve(self):
+        start = time.perf_counter()
+        if self.isMip:
+            self.problem.mipoptimize()
+            optimal = self.problem.attributes.mipstatus == xp.mip_optimal
+        else:
+            self.problem.lpoptimize()
+            optimal = self.problem.attributes.lpstatus == xp.lp_optimal
+        self.solveTime = time.perf_counter() - start
+        self.iterations = self.problem.attributes.simplexiter + self.problem.attributes.bariter
+        return optimal
+
+    def objectiveValue(self):
+        return self.problem.getObjVal()
+
+    def solution(self, cols=None):
+        return np.array(self.problem.getSolution(_indices(cols, self.problem.attributes.cols).tolist()))
+
+    def duals(self, rows=None):
+        return np.array(self.problem.getDual(_indices(rows, self.problem.attributes.rows).tolist()))
+
+    def slacks(self, rows=None):
+        return np.array(self.problem.getSlack(_indices(rows, self.problem.attributes.rows).tolist()))
+
+    def reducedCosts(self, cols=None):
+        return np.array(self.problem.getRCost(_indices(cols, self.problem.attributes.cols).tolist()))
+
+    def changeObjective(self, cols, values, constant=None):
+        cols, values = list(cols), list(values)
+        if constant is not None:
+            cols.append(-1)
+            values.append(-constant)
+        if cols:
+            self.problem.chgobj(cols, values)
+
+    def changeRhs(self, rows, values):
+        self.problem.chgrhs(list(rows), list(values))
+
+    def changeBounds(self, cols, lower=None, upper=None):
+        cols = list(cols)
+        types, values = [], []
+        if lower is not None:
+            types += ['L'] * len(cols)
+            values += list(lower)
+        if upper is not None:
+            types += ['U'] * len(cols)
+            values += list(upper)
+        if types:
+            self.problem.chgbounds(cols * ((lower is not None) + (upper is not None)), types, values)
+
+    def addRows(self, rowSense, rhs, matrix):
+        matrix = sparse.csr_matrix(matrix)
+        self.problem.addrows(list(rowSense), list(rhs), matrix.indptr.tolist(),
+                             matrix.indices.tolist(), matrix.data.tolist())
+
+    def addCols(self, objective, lower, upper, matrix, names=None):
+        matrix = sparse.csc_matrix(matrix)
+        self.problem.addcols(list(objective), matrix.indptr.tolist(), matrix.indices.tolist(), matrix.data.tolist(),
+                             list(lower), list(upper), names)
+
+    def changeCoefficients(self, rows, cols, values):
+        self.problem.chgmcoef(list(rows), list(cols), list(values))
+
+
+class HighsBackend(SolverBackend):
+
+    name = 'highs'
+
+    def __init__(self, probname="DiamondStreetStyles"):
+        super().__init__()
+        self.result = None
+
+    def load(self, model):
+        start = time.perf_counter()
+        # own copies, changes must not leak back into the caller's model
+        self.model = LinearModel(
+            model.colNames, model.objective.copy(), model.lb.copy(), model.ub.copy(),
+            model.matrix.copy(), model.rowSense.copy(), model.rhs.copy(), model.rowNames,
+            objConstant=model.objConstant, sense=model.sense, colTypes=model.colTypes,
+        )
+        if set(np.unique(self.model.rowSense)) - {'L', 'G', 'E'}:
+            raise ValueError("HighsBackend only supports 'L', 'G' and 'E' rows")
+        self.isMip = model.colTypes is not None and bool((model.colTypes != 'C').any())
+        self.loadTime = time.perf_counter() - start
+        return self
+
+    def _bounds(self):
+        lb = np.where(self.model.lb <= -INFINITY, -np.inf, self.model.lb)
+        ub = np.where(self.model.ub >= INFINITY, np.inf, self.model.ub)
+        return lb, ub
+
+    def solve(self):
+        from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+
+        m = self.model
+        start = time.perf_counter()
+        # scipy minimizes
+        c = -m.objective if m.sense == MAXIMIZE else m.objective
+        lb, ub = self._bounds()
+
+        if self.isMip:
+            rowLb = np.where(m.rowSense == 'L', -np.inf, m.rhs)
+            rowUb = np.where(m.rowSense == 'G', np.inf, m.rhs)
+            integrality = (m.colTypes != 'C').astype(int)
+            constraints = [LinearConstraint(m.matrix, rowLb, rowUb)] if m.numRows else []
+            self.result = milp(c, constraints=constraints, integrality=integrality, bounds=Bounds(lb, ub))
+        else:
+            isL, isG, isE = (m.rowSense == 'L'), (m.rowSense == 'G'), (m.rowSense == 'E')
+            ub_rows = np.flatnonzero(isL | isG)
+            sign = np.where(isG[ub_rows], -1.0, 1.0)
+            A_ub = sparse.diags(sign) @ m.matrix[ub_rows] if len(ub_rows) else None
+            b_ub = sign * m.rhs[ub_rows] if len(ub_rows) else None
+            eq_rows = np.flatnonzero(isE)
+            A_eq = m.matrix[eq_rows] if len(eq_rows) else None
+            b_eq = m.rhs[eq_rows] if len(eq_rows) else None
+            self.result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                                  bounds=np.column_stack([lb, ub]), method='highs')
+            self._ubRows, self._ubSign, self._eqRows = ub_rows, sign, eq_rows
+
+        self.solveTime = time.perf_counter() - start
+        self.iterations = int(getattr(self.result, 'nit', 0) or 0)
+        return self.result.status == 0
+
+    def objectiveValue(self):
+        value = self.result.fun
+        return (-value if self.model.sense == MAXIMIZE else value) + self.model.objConstant
+
+    def solution(self, cols=None):
+        return self.result.x[_indices(cols, self.model.numCols)]
+
+    def duals(self, rows=None):
+        if self.isMip:
+            raise ValueError("No duals for a MIP")
+        # marginals are d(min objective)/d(b), back to d(objective)/d(rhs)
+        sense = -1.0 if self.model.sense == MAXIMIZE else 1.0
+        duals = np.zeros(self.model.numRows)
+        if len(self._ubRows):
+            duals[self._ubRows] = sense * self._ubSign * self.result.ineqlin.marginals
+        if len(self._eqRows):
+            duals[self._eqRows] = sense * self.result.eqlin.marginals
+        return duals[_indices(rows, self.model.numRows)]
+
+    def slacks(self, rows=None):
+        slack = self.model.rhs - self.model.matrix @ self.result.x
+        return slack[_indices(rows, self.model.numRows)]
+
+    def reducedCosts(self, cols=None):
+        if self.isMip:
+            raise ValueError("No reduced costs for a MIP")
+        sense = -1.0 if self.model.sense == MAXIMIZE else 1.0
+        rc = sense * (self.result.lower.marginals + self.result.upper.marginals)
+        return rc[_indices(cols, self.model.numCols)]
+
+    def changeObjective(self, cols, values, constant=None):
+        self.model.objective[np.asarray(cols, dtype=int)] = values
+        if constant is not None:
+            self.model.objConstant = float(constant)
+
+    def changeRhs(self, rows, values):
+        self.model.rhs[np.asarray(rows, dtype=int)] = values
+
+    def changeBounds(self, cols, lower=None, upper=None):
+        cols = np.asarray(cols, dtype=int)
+        if lower is not None:
+            self.model.lb[cols] = lower
+        if upper is not None:
+            self.model.ub[cols] = upper
+
+    def addRows(self, rowSense, rhs, matrix):
+        m = self.model
+        m.matrix = sparse.vstack([m.matrix, sparse.csr_matrix(matrix, shape=(len(rhs), m.numCols))], format='csr')
+        m.rowSense = np.concatenate([m.rowSense, np.asarray(rowSense, dtype='U1')])
+        m.rhs = np.concatenate([m.rhs, np.asarray(rhs, dtype=float)])
+        m.rowNames = m.rowNames + [f'R{m.numRows + i}' for i in range(len(rhs))]
+
+    def addCols(self, objective, lower, upper, matrix, names=None):
+        m = self.model
+        n = len(objective)
+        m.matrix = sparse.hstack([m.matrix, sparse.csr_matrix(matrix, shape=(m.numRows, n))], format='csr')
+        m.objective = np.concatenate([m.objective, np.asarray(objective, dtype=float)])
+        m.lb = np.concatenate([m.lb, np.asarray(lower, dtype=float)])
+        m.ub = np.concatenate([m.ub, np.asarray(upper, dtype=float)])
+        m.colNames = m.colNames + (list(names) if names is not None else [f'C{m.numCols + i}' for i in range(n)])
+        if m.colTypes is not None:
+            m.colTypes = np.concatenate([m.colTypes, np.full(n, 'C')])
+
+    def changeCoefficients(self, rows, cols, values):
+        matrix = self.model.matrix.tolil()
+        for row, col, value in zip(rows, cols, values):
+            matrix[row, col] = value
+        self.model.matrix = matrix.tocsr()
+
+
+class AutoBackend(SolverBackend):
+    """Xpress, or HiGHS when Xpress cannot start or refuses the model.
+
+    A restricted license (the Community license stops at 5000 rows +
+    columns) only fails at load or solve time. Then the model is loaded
+    into HiGHS, the changes made since load are replayed and the call is
+    repeated there. Everything else goes to the backend in use.
+    """
+
+    def __init__(self, probname="DiamondStreetStyles"):
+        super().__init__()
+        self.probname = probname
+        # (method, args) since load, replayed after a switch to HiGHS
+        self.changes = []
+        try:
+            self.backend = XpressBackend(probname)
+        except _XPRESS_ERRORS:
+            self.backend = HighsBackend(probname)
+
+    def __getattr__(self, attr):
+        # backend specific attributes, e.g. the xp.problem
+        if attr == 'backend':
+            raise AttributeError(attr)
+        return getattr(self.backend, attr)
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def _fallback(self):
+        self.backend = HighsBackend(self.probname)
+        self.backend.load(self.model)
+        for method, args in self.changes:
+            getattr(self.backend, method)(*args)
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except _XPRESS_ERRORS:
+            if self.backend.name != 'xpress':
+                raise
+            self._fallback()
+            return getattr(self.backend, method)(*args)
+        finally:
+            self.isMip, self.loadTime = self.backend.isMip, self.backend.loadTime
+            self.solveTime, self.iterations = self.backend.solveTime, self.backend.iterations
+
+    def _change(self, method, *args):
+        self._call(method, *args)
+        self.changes.append((method, args))
+
+    def load(self, model):
+        self.model = model
+        self.changes = []
+        self._call('load', model)
+        return self
+
+    def solve(self):
+        return self._call('solve')
+
+    def objectiveValue(self):
+        return self.backend.objectiveValue()
+
+    def solution(self, cols=None):
+        return self.backend.solution(cols)
+
+    def duals(self, rows=None):
+        return self.backend.duals(rows)
+
+    def slacks(self, rows=None):
+        return self.backend.slacks(rows)
+
+    def reducedCosts(self, cols=None):
+        return self.backend.reducedCosts(cols)
+
+    def changeObjective(self, cols, values, constant=None):
+        self._change('changeObjective', cols, values, constant)
+
+    def changeRhs(self, rows, values):
+        self._change('changeRhs', rows, values)
+
+    def changeBounds(self, cols, lower=None, upper=None):
+        self._change('changeBounds', cols, lower, upper)
+
+    def addRows(self, rowSense, rhs, matrix):
+        self._change('addRows', rowSense, rhs, matrix)
+
+    def addCols(self, objective, lower, upper, matrix, names=None):
+        self._change('addCols', objective, lower, upper, matrix, names)
+
+    def changeCoefficients(self, rows, cols, values):
+        self._change('changeCoefficients', rows, cols, values)
+
+
+BACKENDS = {'xpress': XpressBackend, 'highs': HighsBackend}
+
+# errors Xpress raises when it cannot start, e.g. no license token
+_XPRESS_ERRORS = (ImportError,) + ((xp.InterfaceError, xp.SolverError, xp.ModelError) if xp is not None else ())
+
+
+def getBackend(name='auto', probname="DiamondStreetStyles"):
+    """SolverBackend by name; 'auto' uses Xpress and switches to HiGHS if Xpress cannot start
+    or refuses to load / solve the model (AutoBackend)."""
+    if name == 'auto':
+        return AutoBackend(probname)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown solver backend '{name}', expected one of {list(BACKENDS)} or 'auto'")
+    return BACKENDS[name](probname)
+
+
+def solveModel(model, backend='auto', probname="DiamondStreetStyles"):
+    """Load and solve `model`, returns the backend (for solution, duals, ...)."""
+    solver = getBackend(backend, probname).load(model)
+    if not solver.solve():
+        raise RuntimeError(f"{probname} not solved to optimality with {solver.name}")
+    return solver
+
+
+def benchmark(instances, backends=('xpress', 'highs'), repeat=1):
+    """Solve every (name, build) instance with every backend.
+
+    `build()` returns a LinearModel; its time is reported once as build
+    time, load and solve time per backend (best of `repeat`).
+    """
+    rows = []
+    for name, build in instances:
+        start = time.perf_counter()
+        model = build()
+        buildTime = time.perf_counter() - start
+
+        for backendName in backends:
+            loadTimes, solveTimes = [], []
+            objective, iterations, error = None, None, None
+            for _ in range(repeat):
+                try:
+                    solver = getBackend(backendName).load(model)
+                    loadTimes.append(solver.loadTime)
+                    optimal = solver.solve()
+                    solveTimes.append(solver.solveTime)
+                    objective = solver.objectiveValue() if optimal else None
+                    iterations = solver.iterations
+                except Exception as e:
+                    # e.g. no license or size limit - keep benchmarking the other backend
+                    error = f"{type(e).__name__}: {e}"
+                    break
+            rows.append({
+                'instance': name, 'backend': backendName,
+                'columns': model.numCols, 'rows': model.numRows, 'nonzeros': model.matrix.nnz,
+                'build': buildTime,
+                'load': min(loadTimes) if loadTimes else None,
+                'solve': min(solveTimes) if solveTimes else None,
+                'iterations': iterations, 'objective': objective, 'error': error,
+            })
+    return rows
+
+
+if __name__ == '__main__':
+
+    import pandas as pd
+
+    from dss.builder import buildLinearModel
+    from dss.ingest import readPlanningData
+    from dss.procurement import buildProcurementModel
+    from dss.stochastic import buildSaaModel, sampleDemand
+
+    parser = argparse.ArgumentParser(description="Compare the Xpress and HiGHS backends on the same instances")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--saa', type=int, nargs='*', default=[100, 500], help="SAA scenario counts to include")
+    parser.add_argument('--integer', action='store_true', help="also solve the base model with integer quantities")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backends', nargs='+', default=['xpress', 'highs'], choices=list(BACKENDS))
+    parser.add_argument('--out', default=None, help="CSV file for the results")
+    args = parser.parse_args()
+
+    data = readPlanningData(args.workbook)
+
+    def integerModel():
+        model = buildLinearModel(data, boundsAsRows=False)
+        model.colTypes = np.full(model.numCols, 'I')
+        return model
+
+    instances = [
+        ('base LP', lambda: buildLinearModel(data)),
+        ('procurement LP', lambda: buildProcurementModel(data)),
+    ]
+    if args.integer:
+        instances.append(('base MIP', integerModel))
+    for n in args.saa:
+        instances.append((f'SAA {n}', lambda n=n: buildSaaModel(data, sampleDemand(data, n, seed=n))))
+
+    frame = pd.DataFrame(benchmark(instances, args.backends, args.repeat))
+    if args.out:
+        frame.to_csv(args.out, index=False)
+    print(frame.to_string(index=False))
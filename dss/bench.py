@@ -0,0 +1,346 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Benchmark der Pipeline-Phasen
+
+Runs the phases of DiamondStreetCycles.py one by one on a ladder of
+generated instances (dss.synthetic) and records wall time, peak RSS and
+solver iterations per phase:
+
+    ingest        readWorkbook of the generated xlsx, without cache
+    data          PlanningData / BillOfMaterials from the frames
+    build         the script's default build (MATRIX_BUILD = False): one
+                  xp.var per product, xp.constraint rows over the BOM and
+                  the objective as xp expression (Xpress only)
+    build matrix  LinearModel from dss.builder (MATRIX_BUILD = True) ...
+    load matrix   ... handed to the solver backend
+    solve         LP solve of the script's model (of the matrix model
+                  for HiGHS)
+    sensitivity   SolveResult with objsa / rhssa and basis like
+                  ScenarioChain.solveResult (Xpress only)
+    report        Output.xlsx through dss.report with the sheets of the
+                  script; the scenario sheets (KEIN PLOYESTER, OUTLET)
+                  get the LP plan, the scenarios themselves are not solved
+
+Every instance runs in a fresh process so the peak RSS belongs to that
+instance alone; the RSS of a phase is the peak reached by the end of it.
+
+    python -m dss.bench run --out baseline.json
+    python -m dss.bench run --out current.json --baseline baseline.json
+    python -m dss.bench compare baseline.json current.json --threshold 0.2
+
+compare exits with status 1 if a phase got slower (or bigger) than the
+threshold allows.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from dss.analytics import PlanMetrics
+from dss.backends import getBackend
+from dss.builder import OFFCUT_RULES, buildLinearModel, objectiveCoefficients
+from dss.data import PlanningData
+from dss.ingest import readWorkbook
+from dss.report import openReport
+from dss.results import SolveResult
+from dss.synthetic import generateFrames, writeWorkbook
+from dss.telemetry import peakRss
+
+try:
+    import xpress as xp
+except ImportError:
+    xp = None
+
+
+PHASES = ('ingest', 'data', 'build', 'build matrix', 'load matrix', 'solve', 'sensitivity', 'report')
+
+# products x materials; the largest rung still fits the Xpress community license
+LADDER = ('100x10', '500x30', '2000x100')
+
+# phases faster than this are not flagged, their timings are mostly noise
+MIN_TIME = 0.005
+
+
+def parseSize(spec):
+    """'1000x50' -> (1000, 50)"""
+    try:
+        products, materials = spec.lower().split('x')
+        return int(products), int(materials)
+    except ValueError:
+        raise ValueError(f"Instance size '{spec}' is not of the form <products>x<materials>") from None
+
+
+def buildObjects(data, offcutRules=OFFCUT_RULES):
+    """The LP as DiamondStreetCycles.py builds it by default, with xp.var / xp.constraint objects."""
+    problem = xp.problem("DiamondStreetStyles")
+    problem.setControl('outputlog', 0)
+    bom = data.bom
+
+    variables = [xp.var(name=name) for name in data.productNames]
+    problem.addVariable(variables)
+
+    ## Materialbeschränkungen
+    remaining = []
+    for matName, limit in zip(data.materialNames, data.limits):
+        prodIdx, amounts = bom.usage(matName)
+        used = xp.Sum(float(amount) * variables[i] for i, amount in zip(prodIdx, amounts))
+        problem.addConstraint(xp.constraint(used <= limit, name=matName))
+        remaining.append(limit - used)
+
+    ## Verschnittregelung
+    for larger, smaller in offcutRules:
+        if larger in bom.productIndex and smaller in bom.productIndex:
+            problem.addConstraint(variables[bom.productIndex[larger]] >= variables[bom.productIndex[smaller]])
+
+    ## Maximalprognose, Mindestproduktionsmenge
+    for i in np.flatnonzero(data.maxp > 0):
+        problem.addConstraint(variables[i] <= data.maxp[i])
+    for i in np.flatnonzero(data.minp > 0):
+        problem.addConstraint(variables[i] >= data.minp[i])
+
+    ## Zielfunktion - remaining material as expression like in the script
+    totalCosts = (data.fixedCosts + float(data.costs @ data.limits)
+                  + xp.Sum(r * data.returnCost for r in remaining)
+                  - xp.Sum(r * float(cost) for r, cost in zip(remaining, data.costs)))
+    problem.setObjective(xp.Sum(float(m) * x for m, x in zip(data.margin, variables)) - totalCosts,
+                         sense=xp.maximize)
+    return problem
+
+
+def writeReport(path, data, result):
+    """Write the sheets of DiamondStreetCycles.py through dss.report from a SolveResult."""
+    report = openReport(path)
+    plan = result.values(data.productNames)
+    metrics = PlanMetrics(data, plan)
+
+    worksheet = report.sheet("OPRIMALER PRODUKTIONSPLAM")
+    worksheetP = report.sheet("KEIN PLOYESTER")
+    worksheetO = report.sheet("PRODUKTIONSPLAN OUTLET")
+
+    row = worksheet.table(1, [data.productNames, plan], ['Produkt', 'Menge']) + 1
+    worksheet.cells(row, ["Total Manufacturing Quantity: ", metrics.totalQuantity])
+    worksheet.cells(row + 2, ["Rücksendungen"])
+    row = worksheet.table(row + 3, [data.materialNames, metrics.remaining], ['Material', 'Rücksendung']) + 1
+    worksheet.cells(row, ["Contribution Margin per Product: "])
+    row = worksheet.table(row + 1, [data.productNames, metrics.margin], ['Produkt', 'Deckungsbeitrag']) + 1
+    worksheet.cells(row, ["Contribution Margin total: ", metrics.totalMargin])
+    worksheet.cells(row + 2, ["Return Costs: ", metrics.totalReturnCosts])
+    worksheet.cells(row + 4, ["Return Money: ", metrics.totalRefund])
+    worksheet.cells(row + 6, ["Profit: ", result.objective])
+
+    if result.lowerObj is not None:
+        coef, _ = objectiveCoefficients(data)
+        worksheetS = report.sheet("INCREASE MACHINE COSTS")
+        worksheetS.cells(1, ["Wie viel müssen die Maschinenkosten pro Produkt steigen um den optimalen Plan zu beeinflussen?"])
+        worksheetS.table(2, [data.productNames, coef - result.lowerObj[result.cols(data.productNames)]],
+                         ['Produkt', 'Maschinenkosten Steigerung'])
+
+        worksheetE = report.sheet("IMPACT OF EXTRA ELASTAN")
+        worksheetE.cells(1, ['Which Impact has one extra Elastan on the profit?'])
+        if 'Elastan' in result.rowIndex:
+            idx = result.rowIndex['Elastan']
+            worksheetE.cells(2, ['Increase per Elastan: ', result.dual[idx]])
+            worksheetE.cells(4, ['This is valid until a total Elastan of: ', result.upperRhs[idx]])
+
+    # same volume as the scenario tables of the script
+    worksheetP.table(1, [data.productNames, plan], ['Produkt', 'Menge'])
+    worksheetO.table(3, [data.productNames, [str(v) for v in plan], [str(0.0)] * len(plan)],
+                     ["Name", "Amount", "Amount over MaxProg"], headerRow=1)
+    report.close()
+
+
+def runInstance(spec, seed=0, backend='xpress'):
+    """Run all phases on one generated instance, returns the result record."""
+    numProducts, numMaterials = parseSize(spec)
+    record = {'instance': spec, 'products': numProducts, 'materials': numMaterials, 'seed': seed,
+              'backend': backend, 'phases': {}, 'iterations': None, 'objective': None, 'error': None}
+
+    def timed(phase, func):
+        start = time.perf_counter()
+        result = func()
+        record['phases'][phase] = {'time': time.perf_counter() - start, 'peakRss': peakRss()}
+        return result
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # generating the workbook is setup, not part of the pipeline
+        path = os.path.join(workdir, f'{spec}.xlsx')
+        writeWorkbook(generateFrames(numProducts, numMaterials, seed=seed), path)
+
+        try:
+            frames = timed('ingest', lambda: readWorkbook(path, useCache=False))
+            data = timed('data', lambda: PlanningData.fromFrames(frames['Material'], frames['Produkt'],
+                                                                frames['Fixkosten'], frames['Variablen']))
+            problem = timed('build', lambda: buildObjects(data)) if backend == 'xpress' else None
+            model = timed('build matrix', lambda: buildLinearModel(data))
+            record.update(rows=model.numRows, columns=model.numCols, nonzeros=int(model.matrix.nnz))
+            solver = timed('load matrix', lambda: getBackend(backend).load(model))
+
+            if problem is not None:
+                # the script solves its object-built problem
+                def solve():
+                    problem.lpoptimize()
+                    return problem.attributes.lpstatus == xp.lp_optimal
+                optimal = timed('solve', solve)
+                record['iterations'] = problem.attributes.simplexiter + problem.attributes.bariter
+            else:
+                optimal = timed('solve', solver.solve)
+                record['iterations'] = solver.iterations
+            if not optimal:
+                raise RuntimeError(f"{spec} not solved to optimality with {backend}")
+
+            if problem is not None:
+                result = timed('sensitivity', lambda: SolveResult.fromProblem(problem, ranging=True))
+            else:
+                result = SolveResult.fromBackend(solver)
+            record['objective'] = result.objective
+
+            timed('report', lambda: writeReport(os.path.join(workdir, 'Output.xlsx'), data, result))
+        except Exception as e:
+            # e.g. size limit of the license - keep the phases measured so far
+            record['error'] = f"{type(e).__name__}: {e}"
+
+    return record
+
+
+def _merge(records):
+    """Best time and highest peak RSS per phase over repeated runs."""
+    merged = dict(records[0])
+    merged['phases'] = {}
+    for phase in PHASES:
+        runs = [r['phases'][phase] for r in records if phase in r['phases']]
+        if runs:
+            rss = [run['peakRss'] for run in runs if run['peakRss'] is not None]
+            merged['phases'][phase] = {'time': min(run['time'] for run in runs),
+                                       'peakRss': max(rss) if rss else None}
+    merged['repeat'] = len(records)
+    return merged
+
+
+def runLadder(sizes=LADDER, repeat=1, seed=0, backend='xpress'):
+    """Benchmark every instance size, each run in a fresh process."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for spec in sizes:
+        parseSize(spec)
+        records = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                records.append(pool.submit(runInstance, spec, seed, backend).result())
+        results.append(_merge(records))
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.2, minTime=MIN_TIME):
+    """Phases of `current` that are more than `threshold` worse than `baseline`.
+
+    Time, peak RSS and iterations are compared for every instance present
+    in both runs. Phases below `minTime` seconds in both runs are skipped.
+    """
+    base = {r['instance']: r for r in baseline['results']}
+    regressions = []
+
+    for record in current['results']:
+        old = base.get(record['instance'])
+        if old is None:
+            continue
+
+        checks = [('solve', 'iterations', old['iterations'], record['iterations'])]
+        for phase, now in record['phases'].items():
+            before = old['phases'].get(phase)
+            if before is None:
+                continue
+            if max(before['time'], now['time']) >= minTime:
+                checks.append((phase, 'time', before['time'], now['time']))
+            checks.append((phase, 'peakRss', before['peakRss'], now['peakRss']))
+
+        for phase, metric, before, now in checks:
+            if before is None or now is None or before <= 0:
+                continue
+            ratio = now / before
+            if ratio > 1 + threshold:
+                regressions.append({'instance': record['instance'], 'phase': phase, 'metric': metric,
+                                    'baseline': before, 'current': now, 'ratio': ratio})
+    return regressions
+
+
+def _printRun(run):
+    header = f"{'Instance':<12}" + ''.join(f"{phase:>13}" for phase in PHASES) + f"{'Peak RSS':>11}{'Iter':>8}"
+    print(header)
+    for record in run['results']:
+        times = ''.join(f"{record['phases'][p]['time']:>13.4f}" if p in record['phases'] else f"{'-':>13}"
+                        for p in PHASES)
+        rss = [v['peakRss'] for v in record['phases'].values() if v['peakRss'] is not None]
+        peak = f"{max(rss):>11.1f}" if rss else f"{'-':>11}"
+        iterations = f"{record['iterations']:>8}" if record['iterations'] is not None else f"{'-':>8}"
+        print(f"{record['instance']:<12}{times}{peak}{iterations}")
+        if record['error']:
+            print(f"    {record['error']}")
+
+
+def _printRegressions(regressions, threshold):
+    if not regressions:
+        print(f"No regressions above {threshold:.0%}")
+        return
+    print(f"{len(regressions)} regressions above {threshold:.0%}:")
+    for r in regressions:
+        print(f"  {r['instance']:<12} {r['phase']:<12} {r['metric']:<10} "
+              f"{r['baseline']:>12.4f} -> {r['current']:>12.4f}  ({r['ratio']:.2f}x)")
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Per-phase benchmark of the planning pipeline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="benchmark a ladder of generated instances")
+    run.add_argument('--sizes', nargs='+', default=list(LADDER), help="instance sizes as <products>x<materials>")
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--backend', choices=['xpress', 'highs'], default='xpress')
+    run.add_argument('--out', default=None, help="JSON file for the results")
+    run.add_argument('--baseline', default=None, help="JSON baseline to compare against")
+    run.add_argument('--threshold', type=float, default=0.2)
+
+    cmp = commands.add_parser('compare', help="compare two benchmark JSON files")
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.2)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        current = runLadder(args.sizes, args.repeat, args.seed, args.backend)
+        _printRun(current)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2)
+        baselinePath = args.baseline
+    else:
+        current = _load(args.current)
+        baselinePath = args.baseline
+
+    if baselinePath:
+        regressions = compare(_load(baselinePath), current, args.threshold)
+        print()
+        _printRegressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,86 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Stückliste (Bill of Materials)
+
+Turns the `Produkt` sheet into one sparse product x material matrix.
+Entry (p, m) is the amount of material m (in meters) needed for one unit of
+product p. The matrix is built once and then used for the material
+constraints, the remaining-material expressions and the reporting math.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class BillOfMaterials:
+
+    def __init__(self, productNames, materialNames, matrix):
+        self.productNames = list(productNames)
+        self.materialNames = list(materialNames)
+
+        ## index maps {name : row / column in the matrix}
+        self.productIndex = {name: idx for idx, name in enumerate(self.productNames)}
+        self.materialIndex = {name: idx for idx, name in enumerate(self.materialNames)}
+
+        # CSR for per-product access, CSC for per-material access (constraint rows)
+        self.matrix = sparse.csr_matrix(matrix, dtype=float)
+        self.byMaterial = self.matrix.tocsc()
+
+    @classmethod
+    def fromFrame(cls, produkt_df, materialNames):
+        """Build the BOM from the `Produkt` sheet.
+
+        The first material name is always in column 5, the required amount
+        is always in the next column, the number of materials is dynamic.
+        Materials that are not in `materialNames` are ignored.
+        """
+        materialNames = list(materialNames)
+        materialIndex = {name: idx for idx, name in enumerate(materialNames)}
+
+        nameCols = produkt_df.columns[5::2]
+        amountCols = produkt_df.columns[6::2]
+
+        rows, cols, amounts = [], [], []
+        for nameCol, amountCol in zip(nameCols, amountCols):
+            matIdx = produkt_df[nameCol].map(materialIndex).to_numpy(dtype=float)
+            amount = pd.to_numeric(produkt_df[amountCol], errors='coerce').to_numpy(dtype=float)
+
+            # empty material slots (NaN) and unknown materials are skipped
+            used = ~np.isnan(matIdx) & ~np.isnan(amount)
+            rows.append(np.flatnonzero(used))
+            cols.append(matIdx[used].astype(int))
+            amounts.append(amount[used])
+
+        shape = (len(produkt_df), len(materialNames))
+        if rows:
+            matrix = sparse.coo_matrix(
+                (np.concatenate(amounts), (np.concatenate(rows), np.concatenate(cols))),
+                shape=shape)
+        else:
+            matrix = sparse.coo_matrix(shape)
+
+        return cls(produkt_df['Produkt'], materialNames, matrix)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def usage(self, matName):
+        """Product indices and amounts of all products using `matName`."""
+        col = self.materialIndex[matName]
+        start, end = self.byMaterial.indptr[col], self.byMaterial.indptr[col + 1]
+        return self.byMaterial.indices[start:end], self.byMaterial.data[start:end]
+
+    def products(self, matName):
+        """Names of all products using `matName` (replaces the old tempList scans)."""
+        prodIdx, _ = self.usage(matName)
+        return [self.productNames[i] for i in prodIdx]
+
+    def consumption(self, quantities):
+        """Material consumption per material for the production `quantities`."""
+        return self.matrix.T @ np.asarray(quantities, dtype=float)
+
+    def remaining(self, limits, quantities):
+        """Remaining material per material for the production `quantities`."""
+        return np.asarray(limits, dtype=float) - self.consumption(quantities)
@@ -0,0 +1,169 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Modellaufbau in Matrixform
+
+Builds the production LP of DiamondStreetCycles.py straight from NumPy
+arrays as a LinearModel (columns with bounds, sparse coefficient matrix,
+row senses and RHS) instead of creating one xp.var / xp.constraint object
+per product and material. dss.backends loads it into the solver in one
+bulk call.
+
+Objective (same as in the script):
+
+    max  sum (vk - mk) * x  -  Fixkosten - Materialkosten - Rücksendekosten + Rückerstattung
+
+Rücksendekosten and Rückerstattung are linear in the remaining material
+limit - A'x, so per unit of product p the coefficient is
+
+    vk_p - mk_p + sum_m a_pm * (Rücksendekosten - Kosten_m)
+
+and the constant is -Fixkosten - Rücksendekosten * sum(limit).
+"""
+
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+
+## same values as xpress.infinity / xpress.maximize / xpress.minimize, so the
+## model can be built without Xpress installed
+INFINITY = 1e20
+MAXIMIZE = -1
+MINIMIZE = 1
+
+## Verschnittregelung - (larger, smaller): quantity of larger >= quantity of smaller
+# TO-DO condition in excel
+OFFCUT_RULES = (('Fleece-Top', 'Fleece-Shirt'), ('Sweatshorts', 'Sweatshirt'))
+
+## Outlet - units above the forecast lose this share of their Deckungsbeitrag
+OUTLET_DISCOUNT = 0.4
+
+
+class LinearModel:
+    """LP in matrix form: max/min c'x + objConstant, rows A x (sense) rhs, lb <= x <= ub."""
+
+    def __init__(self, colNames, objective, lb, ub, matrix, rowSense, rhs, rowNames, objConstant=0.0, sense=MAXIMIZE, colTypes=None):
+        self.colNames = list(colNames)
+        self.objective = np.asarray(objective, dtype=float)
+        self.lb = np.asarray(lb, dtype=float)
+        self.ub = np.asarray(ub, dtype=float)
+        self.matrix = sparse.csr_matrix(matrix, dtype=float)
+        self.rowSense = np.asarray(rowSense, dtype='U1')
+        self.rhs = np.asarray(rhs, dtype=float)
+        self.rowNames = list(rowNames)
+        self.objConstant = float(objConstant)
+        self.sense = sense
+        # None means all columns continuous, otherwise 'C' / 'I' / 'B' per column
+        self.colTypes = None if colTypes is None else np.asarray(colTypes, dtype='U1')
+
+    @property
+    def numCols(self):
+        return len(self.colNames)
+
+    @property
+    def numRows(self):
+        return len(self.rowNames)
+
+
+def objectiveCoefficients(data, noReturn=()):
+    """Objective coefficient and constant of the base LP (see module docstring).
+
+    Materials in `noReturn` cannot be sent back: their leftovers earn no
+    refund and cause no Rücksendekosten (e.g. 'recyceltes Polyester').
+    """
+    returnable = np.array([name not in noReturn for name in data.materialNames])
+    returnValue = np.where(returnable, data.returnCost - data.costs, 0.0)
+
+    coef = data.margin + data.bom.matrix @ returnValue
+    constant = (-data.fixedCosts - data.costs @ data.limits
+                - returnValue @ data.limits)
+    return coef, constant
+
+
+def buildLinearModel(data, offcutRules=OFFCUT_RULES, boundsAsRows=True, noReturn=()):
+    """Build the base LP of DiamondStreetCycles.py as a LinearModel.
+
+    Row order matches the script's constraintList: material rows, offcut
+    rules, Maximalprognose, Mindestproduktionsmenge. With boundsAsRows=False
+    forecast caps and minimum quantities become column bounds instead, which
+    gives a smaller model with the same optimum.
+    """
+    n = data.numProducts
+    prodIndex = data.bom.productIndex
+
+    blocks, senses, rhs, rowNames = [], [], [], []
+
+    ## Materialbeschränkungen - one row per material, A' x <= limit
+    blocks.append(data.bom.matrix.T)
+    senses.append(np.full(data.numMaterials, 'L'))
+    rhs.append(data.limits)
+    rowNames.extend(data.materialNames)
+
+    ## Verschnittregelung
+    rules = [(prodIndex[larger], prodIndex[smaller]) for larger, smaller in offcutRules
+             if larger in prodIndex and smaller in prodIndex]
+    if rules:
+        ruleRows = np.repeat(np.arange(len(rules)), 2)
+        ruleCols = np.array(rules).ravel()
+        ruleVals = np.tile([1.0, -1.0], len(rules))
+        blocks.append(sparse.csr_matrix((ruleVals, (ruleRows, ruleCols)), shape=(len(rules), n)))
+        senses.append(np.full(len(rules), 'G'))
+        rhs.append(np.zeros(len(rules)))
+        rowNames.extend(f'Verschnitt_{i + 1}' for i in range(len(rules)))
+
+    lb = np.zeros(n)
+    ub = np.full(n, INFINITY)
+
+    # NaN compares False, so undefined forecasts / minimum quantities drop out here
+    hasMax = np.flatnonzero(data.maxp > 0)
+    hasMin = np.flatnonzero(data.minp > 0)
+
+    if boundsAsRows:
+        ## Maximalprognose
+        blocks.append(sparse.csr_matrix((np.ones(len(hasMax)), (np.arange(len(hasMax)), hasMax)), shape=(len(hasMax), n)))
+        senses.append(np.full(len(hasMax), 'L'))
+        rhs.append(data.maxp[hasMax])
+        rowNames.extend(f'Max_{data.productNames[i]}' for i in hasMax)
+
+        ## Mindestproduktionsmenge
+        blocks.append(sparse.csr_matrix((np.ones(len(hasMin)), (np.arange(len(hasMin)), hasMin)), shape=(len(hasMin), n)))
+        senses.append(np.full(len(hasMin), 'G'))
+        rhs.append(data.minp[hasMin])
+        rowNames.extend(f'Min_{data.productNames[i]}' for i in hasMin)
+    else:
+        ub[hasMax] = data.maxp[hasMax]
+        lb[hasMin] = data.minp[hasMin]
+
+    objective, objConstant = objectiveCoefficients(data, noReturn)
+
+    return LinearModel(
+        data.productNames, objective, lb, ub,
+        sparse.vstack(blocks, format='csr'),
+        np.concatenate(senses), np.concatenate(rhs), rowNames,
+        objConstant=objConstant,
+    )
+
+
+if __name__ == '__main__':
+
+    from dss.backends import getBackend
+    from dss.ingest import readPlanningData
+
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'Produktionsplanung.xlsx'
+
+    data = readPlanningData(file_path)
+
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'auto'
+
+    start = time.perf_counter()
+    model = buildLinearModel(data)
+    solver = getBackend(backend).load(model)
+    buildTime = time.perf_counter() - start
+
+    solver.solve()
+
+    print(f"Build: {buildTime:.4f}s ({model.numCols} columns, {model.numRows} rows, {model.matrix.nnz} nonzeros)")
+    print(f"Solve: {solver.solveTime:.4f}s ({solver.name})")
+    print("Objective Function Value:", solver.objectiveValue())
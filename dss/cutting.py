@@ -0,0 +1,368 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Zuschnittplanung mit Spaltengenerierung
+
+The base LP charges every product a fixed number of meters per material
+(Stückliste) and approximates the use of offcuts by the Verschnittregelung
+(Fleece-Top >= Fleece-Shirt, ...). Here the fabric is cut from rolls:
+
+    Stoffrollen   Material, Rollenbreite (cm)
+    Zuschnitt     Produkt, Material, Breite (cm), Länge (m) of the piece
+                  one unit of the product needs from the material
+
+A cutting pattern splits the roll width into lanes, n_p lanes of the
+pieces of product p with sum n_p w_p <= roll width. Running the pattern
+over t meters of roll gives n_p t / l_p pieces of p. The production LP
+(master) decides production x and the meters t_k of every pattern:
+
+    max  sum (vk - mk) x  +  sum_k (Rücksendekosten - Kosten_m) t_k  + const
+         sum_{k of m} t_k <= limit_m                        Material   (dual pi_m)
+         x_p - sum_{k of m} n_pk / l_pm t_k <= 0             Zuschnitt  (dual mu_pm)
+
+which is the base LP when every piece takes the whole roll width. There
+are far too many patterns to enumerate, so the master starts with one
+pattern per piece (as many lanes of it as fit) and column generation
+adds patterns: for each material the pricing problem is the unbounded
+knapsack
+
+    max  sum_p mu_pm / l_pm n_p     s.t.  sum_p w_pm n_p <= roll width, n integer
+
+and a pattern enters if its value exceeds pi_m + Kosten_m - Rücksendekosten.
+The columns go into the loaded solver (SolverBackend.addCols), Xpress
+re-solves from the previous basis. Without the two sheets every piece
+takes the full roll width with the Stückliste length, so the model is the
+base LP and no pattern can improve it.
+
+The Verschnittregelung is not needed here, the patterns use the offcuts;
+pass offcutRules to keep it anyway. The waste of a pattern is its unused
+width; CuttingPlan reports it per material.
+
+    python -m dss.cutting --size 500x20
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from dss.backends import getBackend
+from dss.builder import INFINITY, LinearModel
+from dss.ingest import readWorkbook
+
+
+ROLL_SHEET = 'Stoffrollen'
+PIECE_SHEET = 'Zuschnitt'
+
+DEFAULT_ROLL_WIDTH = 150.0
+
+# widths are put on this grid (cm) for the knapsack, pieces rounded up and
+# rolls down, so a pattern never gets wider than its roll
+WIDTH_STEP = 0.5
+
+
+class CuttingData:
+    """Roll width per material and one piece per Stückliste entry (product, material)."""
+
+    def __init__(self, data, rollWidth, pieceWidth, pieceLength):
+        self.data = data
+        self.rollWidth = np.asarray(rollWidth, dtype=float)
+        usage = data.bom.matrix.tocoo()
+        # pieces in the order of the Stückliste entries
+        self.product = usage.row
+        self.material = usage.col
+        self.width = np.asarray(pieceWidth, dtype=float)
+        self.length = np.asarray(pieceLength, dtype=float)
+        if (self.width > self.rollWidth[self.material] + 1e-9).any():
+            raise ValueError("A piece is wider than the roll of its material")
+
+    @property
+    def numPieces(self):
+        return len(self.product)
+
+    @classmethod
+    def fromFrames(cls, data, rolls_df=None, pieces_df=None):
+        """Sheets as DataFrames; without rolls_df every roll is DEFAULT_ROLL_WIDTH wide, pieces
+        missing in pieces_df take the whole roll width and the Stückliste length."""
+        rollWidth = np.full(data.numMaterials, DEFAULT_ROLL_WIDTH)
+        if rolls_df is not None:
+            matIndex = {name: i for i, name in enumerate(data.materialNames)}
+            for name, width in zip(rolls_df['Material'], rolls_df['Rollenbreite']):
+                rollWidth[matIndex[name]] = width
+
+        usage = data.bom.matrix.tocoo()
+        width = rollWidth[usage.col].copy()
+        length = usage.data.copy()
+        if pieces_df is not None:
+            entry = {(data.productNames[p], data.materialNames[m]): k
+                     for k, (p, m) in enumerate(zip(usage.row, usage.col))}
+            for product, material, w, l in zip(pieces_df['Produkt'], pieces_df['Material'],
+                                               pieces_df['Breite'], pieces_df['Länge']):
+                if (product, material) not in entry:
+                    raise ValueError(f"{product} does not use {material} in the Stückliste")
+                width[entry[product, material]] = w
+                length[entry[product, material]] = l
+        return cls(data, rollWidth, width, length)
+
+    @classmethod
+    def random(cls, data, seed=None, widthShare=(0.15, 0.7), fill=(0.7, 1.0)):
+        """Pieces for a generated instance: width a random share of the roll, the length so
+        that the piece area is `fill` of what the Stückliste charges at full roll width."""
+        rng = np.random.default_rng(seed)
+        rollWidth = np.full(data.numMaterials, DEFAULT_ROLL_WIDTH)
+        usage = data.bom.matrix.tocoo()
+        n = len(usage.data)
+        width = np.round(rng.uniform(*widthShare, n) * rollWidth[usage.col] / WIDTH_STEP) * WIDTH_STEP
+        length = usage.data * rollWidth[usage.col] / width * rng.uniform(*fill, n)
+        return cls(data, rollWidth, width, length)
+
+
+def readCuttingData(file_path, data, **kwargs):
+    """CuttingData from the optional Stoffrollen and Zuschnitt sheets."""
+    frames = {}
+    for sheet in (ROLL_SHEET, PIECE_SHEET):
+        try:
+            frames[sheet] = readWorkbook(file_path, [sheet], **kwargs)[sheet]
+        except ValueError:
+            # sheet not in the workbook
+            frames[sheet] = None
+    return CuttingData.fromFrames(data, frames[ROLL_SHEET], frames[PIECE_SHEET])
+
+
+def knapsack(values, widths, capacity):
+    """Unbounded integer knapsack, max values'n s.t. widths'n <= capacity.
+
+    Widths and capacity in grid steps. Every item is split into 0/1 copies
+    of 1, 2, 4, ... units, each copy is one vectorized pass over all
+    capacities. Returns (value, n).
+    """
+    widths = np.asarray(widths, dtype=int)
+    best = np.zeros(capacity + 1)
+    copies, taken = [], []
+    for item, (value, width) in enumerate(zip(values, widths)):
+        if value <= 0 or width > capacity:
+            continue
+        count, units = capacity // width, 1
+        while count > 0:
+            step = min(units, count)
+            w, v = step * width, step * value
+            candidate = np.full(capacity + 1, -np.inf)
+            candidate[w:] = best[:-w] + v if w > 0 else best + v
+            take = candidate > best + 1e-12
+            best = np.where(take, candidate, best)
+            copies.append((item, step, w))
+            taken.append(take)
+            count -= step
+            units *= 2
+
+    n = np.zeros(len(widths), dtype=int)
+    c = int(np.argmax(best))
+    value = best[c]
+    for (item, step, w), take in zip(reversed(copies), reversed(taken)):
+        if take[c]:
+            n[item] += step
+            c -= w
+    return value, n
+
+
+class CuttingPlan:
+
+    def __init__(self, cutting, production, patterns, usage, objective):
+        self.cutting = cutting
+        self.production = production
+        # (material, piece indices, lanes) per pattern
+        self.patterns = patterns
+        self.usage = usage
+        self.objective = objective
+
+    def waste(self):
+        """Unused roll width times meters run, as meters of full roll per material."""
+        cutting = self.cutting
+        waste = np.zeros(cutting.data.numMaterials)
+        for (material, pieces, lanes), meters in zip(self.patterns, self.usage):
+            used = cutting.width[pieces] @ lanes
+            if used > cutting.rollWidth[material] + 1e-9:
+                raise ValueError(f"Pattern of {used:g} cm on the {cutting.rollWidth[material]:g} cm roll "
+                                 f"of {cutting.data.materialNames[material]}")
+            waste[material] += meters * (1.0 - used / cutting.rollWidth[material])
+        return waste
+
+    def materialFrame(self):
+        data = self.cutting.data
+        used = np.zeros(data.numMaterials)
+        for (material, _, _), meters in zip(self.patterns, self.usage):
+            used[material] += meters
+        waste = self.waste()
+        return pd.DataFrame({
+            'Material': data.materialNames, 'Limit': data.limits, 'Verbraucht': used, 'Verschnitt': waste,
+            'Verschnitt %': np.divide(100 * waste, used, out=np.zeros_like(used), where=used > 0),
+        })
+
+    def patternFrame(self, tol=1e-9):
+        """Patterns in use with their lanes and meters."""
+        cutting, data = self.cutting, self.cutting.data
+        rows = []
+        for (material, pieces, lanes), meters in zip(self.patterns, self.usage):
+            if meters <= tol:
+                continue
+            rows.append({
+                'Material': data.materialNames[material],
+                'Muster': ' + '.join(f"{n} x {data.productNames[cutting.product[k]]} ({cutting.width[k]:g} cm)"
+                                     for k, n in zip(pieces, lanes)),
+                'Meter': meters,
+                'Breite genutzt': cutting.width[pieces] @ lanes,
+            })
+        return pd.DataFrame(rows)
+
+
+class CuttingStock:
+
+    def __init__(self, cutting, offcutRules=(), backend='auto'):
+        self.cutting = cutting
+        self.offcutRules = offcutRules
+        self.backend = backend
+        self.solver = None
+        self.patterns = []
+        # one record per round: objective, columns added, solve and pricing time
+        self.rounds = []
+
+        data = cutting.data
+        self.grid = np.ceil(cutting.width / WIDTH_STEP - 1e-9).astype(int)
+        self.capacity = np.floor(cutting.rollWidth / WIDTH_STEP + 1e-9).astype(int)
+        # pieces per material, and their Zuschnitt row
+        self.pieces = [np.flatnonzero(cutting.material == m) for m in range(data.numMaterials)]
+        self.pieceRow = data.numMaterials + np.arange(cutting.numPieces)
+
+    def _patternColumns(self, patterns):
+        """Objective and matrix block (rows of the master) of new patterns."""
+        cutting, data = self.cutting, self.cutting.data
+        rows, cols, vals = [], [], []
+        objective = np.empty(len(patterns))
+        for col, (material, pieces, lanes) in enumerate(patterns):
+            rows += [material] + self.pieceRow[pieces].tolist()
+            cols += [col] * (1 + len(pieces))
+            vals += [1.0] + (-lanes / cutting.length[pieces]).tolist()
+            objective[col] = data.returnCost - data.costs[material]
+        matrix = sparse.csr_matrix((vals, (rows, cols)), shape=(self.numRows, len(patterns)))
+        return objective, matrix
+
+    def _master(self):
+        """Production LP with one pattern per piece: as many lanes of it as fit."""
+        cutting, data = self.cutting, self.cutting.data
+        P, M = data.numProducts, data.numMaterials
+        prodIndex = data.bom.productIndex
+        rules = [(prodIndex[a], prodIndex[b]) for a, b in self.offcutRules if a in prodIndex and b in prodIndex]
+        self.numRows = M + cutting.numPieces + len(rules)
+
+        pieceRows = sparse.csr_matrix((np.ones(cutting.numPieces), (self.pieceRow, cutting.product)),
+                                      shape=(self.numRows, P))
+        ruleRows = sparse.csr_matrix((np.tile([1.0, -1.0], len(rules)),
+                                      (M + cutting.numPieces + np.repeat(np.arange(len(rules)), 2),
+                                       np.array(rules, dtype=int).ravel())), shape=(self.numRows, P))
+
+        self.patterns = [(int(cutting.material[k]), np.array([k]), np.array([self.capacity[cutting.material[k]] // self.grid[k]]))
+                         for k in range(cutting.numPieces)]
+        objective, patternMatrix = self._patternColumns(self.patterns)
+
+        hasMax, hasMin = data.maxp > 0, data.minp > 0
+        return LinearModel(
+            data.productNames + [f'Muster_{i + 1}' for i in range(len(self.patterns))],
+            np.concatenate([data.margin, objective]),
+            np.concatenate([np.where(hasMin, data.minp, 0.0), np.zeros(len(self.patterns))]),
+            np.concatenate([np.where(hasMax, data.maxp, INFINITY), np.full(len(self.patterns), INFINITY)]),
+            sparse.hstack([pieceRows + ruleRows, patternMatrix], format='csr'),
+            np.concatenate([np.full(M + cutting.numPieces, 'L'), np.full(len(rules), 'G')]),
+            np.concatenate([data.limits, np.zeros(cutting.numPieces + len(rules))]),
+            data.materialNames + [f'Zuschnitt_{data.productNames[p]}_{data.materialNames[m]}'
+                                  for p, m in zip(cutting.product, cutting.material)]
+            + [f'Verschnitt_{i + 1}' for i in range(len(rules))],
+            objConstant=-data.fixedCosts - data.returnCost * data.limits.sum(),
+        )
+
+    def price(self, tol=1e-7):
+        """Best pattern per material from the duals, only those with positive reduced cost."""
+        cutting, data = self.cutting, self.cutting.data
+        duals = self.solver.duals()
+        pi, mu = duals[:data.numMaterials], np.maximum(duals[self.pieceRow], 0.0)
+        entering = []
+        for m, pieces in enumerate(self.pieces):
+            if not len(pieces):
+                continue
+            value, lanes = knapsack(mu[pieces] / cutting.length[pieces], self.grid[pieces], self.capacity[m])
+            # reduced cost of running the pattern one meter
+            if value - pi[m] + data.returnCost - data.costs[m] > tol * max(1.0, abs(value)):
+                used = lanes > 0
+                entering.append((m, pieces[used], lanes[used]))
+        return entering
+
+    def solve(self, maxRounds=200, tol=1e-7):
+        """Column generation until no pattern prices out, returns the CuttingPlan."""
+        data = self.cutting.data
+        self.rounds = []
+        self.solver = getBackend(self.backend, "DiamondStreetStyles Zuschnitt").load(self._master())
+
+        for _ in range(maxRounds):
+            if not self.solver.solve():
+                raise RuntimeError(f"Cutting master LP not solved to optimality with {self.solver.name}")
+            start = time.perf_counter()
+            entering = self.price(tol)
+            self.rounds.append({'objective': self.solver.objectiveValue(), 'columns': len(entering),
+                                'solve': self.solver.solveTime, 'pricing': time.perf_counter() - start})
+            if not entering:
+                break
+            objective, matrix = self._patternColumns(entering)
+            first = len(self.patterns)
+            self.solver.addCols(objective, np.zeros(len(entering)), np.full(len(entering), INFINITY), matrix,
+                                [f'Muster_{first + i + 1}' for i in range(len(entering))])
+            self.patterns += entering
+        else:
+            # last columns added, solve once more
+            if not self.solver.solve():
+                raise RuntimeError(f"Cutting master LP not solved to optimality with {self.solver.name}")
+
+        solution = self.solver.solution()
+        P = data.numProducts
+        return CuttingPlan(self.cutting, solution[:P], self.patterns, solution[P:], self.solver.objectiveValue())
+
+
+if __name__ == '__main__':
+
+    from dss.backends import solveModel
+    from dss.bench import parseSize
+    from dss.builder import OFFCUT_RULES, buildLinearModel
+    from dss.ingest import readPlanningData
+    from dss.synthetic import generatePlanningData
+
+    parser = argparse.ArgumentParser(description="Production plan with fabric cutting patterns (column generation)")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--size', default=None, help="generated instance <products>x<materials> with random pieces")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--offcut-rules', action='store_true', help="keep the Verschnittregelung rows")
+    parser.add_argument('--max-rounds', type=int, default=200)
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    if args.size is None:
+        data = readPlanningData(args.workbook)
+        cutting = readCuttingData(args.workbook, data)
+    else:
+        products, materials = parseSize(args.size)
+        data = generatePlanningData(products, materials, seed=args.seed)
+        cutting = CuttingData.random(data, args.seed)
+
+    rules = OFFCUT_RULES if args.offcut_rules else ()
+    start = time.perf_counter()
+    stock = CuttingStock(cutting, rules, args.backend)
+    plan = stock.solve(args.max_rounds)
+    total = time.perf_counter() - start
+
+    print(plan.materialFrame().to_string(index=False))
+    print()
+    print(plan.patternFrame().head(20).to_string(index=False))
+    print()
+    base = solveModel(buildLinearModel(data, rules), args.backend).objectiveValue()
+    print(f"Objective Function Value: {plan.objective}  (Stückliste LP: {base})")
+    print(f"{len(stock.rounds)} rounds, {len(stock.patterns)} patterns, {stock.numRows} rows, "
+          f"solve {sum(r['solve'] for r in stock.rounds):.3f}s, pricing {sum(r['pricing'] for r in stock.rounds):.3f}s, "
+          f"total {total:.3f}s ({stock.solver.name})")
@@ -0,0 +1,63 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Planungsdaten als Arrays
+
+Reads the four sheets of Produktionsplanung.xlsx (Material, Produkt,
+Fixkosten, Variablen) into aligned NumPy arrays instead of one Python
+object per product. Maximalprognose and Mindestproduktionsmenge can be
+undefined (NaN), exactly like in the sheet.
+"""
+
+import numpy as np
+
+from dss.bom import BillOfMaterials
+
+
+class PlanningData:
+
+    def __init__(self, productNames, vk, mk, maxp, minp, materialNames, costs, limits, bom, fixedCosts, returnCost):
+        self.productNames = list(productNames)
+        self.vk = np.asarray(vk, dtype=float)
+        self.mk = np.asarray(mk, dtype=float)
+        self.maxp = np.asarray(maxp, dtype=float)
+        self.minp = np.asarray(minp, dtype=float)
+
+        self.materialNames = list(materialNames)
+        self.costs = np.asarray(costs, dtype=float)
+        self.limits = np.asarray(limits, dtype=float)
+
+        self.bom = bom
+        self.fixedCosts = float(fixedCosts)
+        self.returnCost = float(returnCost)
+
+    @classmethod
+    def fromFrames(cls, material_df, produkt_df, fixed_costs_df, variables_df):
+        materialNames = material_df['Material']
+        bom = BillOfMaterials.fromFrame(produkt_df, materialNames)
+
+        return cls(
+            produkt_df['Produkt'],
+            produkt_df['Verkaufspreis'],
+            produkt_df['Maschinenkosten'],
+            produkt_df['Maximalprognose'],
+            produkt_df['Mindestproduktionsmenge'],
+            materialNames,
+            material_df['Kosten / m'],
+            material_df['Materialbeschränkungen'],
+            bom,
+            fixed_costs_df['Betrag'].sum(),
+            variables_df.loc[0, 'Rücksendekosten'],
+        )
+
+    @property
+    def numProducts(self):
+        return len(self.productNames)
+
+    @property
+    def numMaterials(self):
+        return len(self.materialNames)
+
+    @property
+    def margin(self):
+        """Deckungsbeitrag per unit before material (Verkaufspreis - Maschinenkosten)."""
+        return self.vk - self.mk
@@ -0,0 +1,265 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Einlesen von Produktionsplanung.xlsx mit Cache
+
+The workbook is parsed once per content into a columnar NPZ file (one array
+per sheet column, no pickles). Later runs with an unchanged workbook load
+the arrays instead of re-opening and re-parsing the Excel zip/XML.
+
+Cache key is the SHA-256 of the file. An index with (mtime, size, hash) per
+path lets unchanged files skip even the hashing; a touched but unchanged
+file is re-hashed once and then found again.
+
+A cached read gives the same frames as a fresh parse, column headers with
+their type (a header 2024 stays an int). python -m dss.ingest --check
+compares both for a workbook.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from dss.data import PlanningData
+
+
+SHEETS = ('Material', 'Produkt', 'Fixkosten', 'Variablen')
+CACHE_DIR = '.dss_cache'
+INDEX_FILE = 'index.json'
+
+# bump when the on-disk layout changes, old entries are then ignored
+CACHE_VERSION = 2
+
+
+def fileHash(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _loadIndex(cacheDir):
+    try:
+        with open(os.path.join(cacheDir, INDEX_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _saveIndex(cacheDir, index):
+    # unique temp name, several processes may share one cache directory
+    tmp = os.path.join(cacheDir, f'{INDEX_FILE}.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(cacheDir, INDEX_FILE))
+
+
+def _cacheFile(cacheDir, file_path, digest, sheets):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    sheetKey = hashlib.sha256('\0'.join(map(str, sheets)).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cacheDir, f'{stem}-{digest[:16]}-{sheetKey}.npz')
+
+
+def _encodeColumn(series):
+    """Column -> (kind, arrays) or None if it cannot be stored without pickling."""
+    if series.dtype.kind in 'biuf':
+        return 'num', {'values': series.to_numpy()}
+
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(series).to_numpy()
+    present = values[~missing]
+
+    if all(isinstance(v, str) for v in present):
+        text = np.where(missing, '', values).astype(str)
+        return 'str', {'values': text, 'missing': missing}
+
+    if all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool) for v in present):
+        return 'num', {'values': series.astype(float).to_numpy()}
+
+    return None
+
+
+def _encodeHeader(col):
+    """Column header -> JSON {'name', 'type'} or None for header types we do not restore."""
+    if isinstance(col, str):
+        return {'name': col, 'type': 'str'}
+    if isinstance(col, (bool, np.bool_)):
+        return None
+    if isinstance(col, (int, np.integer)):
+        return {'name': int(col), 'type': 'int'}
+    if isinstance(col, (float, np.floating)):
+        # repr keeps NaN / inf, which JSON cannot
+        return {'name': repr(float(col)), 'type': 'float'}
+    if isinstance(col, pd.Timestamp):
+        return {'name': col.isoformat(), 'type': 'timestamp'}
+    if isinstance(col, datetime.datetime):
+        # date headers come from openpyxl as plain datetime
+        return {'name': col.isoformat(), 'type': 'datetime'}
+    return None
+
+
+def _decodeHeader(header):
+    kind, name = header['type'], header['name']
+    if kind == 'int':
+        return int(name)
+    if kind == 'float':
+        return float(name)
+    if kind == 'timestamp':
+        return pd.Timestamp(name)
+    if kind == 'datetime':
+        return datetime.datetime.fromisoformat(name)
+    return name
+
+
+def _decodeColumn(kind, arrays):
+    if kind == 'num':
+        return arrays['values']
+    values = arrays['values'].astype(object)
+    values[arrays['missing']] = np.nan
+    return values
+
+
+def _writeCache(path, frames):
+    meta = {'version': CACHE_VERSION, 'sheets': []}
+    arrays = {}
+
+    for sheetIdx, (sheet, df) in enumerate(frames.items()):
+        columns = []
+        for colIdx, col in enumerate(df.columns):
+            # positional access, headers may repeat or be non-strings
+            encoded = _encodeColumn(df.iloc[:, colIdx])
+            header = _encodeHeader(col)
+            if encoded is None or header is None:
+                # mixed object column or unusual header, keep the workbook uncached rather than pickling
+                return False
+            kind, parts = encoded
+            for part, arr in parts.items():
+                arrays[f'{sheetIdx}/{colIdx}/{part}'] = arr
+            columns.append(dict(header, kind=kind))
+        meta['sheets'].append({'name': sheet, 'columns': columns})
+
+    arrays['__meta__'] = np.array(json.dumps(meta))
+
+    tmp = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+    return True
+
+
+def _readCache(path):
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz['__meta__']))
+        if meta.get('version') != CACHE_VERSION:
+            return None
+
+        # keys 'sheet/col/part', grouped in one pass
+        keys = defaultdict(dict)
+        for key in npz.files:
+            if key != '__meta__':
+                sheetIdx, colIdx, part = key.split('/')
+                keys[int(sheetIdx), int(colIdx)][part] = key
+
+        frames = {}
+        for sheetIdx, sheet in enumerate(meta['sheets']):
+            values = [_decodeColumn(col['kind'], {part: npz[key] for part, key in keys[sheetIdx, colIdx].items()})
+                      for colIdx, col in enumerate(sheet['columns'])]
+            frame = pd.DataFrame(dict(enumerate(values)), columns=range(len(values)))
+            frame.columns = [_decodeHeader(col) for col in sheet['columns']]
+            frames[sheet['name']] = frame
+        return frames
+
+
+def readWorkbook(file_path, sheets=SHEETS, cacheDir=CACHE_DIR, useCache=True):
+    """Read `sheets` of the workbook as {sheet name : DataFrame}, cached on disk.
+
+    `sheets` may contain sheet names or positions, like pd.read_excel.
+    """
+    sheets = list(sheets)
+    if not useCache:
+        return pd.read_excel(file_path, sheet_name=sheets)
+
+    os.makedirs(cacheDir, exist_ok=True)
+    absPath = os.path.abspath(file_path)
+    stat = os.stat(absPath)
+
+    ## fast path - unchanged mtime and size, no hashing needed
+    index = _loadIndex(cacheDir)
+    entry = index.get(absPath)
+    if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        digest = entry['sha256']
+    else:
+        digest = fileHash(absPath)
+
+    cachePath = _cacheFile(cacheDir, absPath, digest, sheets)
+    frames = None
+    if os.path.exists(cachePath):
+        try:
+            frames = _readCache(cachePath)
+        except (OSError, ValueError, KeyError):
+            frames = None
+
+    if frames is None:
+        frames = pd.read_excel(absPath, sheet_name=sheets)
+        if not _writeCache(cachePath, frames):
+            return frames
+
+    newEntry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+    if entry != newEntry:
+        index[absPath] = newEntry
+        _saveIndex(cacheDir, index)
+    return frames
+
+
+def readPlanningData(file_path, **kwargs):
+    """PlanningData from the Material, Produkt, Fixkosten and Variablen sheets."""
+    frames = readWorkbook(file_path, SHEETS, **kwargs)
+    return PlanningData.fromFrames(frames['Material'], frames['Produkt'], frames['Fixkosten'], frames['Variablen'])
+
+
+def checkCache(file_path, sheets=SHEETS, cacheDir=CACHE_DIR):
+    """Differences between a fresh parse and a cached read of the workbook, [] if none."""
+    sheets = list(sheets)
+    fresh = pd.read_excel(file_path, sheet_name=sheets)
+    # the first call fills the cache, the second reads from it
+    readWorkbook(file_path, sheets, cacheDir)
+    cached = readWorkbook(file_path, sheets, cacheDir)
+
+    problems = []
+    for sheet, df in fresh.items():
+        other = cached[sheet]
+        headers = [(col, type(col).__name__) for col in df.columns]
+        otherHeaders = [(col, type(col).__name__) for col in other.columns]
+        if headers != otherHeaders:
+            problems.append(f"{sheet}: headers {headers} != {otherHeaders}")
+            continue
+        dtypes = [str(t) for t in df.dtypes]
+        otherDtypes = [str(t) for t in other.dtypes]
+        if dtypes != otherDtypes:
+            problems.append(f"{sheet}: dtypes {dtypes} != {otherDtypes}")
+        elif not df.equals(other):
+            problems.append(f"{sheet}: values differ")
+    return problems
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Read the planning workbook through the cache")
+    parser.add_argument('workbook', nargs='?', default='Produktionsplanung.xlsx')
+    parser.add_argument('--sheets', nargs='+', default=list(SHEETS))
+    parser.add_argument('--check', action='store_true', help="compare a cached read with a fresh parse")
+    args = parser.parse_args()
+
+    if args.check:
+        problems = checkCache(args.workbook, args.sheets)
+        for problem in problems:
+            print(problem)
+        print("cached read matches the workbook" if not problems else f"{len(problems)} differences")
+    else:
+        for sheet, df in readWorkbook(args.workbook, args.sheets).items():
+            print(f"{sheet}: {len(df)} rows, columns {list(df.columns)}")
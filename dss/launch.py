@@ -0,0 +1,249 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Produkteinführung mit Fixkosten
+
+DSS_B.py decides whether Cargoshorts are launched at all: a launch costs a
+fixed amount, and without it the product cannot be made. Here every
+product with launch costs gets such a decision, a binary y_p next to its
+quantity x_p:
+
+    x_p <= M_p y_p                    Start      no production without launch
+    x_p >= Mindestproduktionsmenge y_p MinStart   the minimum only applies when launched
+    db_p x_p >= Fixkosten_p y_p       Deckung    the launch covers its fixed costs
+
+    max  c'x - sum Fixkosten_p y_p + const      (c and const as in the base LP)
+
+with db_p = Verkaufspreis - Maschinenkosten - material costs per unit.
+M_p is the largest quantity product p can reach at all (productBounds):
+its forecast cap, and for every material it uses the material limit minus
+what the Mindestproduktionsmenge of the other products takes, shared
+through the offcut rules. A blanket M (30000 in the old DSS_B.py) gives a
+weak LP relaxation, y_p = x_p / M is tiny and charges almost nothing of
+the fixed costs, so branch-and-bound has to branch on every candidate.
+
+Launch costs come from the optional Produkteinführung sheet (columns
+Produkt, Fixkosten); without it the scenario of DSS_B.py is used.
+
+    python -m dss.launch --size 2000x60 --launch-share 0.25 --compare
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+from scipy import sparse
+
+from dss.backends import getBackend, solveModel
+from dss.builder import INFINITY, OFFCUT_RULES, LinearModel, buildLinearModel
+from dss.ingest import readWorkbook
+from dss.procurement import minimalPlan
+
+
+LAUNCH_SHEET = 'Produkteinführung'
+
+# Szenario of DSS_B.py
+DEFAULT_LAUNCH_COSTS = {'Cargoshorts': 250000.0}
+
+
+def readLaunchCosts(file_path, default=DEFAULT_LAUNCH_COSTS, **kwargs):
+    """{product : Fixkosten} from the Produkteinführung sheet, `default` without it."""
+    try:
+        launch_df = readWorkbook(file_path, [LAUNCH_SHEET], **kwargs)[LAUNCH_SHEET]
+    except ValueError:
+        # sheet not in the workbook
+        return dict(default)
+    return dict(zip(launch_df['Produkt'], launch_df['Fixkosten'].astype(float)))
+
+
+def launchCostArray(data, launchCosts):
+    """Fixkosten per product in product order, NaN for products without launch decision."""
+    unknown = set(launchCosts) - set(data.productNames)
+    if unknown:
+        raise ValueError(f"Launch costs for unknown products: {sorted(unknown)}")
+    return np.array([launchCosts.get(name, np.nan) for name in data.productNames], dtype=float)
+
+
+def unitContribution(data):
+    """Deckungsbeitrag per unit after material costs."""
+    return data.margin - data.bom.matrix @ data.costs
+
+
+def productBounds(data, offcutRules=OFFCUT_RULES, optional=()):
+    """Largest quantity every product can reach, INFINITY if nothing limits it.
+
+    The Mindestproduktionsmenge of the products in `optional` (launch
+    candidates) is not reserved, they may stay at zero.
+    """
+    required = copy.copy(data)
+    required.minp = data.minp.copy()
+    required.minp[np.asarray(optional, dtype=int)] = np.nan
+    plan = minimalPlan(required, offcutRules)
+    free = np.maximum(data.limits - data.bom.consumption(plan), 0.0)
+
+    ## Materialbeschränkungen - what is left for p plus its own minimum
+    usage = data.bom.matrix.tocoo()
+    used = usage.data > 0
+    bounds = np.full(data.numProducts, INFINITY)
+    np.minimum.at(bounds, usage.row[used], free[usage.col[used]] / usage.data[used] + plan[usage.row[used]])
+
+    ## Maximalprognose, NaN (undefined) drops out
+    bounds = np.fmin(bounds, data.maxp)
+
+    ## Verschnittregelung - the smaller product never exceeds the larger one
+    prodIndex = data.bom.productIndex
+    rules = [(prodIndex[a], prodIndex[b]) for a, b in offcutRules if a in prodIndex and b in prodIndex]
+    for _ in range(len(rules) + 1):
+        changed = False
+        for larger, smaller in rules:
+            if bounds[smaller] > bounds[larger]:
+                bounds[smaller] = bounds[larger]
+                changed = True
+        if not changed:
+            break
+    return bounds
+
+
+def buildLaunchModel(data, fixedCosts, offcutRules=OFFCUT_RULES, bigM=None, integer=False):
+    """Launch MIP as a LinearModel, columns x (all products), then y (launch candidates).
+
+    `fixedCosts` per product as from launchCostArray. bigM=None derives M_p
+    from productBounds and also uses it as upper bound of x; a number gives
+    the same M to every candidate (for comparison). integer=True makes the
+    quantities integer like in DSS_B.py.
+    """
+    candidates = np.flatnonzero(~np.isnan(fixedCosts))
+    names = [data.productNames[i] for i in candidates]
+    k = len(candidates)
+    base = buildLinearModel(data, offcutRules, boundsAsRows=False)
+
+    lb, ub = base.lb.copy(), base.ub.copy()
+    if bigM is None:
+        bounds = productBounds(data, offcutRules, candidates)
+        ub = np.minimum(ub, bounds)
+        bigM = bounds[candidates]
+        unbounded = [name for name, m in zip(names, bigM) if m >= INFINITY]
+        if unbounded:
+            raise ValueError(f"No material or forecast limits the quantity of {unbounded}, "
+                             f"a launch decision needs a finite bound")
+    else:
+        bigM = np.full(k, float(bigM))
+    if integer:
+        ub = np.where(ub < INFINITY, np.floor(ub + 1e-9), ub)
+        bigM = np.floor(bigM + 1e-9)
+
+    # the minimum of a candidate moves into the MinStart row
+    minp = np.nan_to_num(data.minp[candidates], nan=0.0)
+    lb[candidates] = 0.0
+    withMin = np.flatnonzero(minp > 0)
+
+    rowsX = np.concatenate([np.arange(k), k + np.arange(len(withMin)), k + len(withMin) + np.arange(k)])
+    colsX = np.concatenate([candidates, candidates[withMin], candidates])
+    valsX = np.concatenate([np.ones(k), np.ones(len(withMin)), unitContribution(data)[candidates]])
+    colsY = np.concatenate([np.arange(k), withMin, np.arange(k)])
+    valsY = np.concatenate([-bigM, -minp[withMin], -fixedCosts[candidates]])
+    numRows = 2 * k + len(withMin)
+    launch = sparse.hstack([
+        sparse.csr_matrix((valsX, (rowsX, colsX)), shape=(numRows, data.numProducts)),
+        sparse.csr_matrix((valsY, (rowsX, colsY)), shape=(numRows, k)),
+    ])
+
+    colTypes = np.concatenate([np.full(data.numProducts, 'I' if integer else 'C'), np.full(k, 'B')])
+    return LinearModel(
+        base.colNames + [f'Einführung_{name}' for name in names],
+        np.concatenate([base.objective, -fixedCosts[candidates]]),
+        np.concatenate([lb, np.zeros(k)]),
+        np.concatenate([ub, np.ones(k)]),
+        sparse.vstack([sparse.hstack([base.matrix, sparse.csr_matrix((base.numRows, k))]), launch], format='csr'),
+        np.concatenate([base.rowSense, np.full(k, 'L'), np.full(len(withMin) + k, 'G')]),
+        np.concatenate([base.rhs, np.zeros(numRows)]),
+        base.rowNames + [f'Start_{name}' for name in names]
+        + [f'MinStart_{names[i]}' for i in withMin] + [f'Deckung_{name}' for name in names],
+        objConstant=base.objConstant, colTypes=colTypes,
+    )
+
+
+def randomLaunchCosts(data, share=0.25, seed=None, offcutRules=OFFCUT_RULES):
+    """Launch costs for a generated instance: a random `share` of the products,
+    Fixkosten between 10% and 60% of the contribution at full volume."""
+    rng = np.random.default_rng(seed)
+    candidates = np.flatnonzero(rng.random(data.numProducts) < share)
+    volume = np.minimum(productBounds(data, offcutRules, candidates), 1e6)
+    potential = np.maximum(unitContribution(data), 1.0) * volume
+    costs = np.full(data.numProducts, np.nan)
+    costs[candidates] = np.round(rng.uniform(0.1, 0.6, len(candidates)) * potential[candidates], -2)
+    return costs
+
+
+def solveLaunch(data, fixedCosts, offcutRules=OFFCUT_RULES, bigM=None, integer=False, backend='auto', timeLimit=None):
+    """Build and solve the launch MIP, returns (model, build time, solver, optimal)."""
+    start = time.perf_counter()
+    model = buildLaunchModel(data, fixedCosts, offcutRules, bigM, integer)
+    buildTime = time.perf_counter() - start
+
+    solver = getBackend(backend, "DiamondStreetStyles Produkteinführung").load(model)
+    problem = getattr(solver, 'problem', None)
+    if timeLimit is not None and problem is not None:
+        problem.setControl('timelimit', timeLimit)
+    return model, buildTime, solver, solver.solve()
+
+
+def relaxationBound(model, backend='auto'):
+    """Objective of the LP relaxation, the bound branch-and-bound starts from."""
+    relaxed = copy.copy(model)
+    relaxed.colTypes = None
+    return solveModel(relaxed, backend, "DiamondStreetStyles Relaxation").objectiveValue()
+
+
+def launchStats(model, solver, optimal, backend='auto'):
+    stats = {'optimal': optimal, 'objective': solver.objectiveValue(), 'solve': solver.solveTime}
+    stats['lpRelaxation'] = relaxationBound(model, backend)
+    stats['rootGap'] = (stats['lpRelaxation'] - stats['objective']) / max(abs(stats['objective']), 1e-9)
+    problem = getattr(solver, 'problem', None)
+    if problem is not None:
+        stats['nodes'] = problem.attributes.nodes
+        stats['bestBound'] = problem.attributes.bestbound
+    launched = model.colTypes == 'B'
+    stats['launched'] = int((solver.solution(np.flatnonzero(launched)) > 0.5).sum())
+    stats['candidates'] = int(launched.sum())
+    return stats
+
+
+if __name__ == '__main__':
+
+    from dss.bench import parseSize
+    from dss.ingest import readPlanningData
+    from dss.synthetic import generatePlanningData
+
+    parser = argparse.ArgumentParser(description="Product launch decisions with fixed costs")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--size', default=None, help="generated instance <products>x<materials> instead of the workbook")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--launch-share', type=float, default=0.25,
+                        help="share of the generated products with a launch decision")
+    parser.add_argument('--integer', action='store_true', help="integer quantities like DSS_B.py")
+    parser.add_argument('--big-m', type=float, default=None, help="one M for every candidate instead of the derived ones")
+    parser.add_argument('--compare', action='store_true', help="also solve with one M for all (the largest derived M)")
+    parser.add_argument('--time-limit', type=float, default=60.0)
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    if args.size is None:
+        data = readPlanningData(args.workbook)
+        fixedCosts = launchCostArray(data, readLaunchCosts(args.workbook))
+    else:
+        products, materials = parseSize(args.size)
+        data = generatePlanningData(products, materials, seed=args.seed)
+        fixedCosts = randomLaunchCosts(data, args.launch_share, args.seed)
+
+    variants = [('derived M' if args.big_m is None else f'M = {args.big_m:g}', args.big_m)]
+    if args.compare:
+        candidates = np.flatnonzero(~np.isnan(fixedCosts))
+        variants.append(('uniform M', float(productBounds(data, optional=candidates)[candidates].max())))
+
+    for label, bigM in variants:
+        model, buildTime, solver, optimal = solveLaunch(data, fixedCosts, bigM=bigM, integer=args.integer,
+                                                        backend=args.backend, timeLimit=args.time_limit)
+        print(f"-- {label}: {model.numCols} columns, {model.numRows} rows, build {buildTime:.3f}s ({solver.name})")
+        for key, value in launchStats(model, solver, optimal, args.backend).items():
+            print(f"{key:12} {value}")
@@ -0,0 +1,284 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Mehrperiodenplanung mit Lagerbeständen
+
+Time-expanded version of the DiamondStreetCycles.py LP over T periods
+(e.g. 52 weeks of a season). Per period t and product p / material m:
+
+    x[t,p]  production          s[t,p]  sales, s <= Nachfrage[t,p]
+    I[t,p]  finished goods      J[t,m]  fabric in stock at the end of t
+
+    I[t-1,p] + x[t,p] - s[t,p] - I[t,p] = 0
+    J[t-1,m] + Eingang[t,m] - sum_p a_pm x[t,p] - J[t,m] = 0
+    x[t,Fleece-Top] >= x[t,Fleece-Shirt] ... (offcut rules per period)
+    sum_t x[t,p] >= Mindestproduktionsmenge (season total)
+
+    max  sum_t (vk s - mk x - hP I - hM J) + (cost - rk) J[T-1]
+         - fixed costs - cost * all arrivals
+
+Fabric is paid on arrival; what is left after the last period is sent
+back like in the single-period model. With one period and no holding
+costs the model is the base LP.
+
+Input sheets (long format, one row per period and item):
+
+    Nachfrage        Periode | Produkt | Nachfrage        (empty = no cap)
+    Materialeingang  Periode | Material | Menge
+    Lager (optional) Name | Anfangsbestand | Lagerkosten  (products and materials)
+
+The LP is assembled from Kronecker products of the single-period blocks
+and a period shift matrix, there is no Python object per period.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from dss.backends import getBackend
+from dss.builder import INFINITY, OFFCUT_RULES, LinearModel
+from dss.data import PlanningData
+from dss.ingest import SHEETS, readWorkbook
+
+
+PERIOD_SHEETS = ('Nachfrage', 'Materialeingang')
+STOCK_SHEET = 'Lager'
+
+
+class MultiPeriodData:
+
+    def __init__(self, base, periods, demand, arrivals, productStock=None, materialStock=None,
+                 productHolding=None, materialHolding=None):
+        self.base = base
+        self.periods = list(periods)
+        # (T, P), NaN = no cap in that period
+        self.demand = np.asarray(demand, dtype=float)
+        # (T, M)
+        self.arrivals = np.asarray(arrivals, dtype=float)
+
+        P, M = base.numProducts, base.numMaterials
+        self.productStock = np.zeros(P) if productStock is None else np.asarray(productStock, dtype=float)
+        self.materialStock = np.zeros(M) if materialStock is None else np.asarray(materialStock, dtype=float)
+        self.productHolding = np.zeros(P) if productHolding is None else np.asarray(productHolding, dtype=float)
+        self.materialHolding = np.zeros(M) if materialHolding is None else np.asarray(materialHolding, dtype=float)
+
+        if self.demand.shape != (self.numPeriods, P) or self.arrivals.shape != (self.numPeriods, M):
+            raise ValueError(f"Period data must be ({self.numPeriods}, {P}) demand and ({self.numPeriods}, {M}) arrivals")
+
+    @property
+    def numPeriods(self):
+        return len(self.periods)
+
+    @classmethod
+    def fromFrames(cls, base, demand_df, arrivals_df, stock_df=None):
+        """Pivot the long Nachfrage / Materialeingang / Lager sheets onto the base data."""
+        periods = np.unique(np.concatenate([demand_df['Periode'].to_numpy(), arrivals_df['Periode'].to_numpy()]))
+        periodIndex = pd.Index(periods)
+        productIndex = pd.Index(base.productNames)
+        materialIndex = pd.Index(base.materialNames)
+
+        def positions(index, values, sheet):
+            pos = index.get_indexer(values)
+            if (pos < 0).any():
+                unknown = sorted(set(np.asarray(values)[pos < 0].tolist()))
+                raise ValueError(f"Unknown entries in sheet {sheet}: {unknown[:5]}")
+            return pos
+
+        demand = np.full((len(periods), base.numProducts), np.nan)
+        demand[positions(periodIndex, demand_df['Periode'], 'Nachfrage'),
+               positions(productIndex, demand_df['Produkt'], 'Nachfrage')] = demand_df['Nachfrage'].to_numpy(dtype=float)
+
+        arrivals = np.zeros((len(periods), base.numMaterials))
+        np.add.at(arrivals, (positions(periodIndex, arrivals_df['Periode'], 'Materialeingang'),
+                             positions(materialIndex, arrivals_df['Material'], 'Materialeingang')),
+                  arrivals_df['Menge'].to_numpy(dtype=float))
+
+        stocks = {}
+        if stock_df is not None:
+            names = stock_df['Name'].to_numpy()
+            for key, index in (('product', productIndex), ('material', materialIndex)):
+                pos = index.get_indexer(names)
+                found = pos >= 0
+                for column in ('Anfangsbestand', 'Lagerkosten'):
+                    values = np.zeros(len(index))
+                    values[pos[found]] = np.nan_to_num(stock_df[column].to_numpy(dtype=float)[found])
+                    stocks[key, column] = values
+
+        return cls(base, periods, demand, arrivals,
+                   stocks.get(('product', 'Anfangsbestand')), stocks.get(('material', 'Anfangsbestand')),
+                   stocks.get(('product', 'Lagerkosten')), stocks.get(('material', 'Lagerkosten')))
+
+
+def seasonFrames(base, periods=52, demandProfile=None, arrivalProfile=None):
+    """Nachfrage / Materialeingang sheets that spread the single-period data over a season.
+
+    Maximalprognose is split over the periods by `demandProfile` (uniform by
+    default), the Materialbeschränkungen arrive by `arrivalProfile` (all in
+    the first period by default). Profiles are normalised to sum to 1.
+    """
+    demandProfile = np.full(periods, 1.0) if demandProfile is None else np.asarray(demandProfile, dtype=float)
+    arrivalProfile = np.eye(periods)[0] if arrivalProfile is None else np.asarray(arrivalProfile, dtype=float)
+    demandProfile = demandProfile / demandProfile.sum()
+    arrivalProfile = arrivalProfile / arrivalProfile.sum()
+
+    P, M = base.numProducts, base.numMaterials
+    period = np.arange(1, periods + 1)
+    return {
+        'Nachfrage': pd.DataFrame({
+            'Periode': np.repeat(period, P),
+            'Produkt': np.tile(np.asarray(base.productNames, dtype=object), periods),
+            'Nachfrage': np.outer(demandProfile, base.maxp).ravel(),
+        }),
+        'Materialeingang': pd.DataFrame({
+            'Periode': np.repeat(period, M),
+            'Material': np.tile(np.asarray(base.materialNames, dtype=object), periods),
+            'Menge': np.outer(arrivalProfile, base.limits).ravel(),
+        }),
+    }
+
+
+def readMultiPeriod(file_path, **kwargs):
+    """MultiPeriodData from the base sheets plus Nachfrage, Materialeingang and optional Lager."""
+    frames = readWorkbook(file_path, SHEETS + PERIOD_SHEETS, **kwargs)
+    base = PlanningData.fromFrames(frames['Material'], frames['Produkt'], frames['Fixkosten'], frames['Variablen'])
+    try:
+        stock_df = readWorkbook(file_path, [STOCK_SHEET], **kwargs)[STOCK_SHEET]
+    except ValueError:
+        # sheet not in the workbook
+        stock_df = None
+    return MultiPeriodData.fromFrames(base, frames['Nachfrage'], frames['Materialeingang'], stock_df)
+
+
+def buildMultiPeriodModel(mp, offcutRules=OFFCUT_RULES):
+    """Time-expanded LinearModel, columns [x | s | I | J] each period-major."""
+    base = mp.base
+    T, P, M = mp.numPeriods, base.numProducts, base.numMaterials
+    TP, TM = T * P, T * M
+
+    eyeT = sparse.identity(T, format='csr')
+    # (shift @ v)[t] = v[t-1], the stock carried into period t
+    shift = sparse.eye(T, k=-1, format='csr')
+    bomT = base.bom.matrix.T.tocsr()
+
+    ## Bilanzen
+    productBalance = sparse.hstack([
+        sparse.identity(TP), -sparse.identity(TP),
+        sparse.kron(shift, sparse.identity(P)) - sparse.identity(TP),
+        sparse.csr_matrix((TP, TM)),
+    ])
+    materialBalance = sparse.hstack([
+        -sparse.kron(eyeT, bomT),
+        sparse.csr_matrix((TM, 2 * TP)),
+        sparse.kron(shift, sparse.identity(M)) - sparse.identity(TM),
+    ])
+    productRhs = np.zeros((T, P))
+    productRhs[0] = -mp.productStock
+    materialRhs = -mp.arrivals.copy()
+    materialRhs[0] -= mp.materialStock
+
+    ## Verschnittregelung per period
+    prodIndex = {name: i for i, name in enumerate(base.productNames)}
+    rules = [(prodIndex[larger], prodIndex[smaller]) for larger, smaller in offcutRules
+             if larger in prodIndex and smaller in prodIndex]
+    R = len(rules)
+    offcut = sparse.csr_matrix(
+        (np.tile([1.0, -1.0], R), (np.repeat(np.arange(R), 2), np.array(rules, dtype=int).ravel())),
+        shape=(R, P))
+    offcutRows = sparse.hstack([sparse.kron(eyeT, offcut), sparse.csr_matrix((T * R, 2 * TP + TM))])
+
+    ## Mindestproduktionsmenge over the season
+    minIdx = np.flatnonzero(base.minp > 0)
+    selector = sparse.csr_matrix((np.ones(len(minIdx)), (np.arange(len(minIdx)), minIdx)), shape=(len(minIdx), P))
+    minRows = sparse.hstack([sparse.kron(np.ones((1, T)), selector), sparse.csr_matrix((len(minIdx), 2 * TP + TM))])
+
+    matrix = sparse.vstack([productBalance, materialBalance, offcutRows, minRows]).tocsr()
+    rowSense = np.concatenate([np.full(TP + TM, 'E'), np.full(T * R + len(minIdx), 'G')])
+    rhs = np.concatenate([productRhs.ravel(), materialRhs.ravel(), np.zeros(T * R), base.minp[minIdx]])
+
+    ## Zielfunktion
+    fabricValue = np.tile(-mp.materialHolding, (T, 1))
+    fabricValue[-1] += base.costs - base.returnCost
+    objective = np.concatenate([
+        np.tile(-base.mk, T), np.tile(base.vk, T), np.tile(-mp.productHolding, T), fabricValue.ravel(),
+    ])
+    constant = -base.fixedCosts - base.costs @ mp.arrivals.sum(axis=0)
+
+    ub = np.full(2 * TP + TM + TP, INFINITY)
+    ub[TP:2 * TP] = np.where(np.isnan(mp.demand), INFINITY, mp.demand).ravel()
+
+    periodNames = [str(t) for t in mp.periods]
+    colNames = [f'{kind}_{t}_{name}' for kind, names in (('x', base.productNames), ('s', base.productNames),
+                                                         ('I', base.productNames), ('J', base.materialNames))
+                for t in periodNames for name in names]
+    rowNames = ([f'Bestand_{t}_{name}' for t in periodNames for name in base.productNames]
+                + [f'Stoff_{t}_{name}' for t in periodNames for name in base.materialNames]
+                + [f'Verschnitt_{t}_{i}' for t in periodNames for i in range(R)]
+                + [f'Min_{base.productNames[i]}' for i in minIdx])
+
+    return LinearModel(colNames, objective, np.zeros(len(objective)), ub, matrix, rowSense, rhs, rowNames, constant)
+
+
+class MultiPeriodPlan:
+
+    def __init__(self, mp, solution, objective):
+        T, P, M = mp.numPeriods, mp.base.numProducts, mp.base.numMaterials
+        solution = np.asarray(solution, dtype=float)
+        self.periods = mp.periods
+        self.production = solution[:T * P].reshape(T, P)
+        self.sales = solution[T * P:2 * T * P].reshape(T, P)
+        self.stock = solution[2 * T * P:3 * T * P].reshape(T, P)
+        self.fabric = solution[3 * T * P:].reshape(T, M)
+        self.objective = objective
+
+    def periodFrame(self):
+        """Totals per period."""
+        return pd.DataFrame({
+            'Produktion': self.production.sum(axis=1),
+            'Absatz': self.sales.sum(axis=1),
+            'Lager Produkte': self.stock.sum(axis=1),
+            'Lager Stoff': self.fabric.sum(axis=1),
+        }, index=pd.Index(self.periods, name='Periode'))
+
+
+def solveMultiPeriod(mp, backend='auto'):
+    """Build and solve the time-expanded LP, returns (plan, build time, solver)."""
+    start = time.perf_counter()
+    model = buildMultiPeriodModel(mp)
+    buildTime = time.perf_counter() - start
+
+    solver = getBackend(backend, "DiamondStreetStyles Saison").load(model)
+    if not solver.solve():
+        raise RuntimeError(f"Multi-period model not solved to optimality with {solver.name}")
+    return MultiPeriodPlan(mp, solver.solution(), solver.objectiveValue()), buildTime, solver
+
+
+if __name__ == '__main__':
+
+    from dss.ingest import readPlanningData
+
+    parser = argparse.ArgumentParser(description="Multi-period production plan with inventory")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--periods', type=int, default=52,
+                        help="spread the workbook over this many periods if it has no Nachfrage sheet")
+    parser.add_argument('--holding', type=float, default=0.0, help="Lagerkosten per unit and period")
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    try:
+        mp = readMultiPeriod(args.workbook)
+    except ValueError:
+        base = readPlanningData(args.workbook)
+        frames = seasonFrames(base, args.periods)
+        holding = np.full(base.numProducts, args.holding)
+        mp = MultiPeriodData.fromFrames(base, frames['Nachfrage'], frames['Materialeingang'])
+        mp.productHolding = holding
+        mp.materialHolding = np.full(base.numMaterials, args.holding)
+
+    plan, buildTime, solver = solveMultiPeriod(mp, args.backend)
+    print(plan.periodFrame().to_string())
+    print()
+    print(f"Objective Function Value: {plan.objective}")
+    print(f"{mp.numPeriods} periods, {solver.model.numCols} columns, {solver.model.numRows} rows")
+    print(f"Build: {buildTime:.3f}s, Load: {solver.loadTime:.3f}s, Solve: {solver.solveTime:.3f}s ({solver.name})")
@@ -0,0 +1,351 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Parametrische Analyse
+
+Traces the profit as a function of one material limit (value function) or
+of one product's Maschinenkosten. Instead of re-solving at grid points, the
+trace follows the basis changes: rhssa / objsa give the range in which the
+current basis stays optimal, the profit is linear in between (slope = dual
+value minus Rücksendekosten, since the objective constant moves with the
+limit; or minus the production quantity), and the next basis is found by
+moving the parameter just past the range end and re-solving from the kept
+basis (a few simplex pivots). Materials / products are traced in parallel,
+every worker process keeps one built model.
+"""
+
+import argparse
+import copy
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import xpress as xp
+
+from dss.backends import loadXpress
+from dss.builder import buildLinearModel
+from dss.ingest import readPlanningData
+
+
+# rhssa / objsa report this for unbounded ranges
+INFINITE = 1e20
+
+# RHS ranges are reported with a small tolerance, step this far past them
+STEP = 1e-6
+
+
+class Segment:
+    """One basis: linear profit between two parameter values."""
+
+    def __init__(self, start, end, profitStart, profitEnd, slope, plan=None):
+        self.start = start
+        self.end = end
+        self.profitStart = profitStart
+        self.profitEnd = profitEnd
+        self.slope = slope
+        self.plan = plan
+
+
+class ValueFunction:
+    """Piecewise-linear profit curve of one parameter (sorted segments)."""
+
+    def __init__(self, name, parameter, segments, solves, iterations):
+        self.name = name
+        self.parameter = parameter
+        self.segments = sorted(segments, key=lambda s: s.start)
+        self.solves = solves
+        self.iterations = iterations
+
+    @property
+    def breakpoints(self):
+        """Parameter values at which the optimal basis changes."""
+        return [s.end for s in self.segments[:-1]]
+
+    def toFrame(self, planNames=None):
+        """Segments as rows; with planNames also the optimal plan of every segment."""
+        frame = pd.DataFrame({
+            'name': self.name,
+            'parameter': self.parameter,
+            'from': [s.start for s in self.segments],
+            'to': [s.end for s in self.segments],
+            'profit from': [s.profitStart for s in self.segments],
+            'profit to': [s.profitEnd for s in self.segments],
+            'slope': [s.slope for s in self.segments],
+        })
+        if planNames is not None and self.segments and self.segments[0].plan is not None:
+            plans = pd.DataFrame([s.plan[:len(planNames)] for s in self.segments], columns=planNames)
+            frame = pd.concat([frame, plans], axis=1)
+        return frame
+
+
+def _optimal(problem):
+    return problem.attributes.lpstatus == xp.lp_optimal
+
+
+def _step(value):
+    return STEP * max(1.0, abs(value))
+
+
+def _trace(problem, value0, lo, hi, setValue, sensitivity, slope, keepPlan, maxSteps):
+    """Follow the optimal bases of one parameter over [lo, hi], starting at value0.
+
+    sensitivity() returns the parameter range of the current basis,
+    slope() the derivative of the profit w.r.t. the parameter in that basis.
+    """
+    segments = []
+    solves = 0
+    iterations = 0
+
+    def resolve(value):
+        nonlocal solves, iterations
+        setValue(value)
+        problem.lpoptimize()
+        solves += 1
+        iterations += problem.attributes.simplexiter
+
+    for direction in (1, -1):
+        v = value0
+        if direction == -1:
+            # the segment containing value0 is already known from the upward trace
+            if not segments or segments[0].start <= lo:
+                break
+            v = segments[0].start - _step(segments[0].start)
+            resolve(v)
+
+        for _ in range(maxSteps):
+            if not _optimal(problem):
+                break
+
+            obj = problem.getObjVal()
+            rate = slope()
+            lower, upper = sensitivity()
+            start = max(lower, lo)
+            end = min(upper, hi)
+
+            plan = problem.getSolution() if keepPlan else None
+            segments.append(Segment(start, end, obj + rate * (start - v), obj + rate * (end - v), rate, plan))
+
+            # next basis beyond the range end, or stop at the end of [lo, hi]
+            if (direction == 1 and (upper >= hi or upper >= INFINITE)) or \
+                    (direction == -1 and (lower <= lo or lower <= -INFINITE)):
+                break
+
+            edge = end if direction == 1 else start
+            v = edge + direction * _step(edge)
+            resolve(v)
+
+    ## restore
+    setValue(value0)
+    problem.lpoptimize()
+
+    return segments, solves, iterations
+
+
+def traceRhs(problem, row, lo, hi, name=None, maxSteps=1000, constantRate=0.0):
+    """Value function of the RHS of `row` on [lo, hi].
+
+    `constantRate` is the change of the objective constant per unit of RHS
+    (-Rücksendekosten for a material limit, see objectiveCoefficients); the
+    constant moves together with the RHS and the slope is dual + constantRate.
+    The problem must be solved to optimality at its current RHS. RHS and
+    constant are restored afterwards; parts of [lo, hi] where the LP is
+    infeasible are left out of the curve.
+    """
+    rhs = []
+    problem.getrhs(rhs, row, row)
+    constant0 = problem.attributes.objrhs
+
+    def setValue(value):
+        problem.chgrhs([row], [value])
+        if constantRate:
+            # objrhs is minus the coefficient of column -1
+            problem.chgobj([-1], [-(constant0 + constantRate * (value - rhs[0]))])
+
+    def sensitivity():
+        lower, upper = [], []
+        problem.rhssa([row], lower, upper)
+        return lower[0], upper[0]
+
+    segments, solves, iterations = _trace(
+        problem, rhs[0], lo, hi,
+        setValue=setValue,
+        sensitivity=sensitivity,
+        slope=lambda: problem.getDual(row) + constantRate,
+        keepPlan=False, maxSteps=maxSteps,
+    )
+    return ValueFunction(name if name is not None else row, 'rhs', segments, solves, iterations)
+
+
+def traceObjective(problem, col, lo, hi, name=None, maxSteps=1000):
+    """Profit as a function of the objective coefficient of `col` on [lo, hi].
+
+    Every segment keeps the optimal plan of its basis. The problem must be
+    solved to optimality, the coefficient is restored afterwards.
+    """
+    coef = []
+    problem.getobj(coef, col, col)
+
+    def sensitivity():
+        lower, upper = [], []
+        problem.objsa([col], lower, upper)
+        return lower[0], upper[0]
+
+    segments, solves, iterations = _trace(
+        problem, coef[0], lo, hi,
+        setValue=lambda value: problem.chgobj([col], [value]),
+        sensitivity=sensitivity,
+        slope=lambda: problem.getSolution(col),
+        keepPlan=True, maxSteps=maxSteps,
+    )
+    return ValueFunction(name if name is not None else col, 'objective', segments, solves, iterations)
+
+
+def machineCostCurve(problem, col, mk0, mkTo=None, name=None, maxSteps=1000):
+    """Walk the Maschinenkosten of the product in `col` upwards from mk0.
+
+    Higher machine costs lower the objective coefficient one to one, so
+    this is traceObjective mirrored into machine cost terms. Without mkTo
+    the walk runs until the basis stays optimal for any further increase.
+    """
+    coef = []
+    problem.getobj(coef, col, col)
+    c0 = coef[0]
+    lo = c0 - (mkTo - mk0) if mkTo is not None else -INFINITE
+
+    curve = traceObjective(problem, col, lo, c0, name=name, maxSteps=maxSteps)
+
+    # coefficient c <-> machine cost mk0 + (c0 - c), profit slope w.r.t. mk is -x
+    segments = []
+    for s in curve.segments:
+        slope = 0.0 - s.slope
+        if s.start <= -INFINITE:
+            end, profitEnd = np.inf, (-np.inf if slope < 0 else s.profitEnd)
+        else:
+            end, profitEnd = mk0 + (c0 - s.start), s.profitStart
+        segments.append(Segment(mk0 + (c0 - s.end), end, s.profitEnd, profitEnd, slope, s.plan))
+    return ValueFunction(curve.name, 'Maschinenkosten', segments, curve.solves, curve.iterations)
+
+
+class ParametricWorker:
+    """Keeps one built model per process."""
+
+    def __init__(self, data):
+        self.data = data
+        self.problem = xp.problem("DiamondStreetStyles")
+        self.problem.setControl('outputlog', 0)
+        loadXpress(self.problem, buildLinearModel(data))
+        self.problem.lpoptimize()
+
+    def materialCurve(self, matName, lo, hi):
+        # material rows come first in the built model
+        row = self.data.bom.materialIndex[matName]
+        # every unit of limit adds Rücksendekosten to the constant of the base LP
+        return traceRhs(self.problem, row, lo, hi, name=matName, constantRate=-self.data.returnCost)
+
+    def checkMaterialCurve(self, curve, points=5):
+        """Largest gap between the traced curve and fresh solves at `points` limits."""
+        row = self.data.bom.materialIndex[curve.name]
+        data = copy.copy(self.data)
+        worst = 0.0
+        for s in curve.segments:
+            for value in np.linspace(s.start, s.end, points):
+                if abs(value) >= INFINITE:
+                    continue
+                data.limits = self.data.limits.copy()
+                data.limits[row] = value
+                problem = xp.problem("DiamondStreetStyles Check")
+                problem.setControl('outputlog', 0)
+                loadXpress(problem, buildLinearModel(data))
+                problem.lpoptimize()
+                if not _optimal(problem):
+                    continue
+                predicted = s.profitStart + s.slope * (value - s.start)
+                worst = max(worst, abs(problem.getObjVal() - predicted))
+        return worst
+
+    def machineCostCurve(self, prodName, mkTo=None):
+        col = self.data.bom.productIndex[prodName]
+        return machineCostCurve(self.problem, col, self.data.mk[col], mkTo, name=prodName)
+
+
+_worker = None
+
+
+def _initWorker(data):
+    global _worker
+    _worker = ParametricWorker(data)
+
+
+def _materialCurve(task):
+    return _worker.materialCurve(*task)
+
+
+def _machineCostCurve(task):
+    return _worker.machineCostCurve(*task)
+
+
+def _runPool(data, fn, tasks, workers):
+    with multiprocessing.Pool(min(workers or os.cpu_count(), len(tasks)), initializer=_initWorker, initargs=(data,)) as pool:
+        return pool.map(fn, tasks)
+
+
+def materialCurves(data, ranges=None, scale=(0.0, 2.0), workers=None):
+    """Value functions for every material limit, traced in parallel.
+
+    `ranges` maps material names to (lo, hi); materials without an entry
+    are traced on scale * current limit. Returns {material : ValueFunction}.
+    """
+    ranges = ranges or {}
+    tasks = []
+    for matName, limit in zip(data.materialNames, data.limits):
+        lo, hi = ranges.get(matName, (scale[0] * limit, scale[1] * limit))
+        tasks.append((matName, lo, hi))
+
+    curves = _runPool(data, _materialCurve, tasks, workers)
+    return {curve.name: curve for curve in curves}
+
+
+def machineCostCurves(data, mkTo=None, workers=None):
+    """Machine cost walks for every product, run in parallel.
+
+    `mkTo` maps product names to the highest machine cost to walk to;
+    products without an entry are walked over their whole range.
+    Returns {product : ValueFunction} with the optimal plan per segment.
+    """
+    mkTo = mkTo or {}
+    tasks = [(prodName, mkTo.get(prodName)) for prodName in data.productNames]
+    curves = _runPool(data, _machineCostCurve, tasks, workers)
+    return {curve.name: curve for curve in curves}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Parametric analysis of the DiamondStreetStyles LP")
+    parser.add_argument('kind', choices=['rhs', 'machine'], nargs='?', default='rhs',
+                        help="material limits (rhs) or machine cost increases (machine)")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scale', type=float, nargs=2, default=(0.0, 2.0), metavar=('FROM', 'TO'),
+                        help="traced range as multiples of the current limit (rhs only)")
+    parser.add_argument('--out', default=None, help="CSV file for the segments")
+    parser.add_argument('--check', action='store_true', help="compare the material curves with fresh solves (rhs only)")
+    args = parser.parse_args()
+
+    data = readPlanningData(args.workbook)
+    if args.kind == 'rhs':
+        curves = materialCurves(data, scale=args.scale, workers=args.workers)
+    else:
+        curves = machineCostCurves(data, workers=args.workers)
+
+    planNames = data.productNames if args.kind == 'machine' else None
+    frame = pd.concat([curve.toFrame(planNames) for curve in curves.values()], ignore_index=True)
+    if args.out:
+        frame.to_csv(args.out, index=False)
+    else:
+        print(frame.to_string())
+    for curve in curves.values():
+        print(f"{curve.name}: {len(curve.segments)} segments, {curve.solves} re-solves, {curve.iterations} iterations")
+    if args.check and args.kind == 'rhs':
+        worker = ParametricWorker(data)
+        for curve in curves.values():
+            print(f"{curve.name}: max deviation from re-solves {worker.checkMaterialCurve(curve):.6g}")
@@ -0,0 +1,447 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Presolve vor dem Solve
+
+Shrinks a LinearModel in Python before it goes to the solver. All steps
+keep the optimal value, every removed column gets a fixed value so a
+solution of the reduced model can be expanded back (postsolve):
+
+    Zielfunktion   a column whose objective and rows all favour its lower
+                   bound is fixed there (e.g. a product with negative
+                   Deckungsbeitrag and no Mindestproduktionsmenge)
+    Dominanz       j is fixed at its lower bound if a column k without
+                   upper bound earns at least as much and uses at most as
+                   much of every material j uses: moving units from j to k
+                   never hurts
+    Schranke       rows with a single entry (Maximalprognose and
+                   Mindestproduktionsmenge as rows) become column bounds
+    leer           rows without entries left, e.g. a material no product uses
+    redundant      rows the column bounds can never violate, e.g. a material
+                   the capped products cannot use up
+    Aktivität      column bounds tightened from the rows: a product that only
+                   uses Seide cannot exceed limit / usage, offcut rules pass
+                   bounds on (integer columns are rounded)
+    Koeffizient    big-M rows x - M y <= 0 with binary y get M lowered to the
+                   tightened bound of x
+
+The reduced model is smaller and, for the integer model of DSS_B.py,
+tighter, which keeps the branch-and-bound tree small. Duals and reduced
+costs of removed rows and columns are not reconstructed.
+
+presolveProblem runs the same on a loaded xp.problem (scripts that build
+with xp.var objects) and applies the result in place: fixings and bounds
+through chgbounds, coefficients through chgmcoef, dropped rows through
+delConstraint.
+
+    python -m dss.presolve --size 2000x60 --launch-share 0.25
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+from scipy import sparse
+
+from dss.builder import INFINITY, MAXIMIZE, LinearModel
+
+FEAS_TOL = 1e-9
+
+# dominance is checked against the subsets of a column's rows, skip long columns
+MAX_DOMINANCE_ROWS = 6
+
+
+class PresolveResult:
+
+    def __init__(self, original, model, keptCols, keptRows, fixedValues, fixReasons, rowReasons, tightened, coefficients, presolveTime):
+        self.original = original
+        self.model = model
+        self.keptCols = keptCols
+        self.keptRows = keptRows
+        # value of every original column that is not in the reduced model (NaN for kept ones)
+        self.fixedValues = fixedValues
+        # column / row index -> reason
+        self.fixReasons = fixReasons
+        self.rowReasons = rowReasons
+        # column index -> (lb, ub) before tightening
+        self.tightened = tightened
+        # (row, column, new value) of the tightened big-M coefficients, original indices
+        self.coefficients = coefficients
+        self.presolveTime = presolveTime
+
+    def postsolve(self, solution):
+        """Solution of the reduced model as vector over the original columns."""
+        full = self.fixedValues.copy()
+        full[self.keptCols] = solution
+        return full
+
+    def counts(self):
+        counts = {}
+        for reason in list(self.fixReasons.values()) + list(self.rowReasons.values()):
+            key = reason.split(' ')[0]
+            counts[key] = counts.get(key, 0) + 1
+        counts['Aktivität'] = len(self.tightened)
+        counts['Koeffizient'] = len(self.coefficients)
+        return counts
+
+    def summary(self):
+        original, model = self.original, self.model
+        lines = [f"Presolve: {original.numCols} -> {model.numCols} columns, "
+                 f"{original.numRows} -> {model.numRows} rows, "
+                 f"{original.matrix.nnz} -> {model.matrix.nnz} nonzeros ({self.presolveTime:.3f}s)"]
+        for reason, count in self.counts().items():
+            lines.append(f"  {reason:<12}{count:>8}")
+        return '\n'.join(lines)
+
+    def removedCols(self):
+        """{column name : (value, reason)} of the fixed columns."""
+        return {self.original.colNames[j]: (self.fixedValues[j], reason) for j, reason in self.fixReasons.items()}
+
+    def removedRows(self):
+        return {self.original.rowNames[i]: reason for i, reason in self.rowReasons.items()}
+
+
+def _activity(matrix, lb, ub, lower):
+    """Finite part and number of infinite terms of the min (lower) / max activity of every row."""
+    coo = matrix.tocoo()
+    positive = coo.data > 0
+    bound = np.where(positive == lower, lb[coo.col], ub[coo.col])
+    infinite = np.abs(bound) >= INFINITY
+    term = np.where(infinite, 0.0, coo.data * bound)
+    n = matrix.shape[0]
+    return (np.bincount(coo.row, weights=term, minlength=n),
+            np.bincount(coo.row, weights=infinite, minlength=n).astype(int), coo, term, infinite)
+
+
+def _tightenBounds(matrix, sense, rhs, lb, ub, integer, passes=10):
+    """Activity based bound tightening on rows a'x <= b (G rows negated, E rows both ways)."""
+    rowsL = np.flatnonzero(sense != 'G')
+    rowsG = np.flatnonzero(sense != 'L')
+    # every row as <= row
+    upper = sparse.vstack([matrix[rowsL], -matrix[rowsG]], format='csr')
+    bound = np.concatenate([rhs[rowsL], -rhs[rowsG]])
+    tightened = {}
+
+    for _ in range(passes):
+        finite, infinite, coo, term, termInf = _activity(upper, lb, ub, lower=True)
+        # min activity of the other entries of the row
+        restInf = infinite[coo.row] - termInf
+        usable = (restInf == 0) & (np.abs(coo.data) > FEAS_TOL)
+        slack = bound[coo.row] - (finite[coo.row] - term)
+        newBound = slack / np.where(usable, coo.data, 1.0)
+
+        newUb = np.full(len(ub), INFINITY)
+        sel = usable & (coo.data > 0)
+        np.minimum.at(newUb, coo.col[sel], newBound[sel])
+        newLb = np.full(len(lb), -INFINITY)
+        sel = usable & (coo.data < 0)
+        np.maximum.at(newLb, coo.col[sel], newBound[sel])
+
+        newUb = np.where(integer, np.floor(newUb + 1e-6), newUb)
+        newLb = np.where(integer, np.ceil(newLb - 1e-6), newLb)
+        # only real improvements, otherwise the passes creep by rounding errors
+        improveUb = newUb < ub - 1e-7 * np.maximum(1.0, np.abs(ub))
+        improveLb = newLb > lb + 1e-7 * np.maximum(1.0, np.abs(lb))
+        if not improveUb.any() and not improveLb.any():
+            break
+        for j in np.flatnonzero(improveUb | improveLb):
+            tightened.setdefault(int(j), (lb[j], ub[j]))
+        ub = np.where(improveUb, newUb, ub)
+        lb = np.where(improveLb, newLb, lb)
+
+    infeasible = np.flatnonzero(lb > ub + 1e-6 * np.maximum(1.0, np.abs(ub)))
+    if len(infeasible):
+        raise ValueError(f"Presolve: the model is infeasible, bounds of column {int(infeasible[0])} cross")
+    return lb, np.maximum(ub, lb), tightened
+
+
+def _impliedUpper(matrix, sense, rhs, lb, ub, integer):
+    """Upper bound every column gets from the rows alone (one activity pass)."""
+    rowsL = np.flatnonzero(sense != 'G')
+    rowsG = np.flatnonzero(sense != 'L')
+    upper = sparse.vstack([matrix[rowsL], -matrix[rowsG]], format='csr')
+    bound = np.concatenate([rhs[rowsL], -rhs[rowsG]])
+    finite, infinite, coo, term, termInf = _activity(upper, lb, ub, lower=True)
+    usable = (infinite[coo.row] - termInf == 0) & (coo.data > FEAS_TOL)
+    implied = np.full(len(ub), INFINITY)
+    np.minimum.at(implied, coo.col[usable], (bound[coo.row] - (finite[coo.row] - term))[usable] / coo.data[usable])
+    return np.where(integer, np.floor(implied + 1e-6), implied)
+
+
+def _dominated(matrix, sense, objective, lb, free, types, active):
+    """{column j : dominating column k} for columns that can give their units to k.
+
+    Only `free` columns dominate, their upper bound (if any) follows from
+    the rows, so they can take any number of units the rows allow.
+    """
+    csc = matrix.tocsc()
+    csc.sort_indices()
+    supports = [tuple(csc.indices[csc.indptr[j]:csc.indptr[j + 1]]) for j in range(csc.shape[1])]
+
+    bySupport = {}
+    for k in np.flatnonzero(active & free & (types != 'B')):
+        if supports[k]:
+            bySupport.setdefault(supports[k], []).append(k)
+
+    def column(j):
+        return dict(zip(csc.indices[csc.indptr[j]:csc.indptr[j + 1]], csc.data[csc.indptr[j]:csc.indptr[j + 1]]))
+
+    dominated = {}
+    for j in np.flatnonzero(active & (lb > -INFINITY) & (types != 'B')):
+        rows = supports[j]
+        if not rows or len(rows) > MAX_DOMINANCE_ROWS:
+            continue
+        colJ = column(j)
+        found = None
+        for size in range(1, len(rows) + 1):
+            for subset in itertools.combinations(rows, size):
+                for k in bySupport.get(subset, ()):
+                    if k == j or k in dominated or types[k] != types[j] or objective[k] < objective[j]:
+                        continue
+                    colK = column(k)
+                    better = True
+                    equal = objective[k] == objective[j]
+                    for r in rows:
+                        a, b = colK.get(r, 0.0), colJ[r]
+                        if sense[r] == 'L':
+                            ok = a <= b
+                        elif sense[r] == 'G':
+                            ok = a >= b
+                        else:
+                            ok = a == b
+                        if not ok:
+                            better = False
+                            break
+                        equal = equal and a == b
+                    # identical columns: only the later one is fixed
+                    if better and not (equal and k > j):
+                        found = k
+                        break
+                if found is not None:
+                    break
+            if found is not None:
+                break
+        if found is not None:
+            dominated[int(j)] = int(found)
+    return dominated
+
+
+def _tightenCoefficients(matrix, sense, rhs, lb, ub, types):
+    """Big-M rows  rest + a y <= b  with binary y and a < 0: a is raised until
+    the row is just not redundant for y = 1. Returns the changed (row, col, value)."""
+    matrix = matrix.tocsr()
+    changes = []
+    maxFinite, maxInf, *_ = _activity(matrix, lb, ub, lower=False)
+    for i in np.flatnonzero(sense == 'L'):
+        cols = matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]]
+        vals = matrix.data[matrix.indptr[i]:matrix.indptr[i + 1]]
+        for pos in np.flatnonzero((types[cols] == 'B') & (vals < 0)):
+            j, a = cols[pos], vals[pos]
+            # max activity of the rest: a * lb(y) = 0 left out of the row maximum
+            if maxInf[i] > 0 or lb[j] != 0.0:
+                continue
+            restMax = maxFinite[i]
+            excess = rhs[i] - (restMax + a)
+            if excess > 1e-6 * max(1.0, abs(a)):
+                changes.append((int(i), int(j), a + excess))
+    for i, j, value in changes:
+        start, stop = matrix.indptr[i], matrix.indptr[i + 1]
+        matrix.data[start + np.flatnonzero(matrix.indices[start:stop] == j)[0]] = value
+    return matrix, changes
+
+
+def presolveModel(model, dominance=True, tighten=True):
+    """Reduced copy of `model` and the PresolveResult to map solutions back."""
+    start = time.perf_counter()
+    matrix = model.matrix.tocsr().astype(float)
+    matrix.eliminate_zeros()
+    sense = model.rowSense.copy()
+    rhs = model.rhs.copy()
+    lb, ub = model.lb.copy(), model.ub.copy()
+    types = np.full(model.numCols, 'C') if model.colTypes is None else model.colTypes.copy()
+    integer = types != 'C'
+    # presolve works on max c'x
+    objective = model.objective if model.sense == MAXIMIZE else -model.objective
+
+    activeCols = np.ones(model.numCols, dtype=bool)
+    activeRows = np.ones(model.numRows, dtype=bool)
+    fixedValues = np.full(model.numCols, np.nan)
+    fixReasons, rowReasons = {}, {}
+
+    def fix(cols, values, reason):
+        fixed = []
+        for j, value in zip(cols, values):
+            if activeCols[j]:
+                activeCols[j] = False
+                fixedValues[j] = value
+                fixReasons[int(j)] = reason(j) if callable(reason) else reason
+                fixed.append(j)
+        return fixed
+
+    def dropRow(i, reason):
+        activeRows[i] = False
+        rowReasons[int(i)] = reason
+
+    # every step can enable the others (a fixed column empties a row, a row turned
+    # into a bound frees a dominating column), repeat until nothing changes
+    while True:
+        work = sparse.diags(activeRows.astype(float)) @ matrix @ sparse.diags(activeCols.astype(float))
+        work = work.tocsr()
+        work.eliminate_zeros()
+        entries = np.diff(work.indptr)
+        before = len(fixReasons) + len(rowReasons)
+
+        ## Schranke - single entry rows are column bounds
+        for i in np.flatnonzero(activeRows & (entries == 1)):
+            j, a = work.indices[work.indptr[i]], work.data[work.indptr[i]]
+            value = rhs[i] / a
+            # a x <= b is an upper bound for a > 0 and a lower bound for a < 0
+            isUpper = sense[i] == 'E' or (sense[i] == 'L') == (a > 0)
+            isLower = sense[i] == 'E' or not isUpper
+            if isUpper:
+                ub[j] = min(ub[j], np.floor(value + 1e-9) if integer[j] else value)
+            if isLower:
+                lb[j] = max(lb[j], np.ceil(value - 1e-9) if integer[j] else value)
+            dropRow(i, 'Schranke')
+        if (lb > ub + 1e-9 * np.maximum(1.0, np.abs(ub))).any():
+            raise ValueError("Presolve: the model is infeasible, bound rows contradict each other")
+
+        ## leer - e.g. a material no remaining product uses
+        tol = 1e-9 * np.maximum(1.0, np.abs(rhs))
+        for i in np.flatnonzero(activeRows & (entries == 0)):
+            if (sense[i] in 'LE' and rhs[i] < -tol[i]) or (sense[i] in 'GE' and rhs[i] > tol[i]):
+                raise ValueError(f"Presolve: row {model.rowNames[i]} is infeasible")
+            dropRow(i, 'leer')
+
+        work = (sparse.diags(activeRows.astype(float)) @ work).tocsr()
+        work.eliminate_zeros()
+
+        ## Zielfunktion - columns whose rows and objective all pull in one direction
+        coo = work.tocoo()
+        rowSign = np.select([sense[coo.row] == 'L', sense[coo.row] == 'G'], [1.0, -1.0], 0.0)
+        pull = rowSign * coo.data
+        # decreasing x_j never violates a row if its entries are >= 0 in <= rows and <= 0 in >= rows
+        blocksDown = np.bincount(coo.col, weights=(pull < 0) | (rowSign == 0), minlength=model.numCols) > 0
+        blocksUp = np.bincount(coo.col, weights=(pull > 0) | (rowSign == 0), minlength=model.numCols) > 0
+        down = activeCols & (objective <= 0) & ~blocksDown & (lb > -INFINITY)
+        newlyFixed = fix(np.flatnonzero(down), lb[down], 'Zielfunktion')
+        up = activeCols & (objective > 0) & ~blocksUp & (ub < INFINITY)
+        newlyFixed += fix(np.flatnonzero(up), ub[up], 'Zielfunktion')
+
+        ## Dominanz
+        if dominance:
+            free = (ub >= INFINITY) | (_impliedUpper(work, sense, rhs, lb, ub, integer) <= ub + 1e-9)
+            dominated = _dominated(work, sense, objective, lb, free, types, activeCols)
+            newlyFixed += fix(list(dominated), lb[list(dominated)],
+                              lambda j: f'Dominanz ({model.colNames[dominated[j]]})')
+
+        ## fixed columns move into the right-hand side
+        newlyFixed = np.asarray(newlyFixed, dtype=int)
+        if len(newlyFixed):
+            rhs = rhs - matrix[:, newlyFixed] @ fixedValues[newlyFixed]
+
+        ## redundant - checked with the bounds of the data and the bound rows, not with tightened ones
+        work = sparse.diags(activeRows.astype(float)) @ matrix @ sparse.diags(activeCols.astype(float))
+        minFinite, minInf, *_ = _activity(work, lb, ub, lower=True)
+        maxFinite, maxInf, *_ = _activity(work, lb, ub, lower=False)
+        tol = 1e-9 * np.maximum(1.0, np.abs(rhs))
+        redundant = activeRows & (((sense == 'L') & (maxInf == 0) & (maxFinite <= rhs + tol))
+                                  | ((sense == 'G') & (minInf == 0) & (minFinite >= rhs - tol)))
+        for i in np.flatnonzero(redundant):
+            dropRow(i, 'redundant')
+
+        if len(fixReasons) + len(rowReasons) == before:
+            break
+
+    fixedCols = np.flatnonzero(~activeCols)
+    constant = model.objConstant + model.objective[fixedCols] @ fixedValues[fixedCols]
+    keptCols, keptRows = np.flatnonzero(activeCols), np.flatnonzero(activeRows)
+    matrix = matrix[keptRows][:, keptCols]
+    sense, rhs = sense[keptRows], rhs[keptRows]
+    lb, ub, types, integer = lb[keptCols], ub[keptCols], types[keptCols], integer[keptCols]
+
+    ## Aktivität, then the big-M coefficients against the tightened bounds
+    tightened, coefficients = {}, []
+    if tighten and len(keptRows):
+        lb, ub, local = _tightenBounds(matrix, sense, rhs, lb, ub, integer)
+        tightened = {int(keptCols[j]): bounds for j, bounds in local.items()}
+        matrix, local = _tightenCoefficients(matrix, sense, rhs, lb, ub, types)
+        coefficients = [(int(keptRows[i]), int(keptCols[j]), value) for i, j, value in local]
+
+    reducedModel = LinearModel(
+        [model.colNames[j] for j in keptCols], model.objective[keptCols], lb, ub, matrix,
+        sense, rhs, [model.rowNames[i] for i in keptRows],
+        objConstant=constant, sense=model.sense, colTypes=None if model.colTypes is None else types,
+    )
+    return reducedModel, PresolveResult(model, reducedModel, keptCols, keptRows, fixedValues, fixReasons,
+                                        rowReasons, tightened, coefficients, time.perf_counter() - start)
+
+
+def presolveProblem(problem, **kwargs):
+    """presolveModel on a loaded xp.problem, applied in place (columns stay, fixed ones get lb = ub)."""
+    from dss.resultcache import problemModel
+
+    model = problemModel(problem)
+    reduced, result = presolveModel(model, **kwargs)
+
+    cols = np.arange(model.numCols)
+    lb, ub = model.lb.copy(), model.ub.copy()
+    lb[result.keptCols], ub[result.keptCols] = reduced.lb, reduced.ub
+    fixed = ~np.isnan(result.fixedValues)
+    lb[fixed] = ub[fixed] = result.fixedValues[fixed]
+    changed = cols[(lb != model.lb) | (ub != model.ub)].tolist()
+    if changed:
+        problem.chgbounds(changed + changed, ['L'] * len(changed) + ['U'] * len(changed),
+                          lb[changed].tolist() + ub[changed].tolist())
+    if result.coefficients:
+        rows, cols, values = zip(*result.coefficients)
+        problem.chgmcoef(list(rows), list(cols), list(values))
+    if result.rowReasons:
+        constraints = problem.getConstraint()
+        problem.delConstraint([constraints[i] for i in sorted(result.rowReasons)])
+    return result
+
+
+if __name__ == '__main__':
+
+    from dss.backends import getBackend
+    from dss.bench import parseSize
+    from dss.builder import buildLinearModel
+    from dss.ingest import readPlanningData
+    from dss.launch import buildLaunchModel, launchCostArray, randomLaunchCosts, readLaunchCosts
+    from dss.synthetic import generatePlanningData
+
+    parser = argparse.ArgumentParser(description="Presolve the production model and compare the solve")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--size', default=None, help="generated instance <products>x<materials> instead of the workbook")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--launch-share', type=float, default=None,
+                        help="presolve the launch MIP (dss.launch) with this share of candidates, "
+                             "the workbook uses its launch costs")
+    parser.add_argument('--big-m', type=float, default=None, help="one M for every launch candidate")
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    if args.size is None:
+        data = readPlanningData(args.workbook)
+        fixedCosts = launchCostArray(data, readLaunchCosts(args.workbook))
+    else:
+        products, materials = parseSize(args.size)
+        data = generatePlanningData(products, materials, seed=args.seed)
+        fixedCosts = randomLaunchCosts(data, args.launch_share or 0.0, args.seed)
+
+    if args.launch_share is None and args.size is not None:
+        model = buildLinearModel(data)
+    else:
+        model = buildLaunchModel(data, fixedCosts, bigM=args.big_m, integer=True)
+
+    reduced, result = presolveModel(model)
+    print(result.summary())
+    for name, (value, reason) in list(result.removedCols().items())[:20]:
+        print(f"  {name:<40} = {value:<12g} {reason}")
+
+    for label, candidate in (('original', model), ('presolved', reduced)):
+        solver = getBackend(args.backend, "DiamondStreetStyles Presolve").load(candidate)
+        optimal = solver.solve()
+        nodes = solver.problem.attributes.nodes if getattr(solver, 'problem', None) is not None else ''
+        print(f"{label:<10} {solver.objectiveValue():>22.6f}  optimal {optimal}  {solver.solveTime:.3f}s  {nodes}")
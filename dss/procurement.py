@@ -0,0 +1,275 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Materialeinkauf als Entscheidung
+
+In DiamondStreetCycles.py all of Materialbeschränkungen is bought and the
+leftovers are returned (Rücksendekosten, Rückerstattung). Here the purchase
+quantity y_m per material is a decision variable, capped by the current
+limit. Leftovers y - A'x are still returned, so per unit bought the net
+cost is the Rücksendekosten, and the production coefficients are the same
+as in the base LP:
+
+    max  -Rücksendekosten * sum(y) + c'x - Fixkosten      s.t.  A'x <= y <= limit
+
+With demand scenarios the purchase is the first stage and production and
+sales (regular up to demand, rest to the outlet) are decided per scenario.
+That model can be solved as one extensive form or by Benders decomposition
+(L-shaped method), which only ever holds the small master problem over y
+plus one scenario subproblem that is re-solved with changed demand bounds
+and purchase RHS.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from dss.backends import getBackend, solveModel
+from dss.builder import INFINITY, OFFCUT_RULES, OUTLET_DISCOUNT, LinearModel, buildLinearModel, objectiveCoefficients
+from dss.ingest import readPlanningData
+from dss.stochastic import forecastProducts, sampleDemand
+
+
+def minimalPlan(data, offcutRules=OFFCUT_RULES):
+    """Smallest production that satisfies Mindestproduktionsmenge and the offcut rules."""
+    plan = np.nan_to_num(data.minp, nan=0.0)
+    prodIndex = data.bom.productIndex
+    rules = [(prodIndex[a], prodIndex[b]) for a, b in offcutRules if a in prodIndex and b in prodIndex]
+
+    # larger >= smaller, propagate until nothing changes
+    for _ in range(len(rules) + 1):
+        changed = False
+        for larger, smaller in rules:
+            if plan[larger] < plan[smaller]:
+                plan[larger] = plan[smaller]
+                changed = True
+        if not changed:
+            break
+    return plan
+
+
+def minimalPurchase(data, offcutRules=OFFCUT_RULES):
+    """Material needed for the minimal plan, every scenario needs at least this."""
+    return data.bom.consumption(minimalPlan(data, offcutRules))
+
+
+def buildProcurementModel(data, boundsAsRows=False):
+    """Deterministic model: production x and purchases y in one LP (columns x, then y)."""
+    base = buildLinearModel(data, boundsAsRows=boundsAsRows)
+    m = data.numMaterials
+
+    ## material rows become A'x - y <= 0
+    purchase = sparse.vstack([-sparse.identity(m), sparse.csr_matrix((base.numRows - m, m))])
+    rhs = base.rhs.copy()
+    rhs[:m] = 0.0
+
+    return LinearModel(
+        base.colNames + [f'Einkauf_{name}' for name in data.materialNames],
+        np.concatenate([base.objective, np.full(m, -data.returnCost)]),
+        np.concatenate([base.lb, np.zeros(m)]),
+        np.concatenate([base.ub, data.limits]),
+        sparse.hstack([base.matrix, purchase], format='csr'),
+        base.rowSense, rhs, base.rowNames,
+        objConstant=-data.fixedCosts,
+    )
+
+
+class RecourseBlock:
+    """Production / sales decision of one demand scenario as matrix block.
+
+    Columns x (all products), then r (regular sales of the forecast
+    products). Rows: materials A'x <= y, offcut rules, r - x <= 0.
+    """
+
+    def __init__(self, data, outletDiscount=OUTLET_DISCOUNT, offcutRules=OFFCUT_RULES):
+        base = buildLinearModel(data, offcutRules=offcutRules, boundsAsRows=False)
+        products = forecastProducts(data)
+        p, k = data.numProducts, len(products)
+        # no discount on a negative Deckungsbeitrag, as in the outlet LP of the script
+        margin = np.maximum(data.margin[products], 0.0)
+
+        coef, _ = objectiveCoefficients(data)
+        self.objective = np.concatenate([coef, outletDiscount * margin])
+        self.objective[products] -= outletDiscount * margin
+
+        # no forecast cap on production, overstock goes to the outlet
+        self.lb = np.concatenate([base.lb, np.zeros(k)])
+        self.ubFixed = np.concatenate([np.full(p, INFINITY), np.zeros(k)])
+
+        linking = sparse.csr_matrix(
+            (np.concatenate([np.full(k, -1.0), np.ones(k)]),
+             (np.concatenate([np.arange(k), np.arange(k)]), np.concatenate([products, p + np.arange(k)]))),
+            shape=(k, p + k))
+        self.matrix = sparse.vstack([sparse.hstack([base.matrix, sparse.csr_matrix((base.numRows, k))]), linking], format='csr')
+        self.rowSense = np.concatenate([base.rowSense, np.full(k, 'L')])
+        self.rhs = np.concatenate([base.rhs, np.zeros(k)])
+
+        self.colNames = base.colNames + [f'r_{data.productNames[i]}' for i in products]
+        self.rowNames = base.rowNames + [f'Absatz_{data.productNames[i]}' for i in products]
+        self.numMaterials = data.numMaterials
+        self.numProducts = p
+        self.demandCols = p + np.arange(k)
+
+    def ub(self, demand):
+        ub = self.ubFixed.copy()
+        ub[self.demandCols] = demand
+        return ub
+
+
+def buildExtensiveModel(data, demand, outletDiscount=OUTLET_DISCOUNT):
+    """Extensive form: columns y, then (x_s, r_s) for every scenario s."""
+    block = RecourseBlock(data, outletDiscount)
+    n = len(demand)
+    m = data.numMaterials
+    blockRows, blockCols = block.matrix.shape
+
+    # -y on the material rows of every scenario block
+    purchase = sparse.vstack([-sparse.identity(m), sparse.csr_matrix((blockRows - m, m))])
+    matrix = sparse.hstack([
+        sparse.kron(np.ones((n, 1)), purchase),
+        sparse.kron(sparse.identity(n), block.matrix),
+    ], format='csr')
+
+    rhs = block.rhs.copy()
+    rhs[:m] = 0.0
+
+    return LinearModel(
+        [f'Einkauf_{name}' for name in data.materialNames] + [f'{name}_{s}' for s in range(n) for name in block.colNames],
+        np.concatenate([np.full(m, -data.returnCost), np.tile(block.objective / n, n)]),
+        np.concatenate([np.zeros(m), np.tile(block.lb, n)]),
+        np.concatenate([data.limits] + [block.ub(d) for d in demand]),
+        matrix,
+        np.tile(block.rowSense, n), np.tile(rhs, n),
+        [f'{name}_{s}' for s in range(n) for name in block.rowNames],
+        objConstant=-data.fixedCosts,
+    )
+
+
+class BendersResult:
+
+    def __init__(self, purchase, objective, upperBound, iterations, history, solveTime):
+        self.purchase = purchase
+        self.objective = objective
+        self.upperBound = upperBound
+        self.iterations = iterations
+        self.history = history
+        self.solveTime = solveTime
+
+
+def solveBenders(data, demand, outletDiscount=OUTLET_DISCOUNT, tol=1e-6, maxIterations=200, multicut=False, backend='auto'):
+    """L-shaped method over the purchases y for the (N, K) demand scenarios.
+
+    Recourse Q_s(y) is concave and nondecreasing in y, every subproblem
+    solve gives the cut Q_s(y) <= Q_s(ŷ) + π_s'(y - ŷ) with π_s the duals
+    of the material rows. With multicut=True there is one θ per scenario,
+    otherwise the cuts are averaged into one θ.
+    """
+    start = time.perf_counter()
+    n = len(demand)
+    m = data.numMaterials
+    block = RecourseBlock(data, outletDiscount)
+    materialRows = list(range(m))
+
+    ## subproblem - built once, demand bounds and purchase RHS change per scenario
+    sub = getBackend(backend, "DiamondStreetStyles Recourse").load(LinearModel(
+        block.colNames, block.objective, block.lb, block.ub(demand[0]),
+        block.matrix, block.rowSense, block.rhs, block.rowNames))
+    demandCols = block.demandCols
+
+    def recourse(y):
+        values = np.empty(n)
+        duals = np.empty((n, m))
+        sub.changeRhs(materialRows, y)
+        for s in range(n):
+            sub.changeBounds(demandCols, upper=demand[s])
+            if not sub.solve():
+                raise RuntimeError(f"Recourse problem of scenario {s} not optimal with {sub.name}")
+            values[s] = sub.objectiveValue()
+            duals[s] = sub.duals(materialRows)
+        return values, duals
+
+    ## master - y plus one θ (or one per scenario), cuts are added as rows
+    thetas = n if multicut else 1
+    yLow = np.minimum(minimalPurchase(data), data.limits)
+
+    # Q_s is nondecreasing, so Q_s(limit) bounds θ from above
+    y = data.limits.copy()
+    values, duals = recourse(y)
+    thetaUb = values if multicut else np.array([values.mean()])
+
+    master = getBackend(backend, "DiamondStreetStyles Einkauf").load(LinearModel(
+        [f'Einkauf_{name}' for name in data.materialNames] + [f'theta_{t}' for t in range(thetas)],
+        np.concatenate([np.full(m, -data.returnCost), np.full(thetas, 1.0 / n if multicut else 1.0)]),
+        np.concatenate([yLow, np.full(thetas, -INFINITY)]),
+        np.concatenate([data.limits, thetaUb]),
+        sparse.csr_matrix((0, m + thetas)), [], [], [],
+        objConstant=-data.fixedCosts,
+    ))
+
+    best = (-np.inf, y)
+    history = []
+    upper = np.inf
+    for iteration in range(1, maxIterations + 1):
+        ## lower bound from the current purchase
+        lower = -data.returnCost * y.sum() + values.mean() - data.fixedCosts
+        if lower > best[0]:
+            best = (lower, y.copy())
+
+        ## cuts: θ - π'y <= Q(ŷ) - π'ŷ
+        if multicut:
+            coefs = np.hstack([-duals, np.eye(n)])
+            rhs = values - duals @ y
+        else:
+            coefs = np.hstack([-duals.mean(axis=0), [1.0]])[None, :]
+            rhs = np.array([values.mean() - duals.mean(axis=0) @ y])
+        cuts = sparse.csr_matrix(coefs)
+        cuts.eliminate_zeros()
+        master.addRows(['L'] * cuts.shape[0], rhs, cuts)
+
+        if not master.solve():
+            raise RuntimeError(f"Benders master problem not optimal with {master.name}")
+        upper = master.objectiveValue()
+        history.append((iteration, best[0], upper))
+
+        if upper - best[0] <= tol * max(1.0, abs(best[0])):
+            break
+
+        y = master.solution(range(m))
+        values, duals = recourse(y)
+
+    return BendersResult(best[1], best[0], upper, iteration, history, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Material purchase as decision variables")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--scenarios', type=int, default=0, help="demand scenarios, 0 = deterministic model")
+    parser.add_argument('--cv', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--method', choices=['benders', 'extensive'], default='benders')
+    parser.add_argument('--multicut', action='store_true')
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    data = readPlanningData(args.workbook)
+
+    if args.scenarios == 0:
+        solver = solveModel(buildProcurementModel(data), args.backend)
+        purchase = solver.solution()[data.numProducts:]
+        objective = solver.objectiveValue()
+    else:
+        demand = sampleDemand(data, args.scenarios, args.cv, args.seed)
+        if args.method == 'extensive':
+            solver = solveModel(buildExtensiveModel(data, demand), args.backend)
+            purchase = solver.solution(range(data.numMaterials))
+            objective = solver.objectiveValue()
+        else:
+            result = solveBenders(data, demand, multicut=args.multicut, backend=args.backend)
+            purchase, objective = result.purchase, result.objective
+            print(f"Benders: {result.iterations} iterations, gap {result.upperBound - result.objective}, {result.solveTime:.3f}s")
+
+    for name, quantity, limit in zip(data.materialNames, purchase, data.limits):
+        print(f"{name}: {quantity} of {limit}")
+    print("Objective Function Value:", objective)
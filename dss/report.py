@@ -0,0 +1,164 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Report-Ausgabe (Output.xlsx, CSV, Parquet)
+
+The report is written from result arrays instead of cell by cell. Every
+sheet gets two kinds of content:
+
+    sheet.cells(row, values)              one row of labels / single values
+    sheet.table(row, columns, names)      aligned columns, one row per item
+                                          (names are written at headerRow)
+
+XlsxReport streams the workbook with xlsxwriter in constant_memory mode:
+each row is handed over once with write_row and flushed when the next row
+starts, so memory stays flat for 10^5 products. constant_memory needs the
+rows of a sheet in increasing order (write_column would go back to rows
+that are already flushed), so tables are transposed into rows on the fly
+and rows that go backwards raise instead of silently getting lost.
+
+TableReport is the sink for large catalogs: every table becomes its own
+CSV or Parquet file, the single cells of a sheet go into one summary file
+per sheet. openReport picks the sink from the file extension.
+"""
+
+import csv
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def _values(column):
+    """Plain Python values, xlsxwriter does not know the NumPy scalar types."""
+    return column.tolist() if isinstance(column, np.ndarray) else list(column)
+
+
+class XlsxSheet:
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.lastRow = -1
+
+    def _checkRow(self, row):
+        if row <= self.lastRow:
+            raise ValueError(f"Row {row} of sheet '{self.worksheet.name}' written after row {self.lastRow}, "
+                             f"rows must be written in increasing order")
+
+    def cells(self, row, values, col=0):
+        self._checkRow(row)
+        self.worksheet.write_row(row, col, _values(values))
+        self.lastRow = row
+
+    def table(self, row, columns, names=None, col=0, headerRow=None):
+        """Write `columns` side by side starting at `row`, returns the row after the table."""
+        if headerRow is not None:
+            self.cells(headerRow, names, col)
+        columns = [_values(c) for c in columns]
+        if not columns or not columns[0]:
+            return row
+        self._checkRow(row)
+        for offset, values in enumerate(zip(*columns)):
+            self.worksheet.write_row(row + offset, col, values)
+        self.lastRow = row + len(columns[0]) - 1
+        return self.lastRow + 1
+
+
+class XlsxReport:
+
+    def __init__(self, path, constantMemory=True):
+        self.path = path
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': constantMemory})
+        self.sheets = {}
+
+    def sheet(self, name):
+        if name not in self.sheets:
+            self.sheets[name] = XlsxSheet(self.workbook.add_worksheet(name=name))
+        return self.sheets[name]
+
+    def close(self):
+        self.workbook.close()
+
+
+class TableSheet:
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+        self.summary = []
+        self.count = 0
+
+    def cells(self, row, values, col=0):
+        values = _values(values)
+        label = values[0] if values and isinstance(values[0], str) else ''
+        for value in values[1:] if label else values:
+            self.summary.append((row, label.strip(' :'), value))
+
+    def table(self, row, columns, names=None, col=0, headerRow=None):
+        """Write `columns` as one file, `names` become the header."""
+        columns = [np.asarray(c) for c in columns]
+        if not columns or len(columns[0]) == 0:
+            return row
+        self.count += 1
+        names = list(names) if names else [f'column{i + 1}' for i in range(len(columns))]
+        self.report._write(f'{self.name}-{self.count}', pd.DataFrame(dict(zip(names, columns))))
+        return row + len(columns[0])
+
+
+class TableReport:
+    """One CSV / Parquet file per table in `directory`."""
+
+    def __init__(self, directory, format='csv'):
+        if format not in ('csv', 'parquet'):
+            raise ValueError(f"Unknown table format '{format}', expected 'csv' or 'parquet'")
+        self.path = directory
+        self.format = format
+        self.sheets = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, stem):
+        return os.path.join(self.path, re.sub(r'[^\w.-]+', '_', stem) + '.' + self.format)
+
+    def _write(self, stem, frame):
+        if self.format == 'csv':
+            frame.to_csv(self._file(stem), index=False)
+        else:
+            # needs pyarrow or fastparquet
+            frame.to_parquet(self._file(stem), index=False)
+
+    def sheet(self, name):
+        if name not in self.sheets:
+            self.sheets[name] = TableSheet(self, name)
+        return self.sheets[name]
+
+    def close(self):
+        for name, sheet in self.sheets.items():
+            if not sheet.summary:
+                continue
+            rows = sorted(sheet.summary, key=lambda r: r[0])
+            if self.format == 'csv':
+                with open(self._file(f'{name}-summary'), 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['label', 'value'])
+                    writer.writerows((label, value) for _, label, value in rows)
+            else:
+                self._write(f'{name}-summary', pd.DataFrame({
+                    'label': [label for _, label, _ in rows],
+                    'value': [str(value) for _, _, value in rows],
+                }))
+
+
+def openReport(path, format=None):
+    """XlsxReport for .xlsx, TableReport (a directory) for csv / parquet."""
+    if format is None:
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        format = extension if extension in FORMATS else 'csv'
+    if format not in FORMATS:
+        raise ValueError(f"Unknown report format '{format}', expected one of {FORMATS}")
+    if format == 'xlsx':
+        return XlsxReport(path)
+    return TableReport(os.path.splitext(path)[0] if path.endswith('.' + format) else path, format)
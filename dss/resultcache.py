@@ -0,0 +1,233 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Ergebnis-Cache nach Modell-Fingerabdruck
+
+Identical inputs give identical models, so the solve results of a model can
+be kept on disk and handed back without touching the solver. The key is a
+SHA-256 over the canonical form of the built model:
+
+    column names, objective, bounds, column types     (prices, costs, forecasts)
+    row names, senses, RHS                            (material limits, rules)
+    coefficient matrix in sorted CSR form             (bill of materials)
+    objective constant and sense                      (fixed costs, returns)
+
+plus the solver version, the result-relevant solver controls and any
+scenario flags of the caller (e.g. ranging on / off). problemModel reads
+the LinearModel back from a loaded xp.problem, so models built with
+xp.var objects and with dss.builder are hashed the same way.
+
+Every entry is one SolveResult NPZ file (plan, objective, duals, slacks,
+reduced costs, basis, ranging). A hit refreshes the file's mtime, and when
+the directory grows beyond `maxBytes` the least recently used entries are
+deleted. Writes go through a temp file and os.replace, so several
+processes can share one cache directory.
+
+The planning scripts use it through ScenarioChain.solveResult. It is on by
+default next to the workbook cache in .dss_cache:
+
+    DSS_RESULT_CACHE=0              switch it off
+    DSS_RESULT_CACHE=path           other directory
+    DSS_RESULT_CACHE_MB=256         size cap
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from dss.builder import LinearModel
+from dss.results import SolveResult
+
+try:
+    import xpress as xp
+except ImportError:
+    xp = None
+
+
+RESULT_DIR = os.path.join('.dss_cache', 'results')
+MAX_BYTES = 256 << 20
+
+# controls that can change the reported solution, outputlog & co. do not
+CONTROLS = ('defaultalg', 'feastol', 'optimalitytol', 'presolve', 'scaling', 'crossover',
+            'miprelstop', 'mipabsstop', 'miptol')
+
+# bump when the key or the entry layout changes
+CACHE_VERSION = 1
+
+
+def problemModel(problem):
+    """The loaded LP / MIP of an xp.problem as a LinearModel."""
+    cols, rows = problem.attributes.cols, problem.attributes.rows
+    constraints = problem.getConstraint()
+    rowIndex = {c: i for i, c in enumerate(constraints)}
+
+    objective, lb, ub, coltype = [], [], [], []
+    rhs, rowtype = [], []
+    start, rowind, rowcoef = [], [], []
+    if cols:
+        problem.getobj(objective, 0, cols - 1)
+        problem.getlb(lb, 0, cols - 1)
+        problem.getub(ub, 0, cols - 1)
+        problem.getcoltype(coltype, 0, cols - 1)
+        problem.getcols(start, rowind, rowcoef, problem.attributes.elems, 0, cols - 1)
+    if rows:
+        problem.getrhs(rhs, 0, rows - 1)
+        problem.getrowtype(rowtype, 0, rows - 1)
+
+    matrix = sparse.csc_matrix(
+        (np.asarray(rowcoef, dtype=float), np.array([rowIndex[r] for r in rowind], dtype=int),
+         np.asarray(start if start else [0], dtype=int)),
+        shape=(rows, cols))
+    return LinearModel(
+        [v.name for v in problem.getVariable()], objective, lb, ub, matrix,
+        rowtype, rhs, [c.name for c in constraints],
+        # objrhs is the fixed part of the objective
+        objConstant=problem.attributes.objrhs, sense=int(problem.attributes.objsense),
+        colTypes=None if all(t == 'C' for t in coltype) else coltype,
+    )
+
+
+def problemControls(problem):
+    return {name: problem.getControl(name) for name in CONTROLS}
+
+
+def modelFingerprint(model, controls=None, **flags):
+    """Canonical SHA-256 of a LinearModel plus solver controls and scenario flags."""
+    sha = hashlib.sha256()
+
+    def add(label, array):
+        array = np.ascontiguousarray(array)
+        if array.dtype.kind == 'f':
+            # -0.0 and 0.0 are the same coefficient
+            array = array + 0.0
+        sha.update(f'{label}:{array.dtype.str}:{array.shape};'.encode('utf-8'))
+        sha.update(array.tobytes())
+
+    def addNames(label, names):
+        sha.update(f'{label}:'.encode('utf-8'))
+        sha.update('\0'.join(map(str, names)).encode('utf-8'))
+
+    matrix = model.matrix.tocsr()
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+
+    sha.update(f'dss-result-{CACHE_VERSION};'.encode('utf-8'))
+    addNames('cols', model.colNames)
+    addNames('rows', model.rowNames)
+    add('objective', model.objective.astype(float))
+    add('lb', model.lb.astype(float))
+    add('ub', model.ub.astype(float))
+    add('colTypes', np.full(model.numCols, 'C') if model.colTypes is None else model.colTypes)
+    add('rowSense', model.rowSense)
+    add('rhs', model.rhs.astype(float))
+    add('indptr', matrix.indptr.astype(np.int64))
+    add('indices', matrix.indices.astype(np.int64))
+    add('data', matrix.data.astype(float))
+    add('constant', np.array([model.objConstant], dtype=float))
+    add('sense', np.array([model.sense], dtype=np.int64))
+
+    settings = {
+        'solver': xp.getversion() if xp is not None else None,
+        'controls': controls or {},
+        'flags': flags,
+    }
+    sha.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def problemFingerprint(problem, **flags):
+    """Fingerprint of an xp.problem, its controls included."""
+    return modelFingerprint(problemModel(problem), problemControls(problem), **flags)
+
+
+class ResultCache:
+
+    def __init__(self, directory=RESULT_DIR, maxBytes=MAX_BYTES, enabled=True):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def fromEnv(cls):
+        """Cache configured by DSS_RESULT_CACHE (directory, or 0 to switch it off) and DSS_RESULT_CACHE_MB."""
+        setting = os.environ.get('DSS_RESULT_CACHE', RESULT_DIR)
+        maxBytes = int(float(os.environ.get('DSS_RESULT_CACHE_MB', MAX_BYTES >> 20)) * (1 << 20))
+        if setting.lower() in ('0', 'off', 'false', ''):
+            return cls(enabled=False)
+        return cls(setting, maxBytes)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """Cached SolveResult for `key`, None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            result = SolveResult.load(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        # most recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, f'{key}.{os.getpid()}.tmp.npz')
+        result.save(tmp)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits into maxBytes."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.npz') and '.tmp' not in entry.name:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process in the meantime
+                pass
+            total -= size
+
+    def solve(self, problem, solve, ranging=False, **flags):
+        """SolveResult of the xp.problem from the cache or from `solve()`.
+
+        `solve()` optimizes the problem (e.g. a ScenarioChain step); returns
+        (result, key, hit).
+        """
+        if not self.enabled:
+            solve()
+            return SolveResult.fromProblem(problem, ranging=ranging), None, False
+        key = problemFingerprint(problem, ranging=ranging, **flags)
+        result = self.get(key)
+        if result is not None:
+            return result, key, True
+        solve()
+        result = SolveResult.fromProblem(problem, ranging=ranging)
+        if result.optimal:
+            self.put(key, result)
+        return result, key, False
@@ -0,0 +1,130 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Lösung als Arrays
+
+SolveResult holds everything the reporting needs from one solve, fetched
+with one solver call per quantity instead of one call per name:
+
+    primal, reducedCost, colBasis     per column
+    dual, slack, rowBasis             per row
+    lowerObj, upperObj                objective ranging per column (objsa)
+    lowerRhs, upperRhs                RHS ranging per row (rhssa)
+
+Columns and rows keep the order of the problem; cols(names) / rows(names)
+translate product, material or constraint names into indices. Basis
+status follows Xpress: 0 non-basic at lower bound, 1 basic, 2 non-basic at
+upper bound, 3 super-basic.
+
+save() / load() keep a result in one NPZ file (no pickles), used by the
+result cache in dss.resultcache.
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import xpress as xp
+except ImportError:
+    xp = None
+
+
+class SolveResult:
+
+    def __init__(self, colNames, rowNames, primal, dual, slack, reducedCost, objective, optimal=True,
+                 colBasis=None, rowBasis=None, objRanges=None, rhsRanges=None):
+        self.colNames = list(colNames)
+        self.rowNames = list(rowNames)
+        self.colIndex = {name: i for i, name in enumerate(self.colNames)}
+        self.rowIndex = {name: i for i, name in enumerate(self.rowNames)}
+
+        self.primal = np.asarray(primal, dtype=float)
+        self.reducedCost = np.asarray(reducedCost, dtype=float)
+        self.dual = np.asarray(dual, dtype=float)
+        self.slack = np.asarray(slack, dtype=float)
+        self.objective = objective
+        self.optimal = optimal
+
+        self.colBasis = None if colBasis is None else np.asarray(colBasis, dtype=int)
+        self.rowBasis = None if rowBasis is None else np.asarray(rowBasis, dtype=int)
+        self.lowerObj, self.upperObj = (None, None) if objRanges is None else map(np.asarray, objRanges)
+        self.lowerRhs, self.upperRhs = (None, None) if rhsRanges is None else map(np.asarray, rhsRanges)
+
+    @classmethod
+    def fromProblem(cls, problem, ranging=False):
+        """Read the current solution of an Xpress problem, optionally with objsa / rhssa."""
+        cols = problem.getVariable()
+        rows = problem.getConstraint()
+        colIdx, rowIdx = list(range(len(cols))), list(range(len(rows)))
+
+        # solution first, the ranging below can refresh it with postsolved values
+        primal, dual, slack, reducedCost = problem.getSolution(), problem.getDual(), problem.getSlack(), problem.getRCost()
+        objective, optimal = problem.getObjVal(), problem.attributes.lpstatus == xp.lp_optimal
+
+        rowstat, colstat = [0] * len(rows), [0] * len(cols)
+        problem.getbasis(rowstat, colstat)
+
+        objRanges = rhsRanges = None
+        if ranging:
+            lowerObj, upperObj, lowerRhs, upperRhs = [], [], [], []
+            problem.objsa(colIdx, lowerObj, upperObj)
+            if rowIdx:
+                problem.rhssa(rowIdx, lowerRhs, upperRhs)
+            objRanges, rhsRanges = (lowerObj, upperObj), (lowerRhs, upperRhs)
+
+        return cls(
+            [v.name for v in cols], [c.name for c in rows],
+            primal, dual, slack, reducedCost, objective, optimal,
+            colstat, rowstat, objRanges, rhsRanges,
+        )
+
+    @classmethod
+    def fromBackend(cls, solver, optimal=True):
+        """Read the solution of a SolverBackend (no basis and ranging for HiGHS)."""
+        model = solver.model
+        return cls(model.colNames, model.rowNames, solver.solution(), solver.duals(), solver.slacks(),
+                   solver.reducedCosts(), solver.objectiveValue(), optimal)
+
+    ## Datei
+
+    # optional arrays, missing when the result has no basis or ranging
+    _OPTIONAL = ('colBasis', 'rowBasis', 'lowerObj', 'upperObj', 'lowerRhs', 'upperRhs')
+
+    def save(self, file):
+        arrays = {name: getattr(self, name) for name in self._OPTIONAL if getattr(self, name) is not None}
+        meta = {'colNames': self.colNames, 'rowNames': self.rowNames,
+                'objective': self.objective, 'optimal': bool(self.optimal)}
+        np.savez(file, primal=self.primal, dual=self.dual, slack=self.slack, reducedCost=self.reducedCost,
+                 __meta__=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['__meta__']))
+            optional = {name: npz[name] if name in npz.files else None for name in cls._OPTIONAL}
+            objRanges = rhsRanges = None
+            if optional['lowerObj'] is not None:
+                objRanges = (optional['lowerObj'], optional['upperObj'])
+                rhsRanges = (optional['lowerRhs'], optional['upperRhs'])
+            return cls(meta['colNames'], meta['rowNames'], npz['primal'], npz['dual'], npz['slack'],
+                       npz['reducedCost'], meta['objective'], meta['optimal'],
+                       optional['colBasis'], optional['rowBasis'], objRanges, rhsRanges)
+
+    ## Zugriff per Name
+
+    def cols(self, names):
+        return np.array([self.colIndex[name] for name in names], dtype=int)
+
+    def rows(self, names):
+        return np.array([self.rowIndex[name] for name in names], dtype=int)
+
+    def values(self, names):
+        """Primal values of the named columns, e.g. the plan in product order."""
+        return self.primal[self.cols(names)]
+
+    def activeRows(self, tol=0.0):
+        """Rows with |slack| <= tol."""
+        return np.flatnonzero(np.abs(self.slack) <= tol)
+
+    def basicCols(self):
+        return np.flatnonzero(self.colBasis == 1)
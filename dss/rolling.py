@@ -0,0 +1,259 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Rollierende Planung
+
+Solves the multi-period model of dss.multiperiod window by window instead
+of in one piece. A window covers K periods; after each solve the first F
+periods (the step) are fixed, their closing stocks become the opening
+stocks of the next window, and the window moves on by F periods:
+
+    periods   1 ........ K
+                   F+1 ........ F+K
+                        2F+1 ........ 2F+K    ...
+
+Every window is the same LP, built by buildMultiPeriodModel on K periods:
+the last windows are padded with empty periods (no demand, no arrivals,
+no holding costs), so the matrix never changes. The model is loaded once
+and only objective, bounds and right-hand side are changed per window,
+so Xpress starts each window from the optimal basis of the previous one
+(HiGHS through scipy always starts cold). warmStart=False reloads the
+model for every window instead.
+
+Fabric left at the end of a window is valued at what it would bring back
+(cost - Rücksendekosten) plus its shadow price in the single-period LP
+over the whole season (fabricValues), at the end of the season at the
+return value only. Mindestproduktionsmenge follows the fabric deliveries:
+by the end of a window the plan must have produced the share of minp that
+the fabric arrived so far is of all fabric of the season (the whole
+minimum in the first window if everything arrives at once).
+
+Memory and the time per window depend on K and the catalog, not on the
+length of the horizon.
+
+compareMonolithic solves the full model as well and reports the
+optimality loss of the rolling plan; python -m dss.rolling runs it on the
+workbook or on a generated instance.
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from dss.backends import getBackend, solveModel
+from dss.builder import OFFCUT_RULES, buildLinearModel
+from dss.multiperiod import MultiPeriodData, MultiPeriodPlan, buildMultiPeriodModel, solveMultiPeriod
+
+
+def planValue(mp, production, sales, stock, fabric):
+    """Objective of the full multi-period model for a (T, P) / (T, M) plan."""
+    base = mp.base
+    return float(
+        (sales @ base.vk).sum() - (production @ base.mk).sum()
+        - (stock @ mp.productHolding).sum() - (fabric @ mp.materialHolding).sum()
+        + fabric[-1] @ (base.costs - base.returnCost)
+        - base.fixedCosts - base.costs @ mp.arrivals.sum(axis=0)
+    )
+
+
+def fabricValues(mp, backend='auto', offcutRules=OFFCUT_RULES):
+    """Value of a unit of fabric left at the end of a window.
+
+    The return value (cost - Rücksendekosten) plus the shadow price of the
+    material in the single-period LP over the whole season (all arrivals,
+    all demand), so that a window does not use up fabric the later periods
+    need more.
+    """
+    season = copy.copy(mp.base)
+    season.limits = mp.materialStock + mp.arrivals.sum(axis=0)
+    # no cap over the season if a single period has none
+    season.maxp = np.where(np.isnan(mp.demand).any(axis=0), np.nan, np.nansum(mp.demand, axis=0))
+    solver = solveModel(buildLinearModel(season, offcutRules), backend, "DiamondStreetStyles Stoffwert")
+    return season.costs - season.returnCost + np.maximum(solver.duals(np.arange(season.numMaterials)), 0.0)
+
+
+class RollingHorizon:
+
+    def __init__(self, mp, window=8, step=1, backend='auto', offcutRules=OFFCUT_RULES, warmStart=True):
+        if not 1 <= step <= window:
+            raise ValueError(f"Step {step} must be between 1 and the window length {window}")
+        self.mp = mp
+        self.window = min(window, mp.numPeriods)
+        self.step = min(step, self.window)
+        self.backend = backend
+        self.offcutRules = offcutRules
+        self.warmStart = warmStart
+        self.solver = None
+        self.fabricValue = fabricValues(mp, backend, offcutRules)
+        # one record per window: start, solve time, iterations
+        self.windows = []
+
+    def _windowModel(self, start, productStock, materialStock, produced):
+        mp, K = self.mp, self.window
+        T, P, M = mp.numPeriods, mp.base.numProducts, mp.base.numMaterials
+        end = min(start + K, T)
+        pad = K - (end - start)
+
+        sub = MultiPeriodData(
+            mp.base,
+            list(mp.periods[start:end]) + [f'+{i + 1}' for i in range(pad)],
+            np.vstack([mp.demand[start:end], np.zeros((pad, P))]),
+            np.vstack([mp.arrivals[start:end], np.zeros((pad, M))]),
+            productStock, materialStock, mp.productHolding, mp.materialHolding,
+        )
+        model = buildMultiPeriodModel(sub, self.offcutRules)
+
+        real = end - start
+        fabric = model.objective[3 * K * P:].reshape(K, M)
+        if pad:
+            ## leere Perioden: nothing is held, leftover fabric is returned at the end
+            model.objective[2 * K * P + real * P:3 * K * P] = 0.0
+            fabric[real:] = 0.0
+            fabric[-1] = mp.base.costs - mp.base.returnCost
+        else:
+            fabric[-1] = -mp.materialHolding + (mp.base.costs - mp.base.returnCost if end == T else self.fabricValue)
+
+        ## Mindestproduktionsmenge in step with the fabric that has arrived
+        minIdx = np.flatnonzero(mp.base.minp > 0)
+        if len(minIdx):
+            arrived = mp.arrivals.sum(axis=1).cumsum()
+            share = arrived[end - 1] / arrived[-1] if arrived[-1] > 0 else end / T
+            required = mp.base.minp[minIdx] * share - produced[minIdx]
+            model.rhs[-len(minIdx):] = np.maximum(required, 0.0)
+        return model
+
+    def _load(self, model):
+        if self.solver is None or not self.warmStart:
+            self.solver = getBackend(self.backend, "DiamondStreetStyles Rollierend").load(model)
+            return
+        # same matrix, only the data of the window changes and the basis stays
+        cols = np.arange(model.numCols)
+        self.solver.changeObjective(cols, model.objective, model.objConstant)
+        self.solver.changeBounds(cols, upper=model.ub)
+        self.solver.changeRhs(np.arange(model.numRows), model.rhs)
+
+    def solve(self):
+        """Roll over the whole horizon, returns the assembled MultiPeriodPlan."""
+        mp, K, F = self.mp, self.window, self.step
+        T, P, M = mp.numPeriods, mp.base.numProducts, mp.base.numMaterials
+        production, sales = np.zeros((T, P)), np.zeros((T, P))
+        stock, fabric = np.zeros((T, P)), np.zeros((T, M))
+        productStock, materialStock = mp.productStock, mp.materialStock
+        produced = np.zeros(P)
+
+        self.windows = []
+        for start in range(0, T, F):
+            begin = time.perf_counter()
+            model = self._windowModel(start, productStock, materialStock, produced)
+            self._load(model)
+            buildTime = time.perf_counter() - begin
+
+            if not self.solver.solve():
+                raise RuntimeError(f"Window starting in period {mp.periods[start]} not solved to optimality "
+                                   f"with {self.solver.name}")
+            self.windows.append({
+                'start': mp.periods[start], 'build': buildTime,
+                'solve': self.solver.solveTime, 'iterations': self.solver.iterations,
+            })
+
+            ## erste F Perioden festschreiben
+            solution = self.solver.solution()
+            keep = min(F, T - start)
+            fixed = slice(start, start + keep)
+            production[fixed] = solution[:K * P].reshape(K, P)[:keep]
+            sales[fixed] = solution[K * P:2 * K * P].reshape(K, P)[:keep]
+            stock[fixed] = solution[2 * K * P:3 * K * P].reshape(K, P)[:keep]
+            fabric[fixed] = solution[3 * K * P:].reshape(K, M)[:keep]
+
+            productStock, materialStock = stock[start + keep - 1], fabric[start + keep - 1]
+            produced = produced + production[fixed].sum(axis=0)
+
+        solution = np.concatenate([production.ravel(), sales.ravel(), stock.ravel(), fabric.ravel()])
+        return MultiPeriodPlan(mp, solution, planValue(mp, production, sales, stock, fabric))
+
+
+def compareMonolithic(mp, window=8, step=1, backend='auto'):
+    """Solve rolling and in one piece, returns (rolling plan, full plan, statistics)."""
+    start = time.perf_counter()
+    rolling = RollingHorizon(mp, window, step, backend)
+    rollingPlan = rolling.solve()
+    rollingTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fullPlan, _, full = solveMultiPeriod(mp, backend)
+    fullTime = time.perf_counter() - start
+
+    loss = fullPlan.objective - rollingPlan.objective
+    windowModel = rolling.solver.model
+    stats = {
+        'periods': mp.numPeriods, 'window': rolling.window, 'step': rolling.step,
+        'rolling': rollingPlan.objective, 'monolithic': fullPlan.objective,
+        'loss': loss, 'relativeLoss': loss / abs(fullPlan.objective) if fullPlan.objective else 0.0,
+        'rollingTime': rollingTime, 'monolithicTime': fullTime,
+        'windows': len(rolling.windows),
+        'maxWindowSolve': max(w['solve'] for w in rolling.windows),
+        'rollingIterations': sum(w['iterations'] for w in rolling.windows),
+        'monolithicIterations': full.iterations,
+        'windowSize': (windowModel.numRows, windowModel.numCols),
+        'monolithicSize': (full.model.numRows, full.model.numCols),
+    }
+    return rollingPlan, fullPlan, stats
+
+
+if __name__ == '__main__':
+
+    from dss.bench import parseSize
+    from dss.ingest import readPlanningData
+    from dss.multiperiod import readMultiPeriod, seasonFrames
+    from dss.synthetic import generatePlanningData
+
+    parser = argparse.ArgumentParser(description="Rolling-horizon production plan and its optimality loss")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--size', default=None, help="generated instance <products>x<materials> instead of the workbook")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--periods', type=int, default=52,
+                        help="spread the data over this many periods if there is no Nachfrage sheet")
+    parser.add_argument('--seasonality', type=float, default=0.5, help="amplitude of the seasonal demand curve")
+    parser.add_argument('--deliveries', type=int, default=4, help="fabric deliveries over the season")
+    parser.add_argument('--holding', type=float, default=0.05, help="Lagerkosten per unit and period")
+    parser.add_argument('--window', type=int, default=8)
+    parser.add_argument('--step', type=int, default=1)
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    parser.add_argument('--compare', action='store_true', help="also solve in one piece and report the loss")
+    args = parser.parse_args()
+
+    mp = None
+    if args.size is None:
+        try:
+            mp = readMultiPeriod(args.workbook)
+        except ValueError:
+            base = readPlanningData(args.workbook)
+    else:
+        products, materials = parseSize(args.size)
+        base = generatePlanningData(products, materials, seed=args.seed)
+
+    if mp is None:
+        t = np.arange(args.periods)
+        demandProfile = 1.0 + args.seasonality * np.sin(2 * np.pi * t / args.periods)
+        arrivalProfile = (t % max(args.periods // max(args.deliveries, 1), 1) == 0).astype(float)
+        frames = seasonFrames(base, args.periods, demandProfile, arrivalProfile)
+        mp = MultiPeriodData.fromFrames(base, frames['Nachfrage'], frames['Materialeingang'])
+        mp.productHolding = np.full(base.numProducts, args.holding)
+        mp.materialHolding = np.full(base.numMaterials, args.holding)
+
+    if args.compare:
+        plan, _, stats = compareMonolithic(mp, args.window, args.step, args.backend)
+        for key, value in stats.items():
+            print(f"{key:22} {value}")
+    else:
+        start = time.perf_counter()
+        rolling = RollingHorizon(mp, args.window, args.step, args.backend)
+        plan = rolling.solve()
+        print(plan.periodFrame().to_string())
+        print()
+        print(f"Objective Function Value: {plan.objective}")
+        print(f"{len(rolling.windows)} windows of {rolling.window} periods, "
+              f"{rolling.solver.model.numCols} columns, {rolling.solver.model.numRows} rows ({rolling.solver.name})")
+        print(f"Total: {time.perf_counter() - start:.3f}s, "
+              f"slowest window: {max(w['solve'] for w in rolling.windows):.3f}s")
@@ -0,0 +1,182 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Szenariokette mit Warmstart
+
+DiamondStreetCycles.py solves several variants of the same DSS problem one
+after another (base LP, without return of recycled polyester, outlet).
+ScenarioChain captures the optimal basis after each solve and loads it
+before the next one, so small perturbations of the base plan only need a
+few simplex pivots. The basis is stored per constraint / variable object,
+so rows deleted between the solves (e.g. the Maximalprognose rows for the
+outlet) simply drop out, new rows start basic and new columns (the
+regular / outlet sales of the outlet variant) non-basic at zero.
+
+With a Telemetry object (dss.telemetry) every solve is also recorded with
+its solver attributes and log statistics. With a ResultCache
+(dss.resultcache) solveResult hands back the stored result of an
+identical model instead of solving; its basis then serves as warm start
+for the next variant.
+"""
+
+import time
+
+import xpress as xp
+
+from dss.results import SolveResult
+
+
+class SolveRecord:
+
+    def __init__(self, name, objective, iterations, solveTime, warmStart, status, cached=False):
+        self.name = name
+        self.objective = objective
+        self.iterations = iterations
+        self.solveTime = solveTime
+        self.warmStart = warmStart
+        self.status = status
+        self.cached = cached
+
+
+class ScenarioChain:
+
+    def __init__(self, problem, warmStart=True, telemetry=None, cache=None):
+        self.problem = problem
+        self.warmStart = warmStart
+        self.telemetry = telemetry
+        self.cache = cache
+        self.records = []
+        self.basis = None
+
+        if telemetry is not None:
+            telemetry.watch(problem)
+
+        if not warmStart:
+            # every solve starts from scratch, also ignore the basis Xpress keeps internally
+            problem.setControl('keepbasis', 0)
+
+    def captureBasis(self):
+        rowstat, colstat = [], []
+        self.problem.getbasis(rowstat, colstat)
+        self.basis = (dict(zip(self.problem.getConstraint(), rowstat)),
+                      dict(zip(self.problem.getVariable(), colstat)))
+
+    def loadBasis(self):
+        rows, cols = self.basis
+        # new rows are basic, new columns non-basic at their lower bound
+        rowstat = [rows.get(c, 1) for c in self.problem.getConstraint()]
+        colstat = [cols.get(v, 0) for v in self.problem.getVariable()]
+        self.problem.loadbasis(rowstat, colstat)
+
+    def solve(self, name):
+        warm = self.warmStart and self.basis is not None
+        if warm:
+            self.loadBasis()
+
+        if self.telemetry is not None:
+            self.telemetry.beforeSolve(self.problem)
+
+        start = time.perf_counter()
+        self.problem.lpoptimize()
+        solveTime = time.perf_counter() - start
+
+        status = self.problem.attributes.lpstatus
+        record = SolveRecord(
+            name,
+            self.problem.getObjVal() if status == xp.lp_optimal else None,
+            self.problem.attributes.simplexiter + self.problem.attributes.bariter,
+            solveTime, warm, status,
+        )
+        self.records.append(record)
+        if self.telemetry is not None:
+            self.telemetry.recordSolve(name, self.problem, solveTime, warmStart=warm)
+
+        if self.warmStart and status == xp.lp_optimal:
+            self.captureBasis()
+
+        return record
+
+    def solveResult(self, name, ranging=False):
+        """solve(name) and read the SolveResult, from the cache if the same model was solved before."""
+        if self.cache is None:
+            self.solve(name)
+            return SolveResult.fromProblem(self.problem, ranging=ranging)
+
+        result, _, hit = self.cache.solve(self.problem, lambda: self.solve(name), ranging=ranging)
+        if hit:
+            self.records.append(SolveRecord(name, result.objective, 0, 0.0, False, None, cached=True))
+            if self.warmStart and result.colBasis is not None:
+                self.basis = (dict(zip(self.problem.getConstraint(), result.rowBasis.tolist())),
+                              dict(zip(self.problem.getVariable(), result.colBasis.tolist())))
+        return result
+
+    def report(self):
+        print(f"{'Scenario':<40}{'Warm':>6}{'Iterations':>12}{'Time [s]':>12}{'Objective':>20}")
+        for r in self.records:
+            warm = 'cache' if r.cached else str(r.warmStart)
+            print(f"{r.name:<40}{warm:>6}{r.iterations:>12}{r.solveTime:>12.4f}{str(r.objective):>20}")
+
+
+def compareWarmStart(buildProblem, variants):
+    """Run the same chain of variants cold and warm-started.
+
+    `buildProblem()` returns a freshly built xp.problem, `variants` is a
+    list of (name, apply) where apply(problem) modifies the problem before
+    its solve (None for the first, unmodified solve).
+    """
+    chains = []
+    for warmStart in (False, True):
+        chain = ScenarioChain(buildProblem(), warmStart=warmStart)
+        for name, apply in variants:
+            if apply is not None:
+                apply(chain.problem)
+            chain.solve(name)
+        chains.append(chain)
+
+    cold, warm = chains
+    print(f"{'Scenario':<40}{'Iter cold':>12}{'Iter warm':>12}{'Time cold':>12}{'Time warm':>12}")
+    for c, w in zip(cold.records, warm.records):
+        print(f"{c.name:<40}{c.iterations:>12}{w.iterations:>12}{c.solveTime:>12.4f}{w.solveTime:>12.4f}")
+    return cold.records, warm.records
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    import numpy as np
+
+    from dss.backends import loadXpress
+    from dss.builder import OUTLET_DISCOUNT, buildLinearModel, objectiveCoefficients
+    from dss.ingest import readPlanningData
+
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'Produktionsplanung.xlsx'
+    data = readPlanningData(file_path)
+
+    def buildProblem():
+        problem = xp.problem("DiamondStreetStyles")
+        problem.setControl('outputlog', 0)
+        return loadXpress(problem, buildLinearModel(data))
+
+    def noPolyesterReturn(problem):
+        coef, constant = objectiveCoefficients(data, noReturn=('recyceltes Polyester',))
+        problem.chgobj(list(range(data.numProducts)) + [-1], list(coef) + [-constant])
+
+    def outlet(problem):
+        # x = regulär + outlet with regulär <= Maximalprognose, outlet units lose OUTLET_DISCOUNT of the margin
+        problem.delConstraint([c for c in problem.getConstraint() if c.name.startswith('Max_')])
+        capped = np.flatnonzero(data.maxp > 0)
+        n, firstCol = len(capped), problem.attributes.cols
+        problem.addcols(np.concatenate([np.zeros(n), -OUTLET_DISCOUNT * np.maximum(data.margin[capped], 0.0)]).tolist(),
+                        [0] * (2 * n + 1), [], [], [0.0] * 2 * n,
+                        data.maxp[capped].tolist() + [xp.infinity] * n,
+                        [f'Regulär_{data.productNames[i]}' for i in capped] + [f'Outlet_{data.productNames[i]}' for i in capped])
+        cols = np.column_stack([capped, firstCol + np.arange(n), firstCol + n + np.arange(n)]).ravel()
+        problem.addrows(['E'] * n, [0.0] * n, (3 * np.arange(n + 1)).tolist(), cols.tolist(),
+                        np.tile([1.0, -1.0, -1.0], n).tolist(),
+                        names=[f'Absatz_{data.productNames[i]}' for i in capped])
+
+    compareWarmStart(buildProblem, [
+        ("LP", None),
+        ("LP ohne Rücknahme Polyester", noPolyesterReturn),
+        ("LP Outlet", outlet),
+    ])
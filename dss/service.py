@@ -0,0 +1,326 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Planungsdienst
+
+A long-running local service that answers plan and sensitivity requests
+without paying for Python start-up, the xpress / pandas imports, Excel
+parsing and the model build on every query. JSON over HTTP, on a TCP port
+or a Unix socket:
+
+    GET  /health                    workers, datasets, requests served
+    GET  /datasets                  registered datasets
+    POST /datasets                  {"name": ..., "path": ...}  register or reload
+    POST /plan                      {"dataset": ..., "deltas": [...]}
+    POST /sensitivity               {"dataset": ..., "deltas": [...]}
+
+`deltas` are ModelSession operations as lists, e.g.
+[["setPrice", "Cargohose", 40], ["setMaterialLimit", "Baumwolle", 20000]];
+they apply to this request only.
+
+The event loop only parses requests. Solves run in a pool of worker
+processes; every worker keeps one ModelSession (dss.session) per dataset
+version, applies the deltas of a request, solves, and rolls the deltas
+back, so the next request starts from the loaded model and its basis.
+Datasets are read once in the service process when registered, which
+also fills the ingest cache the workers load from.
+
+    python -m dss.service serve --dataset main=Produktionsplanung.xlsx --port 8765
+    python -m dss.service query /plan '{"dataset": "main"}' --port 8765
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from dss.ingest import readPlanningData
+
+
+## Worker-Prozess
+
+# (dataset name, version) -> ModelSession, one set per worker process
+_sessions = {}
+_backend = 'auto'
+
+
+def _initWorker(backend, datasets):
+    global _backend
+    _backend = backend
+    for name, (version, path) in datasets.items():
+        _session(name, version, path)
+
+
+def _session(name, version, path):
+    from dss.session import ModelSession
+
+    key = (name, version)
+    if key not in _sessions:
+        # drop older versions of the dataset
+        for old in [k for k in _sessions if k[0] == name]:
+            del _sessions[old]
+        _sessions[key] = ModelSession(readPlanningData(path), _backend)
+    return _sessions[key]
+
+
+def _sensitivity(session, result):
+    """Duals and reduced costs, plus objective / RHS ranging with Xpress."""
+    data = session.data
+    materials = np.arange(data.numMaterials)
+    products = np.flatnonzero(session.active)
+    answer = {
+        'duals': dict(zip(data.materialNames, result.dual[materials].tolist())),
+        'slacks': dict(zip(data.materialNames, result.slack[materials].tolist())),
+        'reducedCosts': dict(zip(np.asarray(session.colNames)[products].tolist(),
+                                 result.reducedCost[products].tolist())),
+    }
+    problem = getattr(session.solver, 'problem', None)
+    if problem is not None:
+        lowerObj, upperObj, lowerRhs, upperRhs = [], [], [], []
+        problem.objsa(products.tolist(), lowerObj, upperObj)
+        problem.rhssa(materials.tolist(), lowerRhs, upperRhs)
+        answer['objectiveRanges'] = {name: [lo, hi] for name, lo, hi in
+                                     zip(np.asarray(session.colNames)[products].tolist(), lowerObj, upperObj)}
+        answer['rhsRanges'] = {name: [lo, hi] for name, lo, hi in zip(data.materialNames, lowerRhs, upperRhs)}
+    return answer
+
+
+def _handle(task):
+    """Answer one request in a worker process."""
+    kind, name, version, path, deltas, queued = task
+    started = time.perf_counter()
+    session = _session(name, version, path)
+
+    undo = session.apply(deltas)
+    try:
+        result = session.solve()
+        answer = {'dataset': name, 'optimal': result is not None, 'backend': session.solver.name}
+        if result is not None:
+            answer['objective'] = result.objective
+            answer['plan'] = session.plan()
+            if kind == 'sensitivity':
+                answer.update(_sensitivity(session, result))
+    finally:
+        session.apply(undo)
+
+    answer['timing'] = {
+        'queue': started - queued if queued is not None else None,
+        'solve': session.solveTime,
+        'worker': time.perf_counter() - started,
+        'pid': os.getpid(),
+    }
+    return answer
+
+
+## Dienst
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PlanningService:
+
+    def __init__(self, workers=None, backend='auto'):
+        self.workers = workers or os.cpu_count()
+        self.backend = backend
+        # name -> (version, path)
+        self.datasets = {}
+        self.pool = None
+        self.served = 0
+        self.started = time.time()
+
+    def register(self, name, path):
+        """Read the dataset once (fills the ingest cache) and give it a new version."""
+        data = readPlanningData(path)
+        version = self.datasets[name][0] + 1 if name in self.datasets else 1
+        self.datasets[name] = (version, os.path.abspath(path))
+        return {'name': name, 'version': version, 'path': self.datasets[name][1],
+                'products': data.numProducts, 'materials': data.numMaterials}
+
+    def startPool(self):
+        # spawn: no forked copies of an Xpress environment
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_initWorker, initargs=(self.backend, dict(self.datasets)))
+
+    async def solve(self, kind, body):
+        name = body.get('dataset')
+        if not isinstance(name, str) or name not in self.datasets:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown dataset '{name}'")
+        deltas = body.get('deltas', [])
+        if not isinstance(deltas, list) or not all(isinstance(d, list) and d for d in deltas):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "deltas must be a list of [operation, *arguments] lists")
+
+        version, path = self.datasets[name]
+        task = (kind, name, version, path, deltas, time.perf_counter())
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, _handle, task)
+        except (KeyError, ValueError, TypeError) as e:
+            # unknown product / material / operation in the deltas
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e).strip('"')) from None
+
+    async def route(self, method, path, body):
+        if not isinstance(body, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object")
+        if method == 'GET' and path == '/health':
+            return {'status': 'ok', 'workers': self.workers, 'backend': self.backend,
+                    'datasets': sorted(self.datasets), 'served': self.served,
+                    'uptime': time.time() - self.started}
+        if path == '/datasets':
+            if method == 'GET':
+                return {name: {'version': v, 'path': p} for name, (v, p) in self.datasets.items()}
+            if method == 'POST':
+                if not isinstance(body.get('name'), str) or not isinstance(body.get('path'), str):
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "name and path are required (strings)")
+                loop = asyncio.get_running_loop()
+                # Excel parsing off the event loop as well
+                return await loop.run_in_executor(None, self.register, body['name'], body['path'])
+        if method == 'POST' and path in ('/plan', '/sensitivity'):
+            return await self.solve(path[1:], body)
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+    async def handleConnection(self, reader, writer):
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                method, path, _ = requestLine.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    body = json.loads(raw) if raw else {}
+                    answer, status = await self.route(method, path.split('?')[0], body), HTTPStatus.OK
+                    self.served += 1
+                except json.JSONDecodeError as e:
+                    answer, status = {'error': f"Invalid JSON: {e}"}, HTTPStatus.BAD_REQUEST
+                except HttpError as e:
+                    answer, status = {'error': str(e)}, e.status
+                except Exception as e:
+                    answer, status = {'error': f"{type(e).__name__}: {e}"}, HTTPStatus.INTERNAL_SERVER_ERROR
+
+                payload = json.dumps(answer, ensure_ascii=False, default=float).encode('utf-8')
+                keepAlive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n".encode('latin-1') + payload)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # client went away or sent garbage
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unixSocket=None):
+        self.startPool()
+        # start the workers now, not with the first request
+        await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(self.pool, os.getpid)
+                               for _ in range(self.workers)])
+        if unixSocket:
+            server = await asyncio.start_unix_server(self.handleConnection, unixSocket)
+        else:
+            server = await asyncio.start_server(self.handleConnection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+## Client
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class ServiceClient:
+    """Keeps one connection to the service open."""
+
+    def __init__(self, host='127.0.0.1', port=8765, unixSocket=None):
+        self.connection = _UnixConnection(unixSocket) if unixSocket else http.client.HTTPConnection(host, port)
+
+    def request(self, path, body=None):
+        method = 'GET' if body is None else 'POST'
+        payload = None if body is None else json.dumps(body).encode('utf-8')
+        self.connection.request(method, path, payload, {'Content-Type': 'application/json'})
+        response = self.connection.getresponse()
+        answer = json.loads(response.read())
+        if response.status != HTTPStatus.OK:
+            raise RuntimeError(f"{response.status}: {answer.get('error')}")
+        return answer
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Local planning service with resident models")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default=None, help="Unix socket instead of a TCP port")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve')
+    serve.add_argument('--dataset', action='append', default=[], metavar='NAME=WORKBOOK',
+                       help="dataset to load at start, can be repeated")
+    serve.add_argument('--workers', type=int, default=None)
+    serve.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+
+    query = commands.add_parser('query')
+    query.add_argument('path', help="e.g. /plan or /health")
+    query.add_argument('body', nargs='?', default=None, help="JSON request body")
+    query.add_argument('--repeat', type=int, default=1, help="send the request this often and report latency")
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        service = PlanningService(args.workers, args.backend)
+        for spec in args.dataset or ['main=Produktionsplanung.xlsx']:
+            name, _, path = spec.partition('=')
+            print(service.register(name, path))
+        where = args.socket or f"http://{args.host}:{args.port}"
+        print(f"Serving on {where} with {service.workers} workers")
+        try:
+            asyncio.run(service.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
+    else:
+        client = ServiceClient(args.host, args.port, args.socket)
+        body = json.loads(args.body) if args.body else None
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            answer = client.request(args.path, body)
+            latencies.append(time.perf_counter() - start)
+        client.close()
+        print(json.dumps(answer, indent=2, ensure_ascii=False))
+        if args.repeat > 1:
+            latencies = np.array(latencies) * 1000
+            print(f"{args.repeat} requests: median {np.median(latencies):.2f} ms, "
+                  f"p95 {np.percentile(latencies, 95):.2f} ms, max {latencies.max():.2f} ms")
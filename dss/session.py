@@ -0,0 +1,348 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Modell-Sitzung für Was-wäre-wenn-Fragen
+
+ModelSession builds the DiamondStreetCycles.py LP once and keeps it loaded
+in the solver. Planner questions become delta operations on the loaded
+model instead of a rebuild from Excel:
+
+    setMaterialLimit(material, limit)     RHS of the material row, constant
+    setMaterialCost(material, cost)       objective of the products using it, constant
+    setPrice(product, vk)                 one objective coefficient
+    setMachineCost(product, mk)           one objective coefficient
+    setForecast(product, maxp)            upper bound (None = no forecast)
+    setMinimum(product, minp)             lower bound (None = no minimum)
+    addProduct(product, vk, mk, recipe)   new column, offcut rows if needed
+    removeProduct(product)                column fixed to 0, its offcut rows relaxed
+
+followed by solve(). Forecasts and minimum quantities are column bounds
+(buildLinearModel with boundsAsRows=False), so every operation is a
+coefficient, bound or RHS change. Xpress keeps the basis of the previous
+solve, the re-solve after a small delta is a handful of pivots; HiGHS
+re-solves from scratch.
+
+Removed products keep their column (fixed to 0), so indices and the basis
+stay valid; adding a removed product again reuses its column.
+
+apply(deltas) takes the same operations as data, ['setPrice', 'Cargohose',
+40], and returns the deltas that undo them, so a what-if can be answered
+on a shared session and rolled back afterwards.
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+from scipy import sparse
+
+from dss.backends import getBackend
+from dss.bom import BillOfMaterials
+from dss.builder import INFINITY, OFFCUT_RULES, buildLinearModel
+from dss.ingest import readPlanningData
+from dss.results import SolveResult
+
+
+OPERATIONS = frozenset({'setMaterialLimit', 'setMaterialCost', 'setPrice', 'setMachineCost',
+                        'setForecast', 'setMinimum', 'addProduct', 'removeProduct'})
+
+
+def _bound(value, default):
+    return default if value is None or np.isnan(value) else float(value)
+
+
+class ModelSession:
+
+    def __init__(self, data, backend='auto', offcutRules=OFFCUT_RULES, noReturn=()):
+        # own copy of the arrays, the deltas must not change the caller's data
+        self.data = copy.copy(data)
+        for attr in ('vk', 'mk', 'maxp', 'minp', 'costs', 'limits'):
+            setattr(self.data, attr, getattr(data, attr).copy())
+        self.offcutRules = offcutRules
+        self.returnable = np.array([name not in noReturn for name in data.materialNames])
+
+        model = buildLinearModel(data, offcutRules, boundsAsRows=False, noReturn=noReturn)
+        self.solver = getBackend(backend, "DiamondStreetStyles Sitzung").load(model)
+        self.colNames = list(model.colNames)
+        self.rowNames = list(model.rowNames)
+        self.active = np.ones(data.numProducts, dtype=bool)
+
+        ## Verschnittregelung - (row, larger, smaller), rows follow the material rows
+        prodIndex = data.bom.productIndex
+        pairs = [(prodIndex[larger], prodIndex[smaller]) for larger, smaller in offcutRules
+                 if larger in prodIndex and smaller in prodIndex]
+        self.rules = [(data.numMaterials + i, larger, smaller) for i, (larger, smaller) in enumerate(pairs)]
+
+        self.result = None
+        self.solveTime = 0.0
+
+    @classmethod
+    def fromWorkbook(cls, file_path, backend='auto', **kwargs):
+        return cls(readPlanningData(file_path), backend, **kwargs)
+
+    ## Hilfen
+
+    def _product(self, name):
+        try:
+            return self.data.bom.productIndex[name]
+        except KeyError:
+            raise KeyError(f"Unknown product '{name}'") from None
+
+    def _material(self, name):
+        try:
+            return self.data.bom.materialIndex[name]
+        except KeyError:
+            raise KeyError(f"Unknown material '{name}'") from None
+
+    def _returnValue(self):
+        """Objective value of one unit of each material in a product (Rücksendekosten - Kosten)."""
+        return np.where(self.returnable, self.data.returnCost - self.data.costs, 0.0)
+
+    def _coefficients(self, cols):
+        cols = np.asarray(cols, dtype=int)
+        return self.data.margin[cols] + self.data.bom.matrix[cols] @ self._returnValue()
+
+    def _constant(self):
+        return -self.data.fixedCosts - self.data.costs @ self.data.limits - self._returnValue() @ self.data.limits
+
+    def _updateObjective(self, cols):
+        cols = np.asarray(cols, dtype=int)
+        self.solver.changeObjective(cols, np.where(self.active[cols], self._coefficients(cols), 0.0),
+                                    self._constant())
+
+    def _updateRules(self, product):
+        """Offcut rows with a removed product must not restrict the other one."""
+        rows, rhs = [], []
+        for row, larger, smaller in self.rules:
+            if product in (larger, smaller):
+                rows.append(row)
+                rhs.append(0.0 if self.active[larger] and self.active[smaller] else -INFINITY)
+        if rows:
+            self.solver.changeRhs(rows, rhs)
+
+    ## Material
+
+    def setMaterialLimit(self, material, limit):
+        m = self._material(material)
+        self.data.limits[m] = limit
+        # material rows come first in the built model
+        self.solver.changeRhs([m], [limit])
+        self.solver.changeObjective([], [], self._constant())
+
+    def setMaterialCost(self, material, cost):
+        m = self._material(material)
+        self.data.costs[m] = cost
+        products, _ = self.data.bom.usage(material)
+        self._updateObjective(products)
+
+    ## Produkt
+
+    def setPrice(self, product, vk):
+        p = self._product(product)
+        self.data.vk[p] = vk
+        self._updateObjective([p])
+
+    def setMachineCost(self, product, mk):
+        p = self._product(product)
+        self.data.mk[p] = mk
+        self._updateObjective([p])
+
+    def setForecast(self, product, maxp):
+        p = self._product(product)
+        self.data.maxp[p] = np.nan if maxp is None else maxp
+        if self.active[p]:
+            self.solver.changeBounds([p], upper=[_bound(maxp, INFINITY)])
+
+    def setMinimum(self, product, minp):
+        p = self._product(product)
+        self.data.minp[p] = np.nan if minp is None else minp
+        if self.active[p]:
+            self.solver.changeBounds([p], lower=[_bound(minp, 0.0)])
+
+    def removeProduct(self, product):
+        p = self._product(product)
+        self.active[p] = False
+        self.solver.changeBounds([p], lower=[0.0], upper=[0.0])
+        self.solver.changeObjective([p], [0.0])
+        self._updateRules(p)
+
+    def addProduct(self, product, vk, mk, recipe, maxp=None, minp=None):
+        """Add a product; `recipe` is {material: meters per unit}.
+
+        A product that was removed before gets its column back with the new
+        data, a new product becomes a new column.
+        """
+        data = self.data
+        recipe = {self.data.materialNames[self._material(m)]: float(a) for m, a in recipe.items()}
+        row = np.zeros(data.numMaterials)
+        for material, amount in recipe.items():
+            row[data.bom.materialIndex[material]] = amount
+
+        if product in data.bom.productIndex:
+            p = data.bom.productIndex[product]
+            if self.active[p]:
+                raise ValueError(f"Product '{product}' is already in the model")
+            old = data.bom.matrix[p].toarray().ravel()
+            changed = np.flatnonzero(old != row)
+            self.solver.changeCoefficients(changed, np.full(len(changed), p), row[changed])
+            matrix = data.bom.matrix.tolil()
+            matrix[p] = row
+            data.bom = BillOfMaterials(data.productNames, data.materialNames, matrix)
+            data.vk[p], data.mk[p] = vk, mk
+            data.maxp[p] = np.nan if maxp is None else maxp
+            data.minp[p] = np.nan if minp is None else minp
+            self.active[p] = True
+            self.solver.changeBounds([p], lower=[_bound(minp, 0.0)], upper=[_bound(maxp, INFINITY)])
+            self._updateObjective([p])
+            self._updateRules(p)
+            return
+
+        ## neue Spalte
+        p = data.numProducts
+        data.productNames = data.productNames + [product]
+        data.bom = BillOfMaterials(data.productNames, data.materialNames,
+                                   sparse.vstack([data.bom.matrix, sparse.csr_matrix(row)]))
+        data.vk = np.append(data.vk, vk)
+        data.mk = np.append(data.mk, mk)
+        data.maxp = np.append(data.maxp, np.nan if maxp is None else maxp)
+        data.minp = np.append(data.minp, np.nan if minp is None else minp)
+        self.active = np.append(self.active, True)
+
+        column = sparse.csc_matrix((row[row != 0], (np.flatnonzero(row), np.zeros(np.count_nonzero(row), dtype=int))),
+                                   shape=(len(self.rowNames), 1))
+        self.solver.addCols(self._coefficients([p]), [_bound(minp, 0.0)], [_bound(maxp, INFINITY)], column, [product])
+        self.colNames.append(product)
+
+        ## Verschnittregelung with products already in the model
+        prodIndex = data.bom.productIndex
+        for larger, smaller in self.offcutRules:
+            if product not in (larger, smaller) or larger not in prodIndex or smaller not in prodIndex:
+                continue
+            l, s = prodIndex[larger], prodIndex[smaller]
+            coefficients = np.zeros(data.numProducts)
+            coefficients[[l, s]] = (1.0, -1.0)
+            active = self.active[l] and self.active[s]
+            self.solver.addRows(['G'], [0.0 if active else -INFINITY], sparse.csr_matrix(coefficients))
+            self.rules.append((len(self.rowNames), l, s))
+            self.rowNames.append(f'Verschnitt_{len(self.rules)}')
+
+    ## Deltas als Daten
+
+    def _inverse(self, op, args):
+        """The delta that undoes (op, *args) in the current state."""
+        data = self.data
+        if op in ('setMaterialLimit', 'setMaterialCost'):
+            m = self._material(args[0])
+            old = data.limits[m] if op == 'setMaterialLimit' else data.costs[m]
+            return [op, args[0], float(old)]
+        if op == 'addProduct':
+            p = data.bom.productIndex.get(args[0])
+            if p is not None and self.active[p]:
+                raise ValueError(f"Product '{args[0]}' is already in the model")
+            return ['removeProduct', args[0]]
+
+        p = self._product(args[0])
+        if op == 'removeProduct':
+            recipe = {data.materialNames[m]: float(a)
+                      for m, a in zip(data.bom.matrix[p].indices, data.bom.matrix[p].data)}
+            return ['addProduct', args[0], float(data.vk[p]), float(data.mk[p]), recipe,
+                    None if np.isnan(data.maxp[p]) else float(data.maxp[p]),
+                    None if np.isnan(data.minp[p]) else float(data.minp[p])]
+        old = {'setPrice': data.vk, 'setMachineCost': data.mk, 'setForecast': data.maxp, 'setMinimum': data.minp}[op][p]
+        return [op, args[0], None if np.isnan(old) else float(old)]
+
+    def apply(self, deltas):
+        """Apply deltas given as [operation, *arguments] lists, e.g. ['setPrice', 'Cargohose', 40].
+
+        Returns the deltas that undo them, in the order to apply them.
+        """
+        undo = []
+        try:
+            for delta in deltas:
+                op, args = delta[0], list(delta[1:])
+                if op not in OPERATIONS:
+                    raise ValueError(f"Unknown operation '{op}', expected one of {sorted(OPERATIONS)}")
+                inverse = self._inverse(op, args)
+                getattr(self, op)(*args)
+                undo.append(inverse)
+        except Exception:
+            # leave the session as it was
+            for op, *args in reversed(undo):
+                getattr(self, op)(*args)
+            raise
+        return undo[::-1]
+
+    ## Lösen
+
+    def solve(self):
+        """Re-solve after the deltas, returns a SolveResult (None if not optimal)."""
+        start = time.perf_counter()
+        optimal = self.solver.solve()
+        self.result = None
+        if optimal:
+            self.result = SolveResult(self.colNames, self.rowNames, self.solver.solution(), self.solver.duals(),
+                                      self.solver.slacks(), self.solver.reducedCosts(), self.solver.objectiveValue())
+        self.solveTime = time.perf_counter() - start
+        return self.result
+
+    def plan(self):
+        """Production quantities of the products in the model."""
+        return dict(zip(np.asarray(self.colNames)[self.active].tolist(), self.result.primal[self.active].tolist()))
+
+
+def rebuildTime(file_path, backend='auto'):
+    """Time of the old path: read the workbook (no cache), build, solve."""
+    start = time.perf_counter()
+    data = readPlanningData(file_path, useCache=False)
+    solver = getBackend(backend).load(buildLinearModel(data, boundsAsRows=False))
+    solver.solve()
+    return time.perf_counter() - start, solver.objectiveValue()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="What-if deltas on a loaded model against a rebuild from Excel")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--size', default=None, help="generated instance <products>x<materials> instead of the workbook")
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.size is None:
+        session = ModelSession.fromWorkbook(args.workbook, args.backend)
+    else:
+        from dss.bench import parseSize
+        from dss.synthetic import generatePlanningData
+        session = ModelSession(generatePlanningData(*parseSize(args.size), seed=0), args.backend)
+    session.solve()
+    print(f"Session ready in {time.perf_counter() - start:.3f}s ({session.solver.name}), "
+          f"objective {session.result.objective:.2f}")
+
+    data = session.data
+    product, material = data.productNames[0], data.materialNames[0]
+    recipe = dict(zip([data.materialNames[m] for m in data.bom.matrix[0].indices], data.bom.matrix[0].data))
+    print(f"Product: {product}, material: {material}")
+    deltas = [
+        ("material limit +10%", lambda: session.setMaterialLimit(material, data.limits[0] * 1.1)),
+        ("material cost +1", lambda: session.setMaterialCost(material, data.costs[0] + 1)),
+        ("product price -5%", lambda: session.setPrice(product, data.vk[0] * 0.95)),
+        ("product machine cost +1", lambda: session.setMachineCost(product, data.mk[0] + 1)),
+        ("product forecast 2x minimum", lambda: session.setForecast(product, 2 * np.nan_to_num(data.minp[0], nan=500))),
+        ("remove product", lambda: session.removeProduct(product)),
+        ("add product again", lambda: session.addProduct(product, data.vk[0], data.mk[0], recipe)),
+        ("add new product", lambda: session.addProduct('Neuheit', data.vk[0] * 1.2, data.mk[0], recipe, maxp=500)),
+    ]
+
+    print(f"{'Delta':<36}{'Apply [ms]':>12}{'Solve [ms]':>12}{'Iterations':>12}{'Objective':>18}")
+    for name, apply in deltas:
+        start = time.perf_counter()
+        apply()
+        applyTime = time.perf_counter() - start
+        result = session.solve()
+        objective = f"{result.objective:.2f}" if result is not None else 'not optimal'
+        print(f"{name:<36}{applyTime * 1000:>12.2f}{session.solveTime * 1000:>12.2f}"
+              f"{session.solver.iterations:>12}{objective:>18}")
+
+    if args.size is None:
+        rebuild, _ = rebuildTime(args.workbook, args.backend)
+        print(f"Rebuild from Excel and solve: {rebuild * 1000:.1f} ms")
@@ -0,0 +1,176 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Sample Average Approximation für unsichere Nachfrage
+
+Maximalprognose is treated as the mean of an uncertain demand instead of a
+hard cap. N demand scenarios are drawn at once with NumPy and the two-stage
+model is built as one sparse LP:
+
+    stage 1:  production x (materials, offcut rules, Mindestproduktionsmenge)
+    stage 2:  regular sales r_s <= min(x, d_s) per scenario s, the rest of
+              x goes to the outlet and loses OUTLET_DISCOUNT of its margin
+
+    max  sum_p (c_p - discount * m_p) x_p + 1/N sum_s sum_p discount * m_p r_sp + const
+
+Products without Maximalprognose have no demand limit and are sold
+regularly. The scenario blocks are generated as index arrays, there is no
+Python object per scenario variable. The chosen plan is then evaluated on
+an independent sample (closed-form recourse r = min(x, d)) to get an
+unbiased profit estimate with a confidence interval.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.stats import norm
+
+from dss.backends import getBackend
+from dss.builder import INFINITY, OUTLET_DISCOUNT, LinearModel, buildLinearModel
+from dss.ingest import readPlanningData
+
+
+def forecastProducts(data):
+    """Indices of the products with a Maximalprognose (uncertain demand)."""
+    return np.flatnonzero(data.maxp > 0)
+
+
+def sampleDemand(data, n, cv=0.2, seed=None, distribution='normal'):
+    """(n, K) demand matrix for the K forecast products.
+
+    The Maximalprognose is the mean, cv the coefficient of variation.
+    Normal samples are cut at zero, lognormal samples have the same mean
+    and cv.
+    """
+    rng = np.random.default_rng(seed)
+    mean = data.maxp[forecastProducts(data)]
+
+    if distribution == 'normal':
+        return np.maximum(rng.normal(mean, cv * mean, size=(n, len(mean))), 0.0)
+    if distribution == 'lognormal':
+        sigma = np.sqrt(np.log1p(cv ** 2))
+        return rng.lognormal(np.log(mean) - sigma ** 2 / 2, sigma, size=(n, len(mean)))
+    raise ValueError(f"Unknown demand distribution '{distribution}'")
+
+
+def buildSaaModel(data, demand, outletDiscount=OUTLET_DISCOUNT):
+    """Extensive form of the two-stage model for the (N, K) demand scenarios."""
+    base = buildLinearModel(data, boundsAsRows=False)
+    products = forecastProducts(data)
+    n, k = demand.shape
+    p = data.numProducts
+    # no discount on a negative Deckungsbeitrag, as in the outlet LP of the script
+    margin = np.maximum(data.margin[products], 0.0)
+
+    ## stage 1 - no forecast cap, overstock goes to the outlet
+    ub = np.full(p, INFINITY)
+    objective = base.objective.copy()
+    objective[products] -= outletDiscount * margin
+
+    ## stage 2 - regular sales r_sk, column p + s*k + j
+    recourseObj = np.tile(outletDiscount * margin / n, n)
+    recourseLb = np.zeros(n * k)
+    recourseUb = demand.ravel()
+
+    # r_sk - x_k <= 0
+    rows = np.arange(n * k)
+    linking = sparse.csr_matrix(
+        (np.concatenate([np.full(n * k, -1.0), np.ones(n * k)]),
+         (np.concatenate([rows, rows]), np.concatenate([np.tile(products, n), p + rows]))),
+        shape=(n * k, p + n * k))
+
+    matrix = sparse.vstack([
+        sparse.hstack([base.matrix, sparse.csr_matrix((base.numRows, n * k))]),
+        linking,
+    ], format='csr')
+
+    names = [data.productNames[i] for i in products]
+    colNames = base.colNames + [f'r_{s}_{name}' for s in range(n) for name in names]
+    rowNames = base.rowNames + [f'Absatz_{s}_{name}' for s in range(n) for name in names]
+
+    return LinearModel(
+        colNames,
+        np.concatenate([objective, recourseObj]),
+        np.concatenate([base.lb, recourseLb]),
+        np.concatenate([ub, recourseUb]),
+        matrix,
+        np.concatenate([base.rowSense, np.full(n * k, 'L')]),
+        np.concatenate([base.rhs, np.zeros(n * k)]),
+        rowNames,
+        objConstant=base.objConstant,
+    )
+
+
+def scenarioProfits(data, plan, demand, outletDiscount=OUTLET_DISCOUNT):
+    """Profit of a fixed production plan in every demand scenario."""
+    base = buildLinearModel(data, boundsAsRows=False)
+    products = forecastProducts(data)
+    # no discount on a negative Deckungsbeitrag, as in the outlet LP of the script
+    margin = np.maximum(data.margin[products], 0.0)
+
+    plan = np.asarray(plan, dtype=float)
+    regular = np.minimum(plan[products], demand)
+    outlet = plan[products] - regular
+
+    return base.objective @ plan + base.objConstant - (outletDiscount * margin * outlet).sum(axis=1)
+
+
+class SaaResult:
+
+    def __init__(self, plan, objective, profits, confidence, buildTime, solveTime):
+        self.plan = plan
+        self.objective = objective
+        self.profitMean = profits.mean()
+        self.stdErr = profits.std(ddof=1) / np.sqrt(len(profits))
+        half = norm.ppf(0.5 + confidence / 2) * self.stdErr
+        self.ciLow = self.profitMean - half
+        self.ciHigh = self.profitMean + half
+        self.confidence = confidence
+        self.buildTime = buildTime
+        self.solveTime = solveTime
+
+
+def solveSaa(data, scenarios=1000, evalScenarios=10000, cv=0.2, seed=None,
+             distribution='normal', confidence=0.95, outletDiscount=OUTLET_DISCOUNT, backend='auto'):
+    """Solve the SAA problem and evaluate its plan on an independent sample."""
+    rng = np.random.default_rng(seed)
+    demand = sampleDemand(data, scenarios, cv, rng, distribution)
+
+    start = time.perf_counter()
+    solver = getBackend(backend, "DiamondStreetStyles SAA").load(buildSaaModel(data, demand, outletDiscount))
+    buildTime = time.perf_counter() - start
+
+    if not solver.solve():
+        raise RuntimeError(f"SAA problem not solved to optimality with {solver.name}")
+
+    plan = solver.solution(range(data.numProducts))
+    profits = scenarioProfits(data, plan, sampleDemand(data, evalScenarios, cv, rng, distribution), outletDiscount)
+
+    return SaaResult(plan, solver.objectiveValue(), profits, confidence, buildTime, solver.solveTime)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Sample average approximation for uncertain demand")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--eval-scenarios', type=int, default=10000)
+    parser.add_argument('--cv', type=float, default=0.2, help="coefficient of variation of the demand")
+    parser.add_argument('--distribution', choices=['normal', 'lognormal'], default='normal')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    data = readPlanningData(args.workbook)
+    result = solveSaa(data, args.scenarios, args.eval_scenarios, args.cv, args.seed,
+                      args.distribution, args.confidence, backend=args.backend)
+
+    for name, quantity in zip(data.productNames, result.plan):
+        print(f"{name}: {quantity}")
+    print()
+    print(f"SAA objective ({args.scenarios} scenarios): {result.objective}")
+    print(f"Expected profit: {result.profitMean} +- {result.ciHigh - result.profitMean} "
+          f"({result.confidence:.0%} CI: {result.ciLow} .. {result.ciHigh})")
+    print(f"Build: {result.buildTime:.3f}s, Solve: {result.solveTime:.3f}s")
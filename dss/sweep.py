@@ -0,0 +1,164 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Parameter-Sweep über Preise, Kosten und Materiallimits
+
+Evaluates a table of what-if scenarios against the DiamondStreetCycles.py
+model. Every worker process builds the model once and then only applies
+the deltas of a scenario (objective coefficients, objective constant,
+material RHS) before a re-solve; with the Xpress backend that re-solve is
+warm-started from the previous basis. Results are streamed to a
+JSONL file, one record per scenario with objective, plan and duals of the
+material rows.
+
+Scenario table (CSV or DataFrame): one row per scenario, an optional
+`scenario` column as id, and delta columns named `<field>:<name>`:
+
+    Verkaufspreis:<Produkt>          Maschinenkosten:<Produkt>
+    Kosten / m:<Material>            Materialbeschränkungen:<Material>
+
+Values are absolute, empty cells keep the value from the workbook.
+"""
+
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from dss.backends import getBackend
+from dss.builder import buildLinearModel, objectiveCoefficients
+from dss.ingest import readPlanningData
+
+
+## field in the scenario table -> (PlanningData attribute, indexed by)
+FIELDS = {
+    'Verkaufspreis': ('vk', 'product'),
+    'Maschinenkosten': ('mk', 'product'),
+    'Kosten / m': ('costs', 'material'),
+    'Materialbeschränkungen': ('limits', 'material'),
+}
+
+
+def parseColumns(columns, data):
+    """Map `<field>:<name>` columns to (column, attribute, index)."""
+    parsed = []
+    for col in columns:
+        if col == 'scenario':
+            continue
+        field, sep, name = col.partition(':')
+        if not sep or field not in FIELDS:
+            raise ValueError(f"Unknown scenario column '{col}', expected one of {list(FIELDS)} as '<field>:<name>'")
+        attr, kind = FIELDS[field]
+        index = data.bom.productIndex if kind == 'product' else data.bom.materialIndex
+        if name not in index:
+            raise ValueError(f"Unknown {kind} '{name}' in scenario column '{col}'")
+        parsed.append((col, attr, index[name]))
+    return parsed
+
+
+class SweepWorker:
+    """Keeps one built model and applies scenario deltas to it."""
+
+    def __init__(self, data, backend='auto'):
+        self.base = data
+        self.solver = getBackend(backend).load(buildLinearModel(data))
+
+        # material rows come first in the built model
+        self.materialRows = np.arange(data.numMaterials)
+        self.coef, self.constant = objectiveCoefficients(data)
+        self.limits = data.limits.copy()
+
+    def scenarioData(self, deltas):
+        data = copy.copy(self.base)
+        for attr in ('vk', 'mk', 'costs', 'limits'):
+            setattr(data, attr, getattr(self.base, attr).copy())
+        for attr, idx, value in deltas:
+            getattr(data, attr)[idx] = value
+        return data
+
+    def solve(self, scenarioId, deltas):
+        data = self.scenarioData(deltas)
+
+        ## only push what differs from the model's current state
+        coef, constant = objectiveCoefficients(data)
+        changed = np.flatnonzero(coef != self.coef)
+        if len(changed) or constant != self.constant:
+            self.solver.changeObjective(changed, coef[changed], constant)
+            self.coef, self.constant = coef, constant
+
+        changed = np.flatnonzero(data.limits != self.limits)
+        if len(changed):
+            self.solver.changeRhs(self.materialRows[changed], data.limits[changed])
+            self.limits = data.limits
+
+        # Xpress keeps the basis of the previous scenario as warm start
+        optimal = self.solver.solve()
+
+        record = {'scenario': scenarioId, 'optimal': optimal}
+        if optimal:
+            record['objective'] = self.solver.objectiveValue()
+            record['plan'] = dict(zip(self.base.productNames, self.solver.solution(range(self.base.numProducts)).tolist()))
+            record['duals'] = dict(zip(self.base.materialNames, self.solver.duals(self.materialRows).tolist()))
+        else:
+            record['objective'] = None
+        return record
+
+
+## one worker per process, built by the pool initializer
+_worker = None
+
+
+def _initWorker(data, backend):
+    global _worker
+    _worker = SweepWorker(data, backend)
+
+
+def _solveScenario(task):
+    scenarioId, deltas = task
+    return _worker.solve(scenarioId, deltas)
+
+
+def scenarioTasks(table, data):
+    """(scenario id, [(attribute, index, value)]) per row of the table."""
+    columns = parseColumns(table.columns, data)
+    ids = table['scenario'] if 'scenario' in table.columns else table.index
+    for row, scenarioId in enumerate(ids):
+        deltas = []
+        for col, attr, idx in columns:
+            value = table[col].iloc[row]
+            if not pd.isna(value):
+                deltas.append((attr, idx, float(value)))
+        yield (scenarioId.item() if isinstance(scenarioId, np.generic) else scenarioId), deltas
+
+
+def runSweep(file_path, table, resultPath, workers=None, chunksize=16, backend='auto'):
+    """Solve all scenarios of `table` in a process pool and stream them to `resultPath`."""
+    data = readPlanningData(file_path)
+    # validate the columns before starting any worker
+    parseColumns(table.columns, data)
+
+    count = 0
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=_initWorker, initargs=(data, backend)) as pool, \
+            open(resultPath, 'w', encoding='utf-8') as out:
+        for record in pool.imap_unordered(_solveScenario, scenarioTasks(table, data), chunksize=chunksize):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Parallel what-if sweep over prices, costs and material limits")
+    parser.add_argument('scenarios', help="CSV scenario table")
+    parser.add_argument('results', help="JSONL result file")
+    parser.add_argument('--workbook', default='Produktionsplanung.xlsx')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=16)
+    parser.add_argument('--backend', choices=['auto', 'xpress', 'highs'], default='auto')
+    args = parser.parse_args()
+
+    count = runSweep(args.workbook, pd.read_csv(args.scenarios), args.results, args.workers, args.chunksize, args.backend)
+    print(f"{count} scenarios written to {args.results}")
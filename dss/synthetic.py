@@ -0,0 +1,177 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Synthetische Instanzen im Format von Produktionsplanung.xlsx
+
+Generates the four sheets (Produkt, Material, Fixkosten, Variablen) with
+the same columns as the real workbook, so the whole ingest, build, solve
+and report path can be run on instances with up to 10^5 products and
+10^3 materials.
+
+    materialsPerProduct   (min, max) materials per product, controls the
+                          sparsity of the bill of materials
+    capShare              share of products with a Maximalprognose
+    minShare              share of products with a Mindestproduktionsmenge
+    tightness             material limits as share of what the caps (or a
+                          nominal volume) would use, < 1 makes them binding
+
+The product and material names used by the offcut rules, the polyester
+return and the Elastan ranging in DiamondStreetCycles.py are kept
+(anchors=True), everything else is numbered. With anchors the instance
+needs at least that many products and materials, otherwise the script
+could not run on it. The minimum plan always fits into the material
+limits and never violates an offcut rule, so every generated instance is
+feasible.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from dss.builder import OFFCUT_RULES
+from dss.data import PlanningData
+
+
+ANCHOR_PRODUCTS = tuple(name for rule in OFFCUT_RULES for name in rule)
+ANCHOR_MATERIALS = ('recyceltes Polyester', 'Elastan')
+
+# Produktionsmenge for products without Maximalprognose when sizing the limits
+NOMINAL_VOLUME = 5000
+
+
+def _names(prefix, n, anchors, width):
+    names = [f'{prefix} {i + 1:0{width}d}' for i in range(n)]
+    names[:len(anchors)] = anchors[:n]
+    return names
+
+
+def _chooseMaterials(rng, numProducts, numMaterials, counts, width):
+    """(P, width) material indices, distinct within a row; slots >= count are -1.
+
+    A random start plus strictly positive steps whose sum stays below the
+    number of materials gives distinct indices without a per-product loop.
+    """
+    if width == 1:
+        chosen = rng.integers(0, numMaterials, size=(numProducts, 1))
+    else:
+        maxStep = max((numMaterials - 1) // (width - 1), 1)
+        steps = rng.integers(1, maxStep + 1, size=(numProducts, width - 1))
+        start = rng.integers(0, numMaterials, size=(numProducts, 1))
+        chosen = (start + np.concatenate([np.zeros((numProducts, 1), dtype=int), np.cumsum(steps, axis=1)], axis=1)) % numMaterials
+    chosen[np.arange(width)[None, :] >= counts[:, None]] = -1
+    return chosen
+
+
+def generateFrames(numProducts=11, numMaterials=7, materialsPerProduct=(1, 3), capShare=0.8, minShare=0.3,
+                   tightness=0.6, returnCost=0.1, seed=None, anchors=True):
+    """{sheet name : DataFrame} shaped like readWorkbook('Produktionsplanung.xlsx')."""
+    if anchors and (numProducts < len(ANCHOR_PRODUCTS) or numMaterials < len(ANCHOR_MATERIALS)):
+        raise ValueError(f"With anchors an instance needs at least {len(ANCHOR_PRODUCTS)} products and "
+                         f"{len(ANCHOR_MATERIALS)} materials ({', '.join(ANCHOR_PRODUCTS + ANCHOR_MATERIALS)}), "
+                         f"got {numProducts} x {numMaterials}")
+    rng = np.random.default_rng(seed)
+    lowCount, highCount = materialsPerProduct
+    width = min(highCount, numMaterials)
+    # every product needs a material, otherwise an uncapped product is unbounded
+    lowCount = min(max(lowCount, 1), width)
+
+    productNames = _names('Produkt', numProducts, ANCHOR_PRODUCTS if anchors else (), len(str(numProducts)))
+    materialNames = _names('Material', numMaterials, ANCHOR_MATERIALS if anchors else (), len(str(numMaterials)))
+
+    ## Material - Kosten / m between 0.5 and 30 like Elastan .. Seide
+    costs = np.round(np.exp(rng.uniform(np.log(0.5), np.log(30.0), numMaterials)), 2)
+
+    ## Stückliste - distinct materials per product, 0.5 .. 3 m in 0.25 m steps
+    counts = rng.integers(lowCount, width + 1, size=numProducts)
+    chosen = _chooseMaterials(rng, numProducts, numMaterials, counts, width)
+    amounts = np.where(chosen >= 0, rng.integers(2, 13, size=(numProducts, width)) * 0.25, np.nan)
+    materialCost = np.nansum(np.where(chosen >= 0, costs[np.maximum(chosen, 0)], 0.0) * np.nan_to_num(amounts), axis=1)
+
+    ## Preise - Maschinenkosten 20 .. 100, Verkaufspreis with a markup on all variable costs
+    mk = np.round(rng.uniform(20, 100, numProducts) * 2) / 2
+    vk = np.round((mk + materialCost) * rng.uniform(1.2, 2.2, numProducts))
+
+    ## Maximalprognose und Mindestproduktionsmenge
+    maxp = np.where(rng.random(numProducts) < capShare, rng.integers(10, 101, numProducts) * 100.0, np.nan)
+    minp = np.where(rng.random(numProducts) < minShare,
+                    np.round(np.nan_to_num(maxp, nan=NOMINAL_VOLUME) * rng.uniform(0.1, 0.6, numProducts), -2), np.nan)
+
+    # offcut rules larger >= smaller: no cap on the larger, no minimum on the smaller product
+    prodIndex = {name: i for i, name in enumerate(productNames)}
+    for larger, smaller in OFFCUT_RULES:
+        if larger in prodIndex and smaller in prodIndex:
+            maxp[prodIndex[larger]] = np.nan
+            minp[prodIndex[smaller]] = np.nan
+
+    ## Materialbeschränkungen - minimum plan plus `tightness` of the remaining volume
+    rows = np.repeat(np.arange(numProducts), width)
+    cols = chosen.ravel()
+    used = cols >= 0
+    minUse = np.bincount(cols[used], weights=(np.nan_to_num(minp)[rows] * amounts.ravel())[used], minlength=numMaterials)
+    capUse = np.bincount(cols[used], weights=(np.nan_to_num(maxp, nan=NOMINAL_VOLUME)[rows] * amounts.ravel())[used],
+                         minlength=numMaterials)
+    limits = np.ceil(minUse + tightness * np.maximum(capUse - minUse, 0)).astype(np.int64)
+
+    produkt = {
+        'Produkt': productNames,
+        'Verkaufspreis': vk,
+        'Maschinenkosten': mk,
+        'Maximalprognose': maxp,
+        'Mindestproduktionsmenge': minp,
+    }
+    names = np.asarray(materialNames, dtype=object)
+    for k in range(width):
+        present = chosen[:, k] >= 0
+        produkt[f'{k + 1}. Material - Beschreibung'] = np.where(present, names[np.maximum(chosen[:, k], 0)], np.nan)
+        produkt[f'{k + 1}. Matrial - Maße in Meter'] = amounts[:, k]
+
+    # Fixkosten scale with the size of the collection, 2344000 for the 11 real products
+    fixedScale = numProducts / 11
+
+    return {
+        'Material': pd.DataFrame({'Material': materialNames, 'Kosten / m': costs, 'Materialbeschränkungen': limits}),
+        'Produkt': pd.DataFrame(produkt),
+        'Fixkosten': pd.DataFrame({'Art': ['Designer', 'Modeschau'],
+                                   'Betrag': np.round(np.array([94000, 2250000]) * fixedScale).astype(np.int64)}),
+        'Variablen': pd.DataFrame({'Name': ['Wert'], 'Rücksendekosten': [returnCost]}),
+    }
+
+
+def generatePlanningData(*args, **kwargs):
+    """PlanningData of a generated instance, same arguments as generateFrames."""
+    frames = generateFrames(*args, **kwargs)
+    return PlanningData.fromFrames(frames['Material'], frames['Produkt'], frames['Fixkosten'], frames['Variablen'])
+
+
+def writeWorkbook(frames, file_path):
+    """Write the generated sheets to an xlsx file readable by readWorkbook."""
+    with pd.ExcelWriter(file_path, engine='xlsxwriter') as writer:
+        for sheet, df in frames.items():
+            df.to_excel(writer, sheet_name=sheet, index=False)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Synthetic workbook shaped like Produktionsplanung.xlsx")
+    parser.add_argument('output', help="xlsx file to write")
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--materials', type=int, default=50)
+    parser.add_argument('--materials-per-product', type=int, nargs=2, default=(1, 3), metavar=('MIN', 'MAX'))
+    parser.add_argument('--cap-share', type=float, default=0.8)
+    parser.add_argument('--min-share', type=float, default=0.3)
+    parser.add_argument('--tightness', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        frames = generateFrames(args.products, args.materials, tuple(args.materials_per_product), args.cap_share,
+                                args.min_share, args.tightness, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    generated = time.perf_counter() - start
+    writeWorkbook(frames, args.output)
+
+    print(f"{args.products} products x {args.materials} materials written to {args.output}")
+    print(f"Generate: {generated:.3f}s, Write: {time.perf_counter() - start - generated:.3f}s")
@@ -0,0 +1,311 @@
+# -- coding: utf-8 --
+"""
+DiamondStreetStyles - Phasen-Profiler und Laufprotokoll
+
+Opt-in instrumentation for the planning scripts. A Telemetry object cuts a
+run into phases (ingest, build, solves, report ...) and records per phase
+wall time, current RSS and peak RSS. Solves are recorded with the Xpress
+attributes (status, simplex / barrier / crossover iterations, algorithm)
+and, read from the solver log, the presolve reductions and how the solve
+time splits into presolve, simplex, barrier and crossover.
+
+At the end of the run one JSON line is appended to the telemetry file.
+Optionally every phase is profiled and the profile of the slowest phase is
+written next to it (cProfile .prof, or pyinstrument .html if installed).
+
+Switched on through the environment, without it everything is a no-op:
+
+    DSS_TELEMETRY=runs.jsonl     file the run records are appended to
+    DSS_PROFILE=profiles         directory for the hottest-phase profile
+    DSS_PROFILER=pyinstrument    optional, cProfile otherwise
+
+Phases do not nest: mark(name) ends the running phase and starts the next
+one, which keeps a flat script flat; phase(name) is the same as a context
+manager.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is then not recorded
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+# Xpress ALGORITHM attribute
+ALGORITHMS = {1: 'default', 2: 'dual', 3: 'primal', 4: 'barrier', 5: 'network'}
+
+SIZE_LINE = re.compile(r'(\d+) rows\s+(\d+) cols\s+(\d+) elements')
+
+
+def peakRss():
+    """Peak resident set size of this process in MB, None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def currentRss():
+    """Current resident set size in MB, None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+
+
+class SolverLog:
+    """Xpress log lines with arrival time, caught by the message callback.
+
+    The log is switched on for the callback only, nothing is printed.
+    """
+
+    def __init__(self, problem):
+        self.lines = []
+        self.started = time.perf_counter()
+        problem.setOutputEnabled(False)
+        problem.setControl('outputlog', 1)
+        problem.addcbmessage(self._message, None, 0)
+
+    def _message(self, problem, data, msg, msgtype):
+        if msg is not None:
+            self.lines.append((time.perf_counter(), msg))
+
+    def start(self):
+        self.lines = []
+        self.started = time.perf_counter()
+
+    def _find(self, prefix, after=None):
+        for stamp, msg in self.lines:
+            if msg.startswith(prefix) and (after is None or stamp >= after):
+                return stamp
+        return None
+
+    def _size(self, header):
+        for i, (_, msg) in enumerate(self.lines[:-1]):
+            if msg.startswith(header):
+                match = SIZE_LINE.search(self.lines[i + 1][1])
+                if match:
+                    return tuple(int(v) for v in match.groups())
+        return None
+
+    def summary(self):
+        """Presolve reductions and the split of the last solve into its algorithms."""
+        stats = {}
+        original = self._size('Original problem has')
+        presolved = self._size('Presolved problem has')
+        if original and presolved:
+            stats['presolve'] = {
+                'rows': presolved[0], 'cols': presolved[1], 'elements': presolved[2],
+                'rowsRemoved': original[0] - presolved[0],
+                'colsRemoved': original[1] - presolved[1],
+                'elementsRemoved': original[2] - presolved[2],
+            }
+
+        presolveEnd = self._find('Presolve finished')
+        end = self._find('Uncrunching matrix') or self._find('Optimal solution found')
+        if end is None:
+            end = self.lines[-1][0] if self.lines else self.started
+        begin = presolveEnd or self.started
+
+        times = {'presolve': (presolveEnd or self.started) - self.started}
+        barrierStart = self._find('Barrier starts')
+        if barrierStart is not None:
+            barrierEnd = self._find('Barrier method finished', barrierStart) or end
+            times['barrier'] = barrierEnd - barrierStart
+            crossoverStart = self._find('Crossover starts', barrierStart)
+            times['crossover'] = end - crossoverStart if crossoverStart is not None else 0.0
+            times['simplex'] = 0.0
+        else:
+            times['simplex'] = end - begin
+        stats['times'] = times
+        return stats
+
+
+class Telemetry:
+
+    def __init__(self, run, path=None, profileDir=None, profiler='cprofile'):
+        self.run = run
+        self.path = path
+        self.enabled = path is not None
+        self.profileDir = profileDir if self.enabled else None
+        self.profiler = profiler if profiler == 'cprofile' or pyinstrument is not None else 'cprofile'
+
+        self.runId = uuid.uuid4().hex[:12]
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.phases = []
+        self.solves = []
+        self.extra = {}
+        self.logs = {}
+        self._current = None
+        self._profiles = {}
+
+    @classmethod
+    def fromEnv(cls, run):
+        """Telemetry configured by DSS_TELEMETRY / DSS_PROFILE / DSS_PROFILER."""
+        return cls(run, os.environ.get('DSS_TELEMETRY') or None, os.environ.get('DSS_PROFILE') or None,
+                   os.environ.get('DSS_PROFILER', 'cprofile'))
+
+    def annotate(self, **values):
+        """Extra fields for the run record, e.g. workbook or instance size."""
+        if self.enabled:
+            self.extra.update(values)
+
+    ## Phasen
+
+    def _startProfile(self, index):
+        if self.profileDir is None:
+            return
+        if self.profiler == 'pyinstrument':
+            profile = pyinstrument.Profiler()
+            profile.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+        self._profiles[index] = profile
+
+    def _stopProfile(self, index):
+        profile = self._profiles.get(index)
+        if profile is None:
+            return
+        if self.profiler == 'pyinstrument':
+            profile.stop()
+        else:
+            profile.disable()
+
+    def mark(self, name):
+        """End the running phase and start phase `name`."""
+        if not self.enabled:
+            return
+        self._end()
+        self._current = (name, time.perf_counter(), currentRss(), peakRss())
+        self._startProfile(len(self.phases))
+
+    def _end(self):
+        if self._current is None:
+            return
+        self._stopProfile(len(self.phases))
+        name, start, rssBefore, peakBefore = self._current
+        rss, peak = currentRss(), peakRss()
+        self.phases.append({
+            'name': name,
+            'time': time.perf_counter() - start,
+            'rss': rss,
+            'rssDelta': rss - rssBefore if rss is not None and rssBefore is not None else None,
+            'peakRss': peak,
+            'peakRssDelta': peak - peakBefore if peak is not None and peakBefore is not None else None,
+        })
+        self._current = None
+
+    @contextmanager
+    def phase(self, name):
+        self.mark(name)
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self._end()
+
+    ## Solver
+
+    def watch(self, problem):
+        """Catch the Xpress log of `problem` to read presolve and algorithm times."""
+        if self.enabled and hasattr(problem, 'setOutputEnabled'):
+            self.logs[id(problem)] = SolverLog(problem)
+
+    def beforeSolve(self, problem):
+        log = self.logs.get(id(problem))
+        if log is not None:
+            log.start()
+
+    def recordSolve(self, name, problem, solveTime, **values):
+        """Record the Xpress attributes of the solve that just finished."""
+        if not self.enabled:
+            return
+        attributes = problem.attributes
+        record = {
+            'name': name,
+            'phase': self._current[0] if self._current else None,
+            'time': solveTime,
+            'lpstatus': attributes.lpstatus,
+            'algorithm': ALGORITHMS.get(attributes.algorithm, attributes.algorithm),
+            'simplexIterations': attributes.simplexiter,
+            'barrierIterations': attributes.bariter,
+            'crossoverIterations': attributes.crossoveriter,
+            'rows': attributes.rows,
+            'cols': attributes.cols,
+            'elements': attributes.elems,
+        }
+        log = self.logs.get(id(problem))
+        if log is not None:
+            record.update(log.summary())
+        record.update(values)
+        self.solves.append(record)
+
+    ## Abschluss
+
+    def _dumpProfile(self, index):
+        profile = self._profiles.get(index)
+        if profile is None:
+            return None
+        os.makedirs(self.profileDir, exist_ok=True)
+        stem = re.sub(r'[^\w.-]+', '_', f"{self.run}-{self.runId}-{self.phases[index]['name']}")
+        if self.profiler == 'pyinstrument':
+            path = os.path.join(self.profileDir, stem + '.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profile.output_html())
+        else:
+            path = os.path.join(self.profileDir, stem + '.prof')
+            profile.dump_stats(path)
+        return path
+
+    def finish(self):
+        """End the last phase and append the run record, returns it (None if disabled)."""
+        if not self.enabled:
+            return None
+        self._end()
+
+        hottest = max(range(len(self.phases)), key=lambda i: self.phases[i]['time']) if self.phases else None
+        record = {
+            'run': self.run,
+            'runId': self.runId,
+            'started': self.started,
+            'host': platform.node(),
+            'pid': os.getpid(),
+            'python': platform.python_version(),
+            'argv': sys.argv,
+            'total': time.perf_counter() - self.start,
+            'peakRss': peakRss(),
+            'phases': self.phases,
+            'solves': self.solves,
+            'hottest': self.phases[hottest]['name'] if hottest is not None else None,
+            'profile': self._dumpProfile(hottest) if hottest is not None else None,
+        }
+        record.update(self.extra)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # one line per run, appends of several processes do not interleave
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+        return record
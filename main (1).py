@@ -6,12 +6,16 @@ DiamondStreetStyles - main.py
 import xpress as xp
 import pandas as pd
 
+from dss.ingest import readWorkbook
+
 DSS = xp.problem("Deinemutter")
 
 # Load the Excel file and read data from the sheets "Material" and "Produkt"
 file_path = 'Produktionsplanung.xlsx'  # Replace with your file path
-material_df = pd.read_excel(file_path, sheet_name='Material')
-produkt_df = pd.read_excel(file_path, sheet_name='Produkt')
+# parsed once (and cached in .dss_cache), df1 / df2 below reuse the same frames
+sheets = readWorkbook(file_path, sheets=['Material', 'Produkt'])
+material_df = sheets['Material']
+produkt_df = sheets['Produkt']
 
 # Extracting VPi and KMi from produkt_df
 VPi = produkt_df['Verkaufspreis'].values
@@ -35,8 +39,8 @@ for i in range(num_products):
 
 
 
-df1 = pd.read_excel("Produktionsplanung.xlsx", sheet_name=0)
-df2 = pd.read_excel("Produktionsplanung.xlsx", sheet_name=1)
+df1 = produkt_df
+df2 = material_df
 # Einlesen der Parameter
 print(df1)
 